@@ -0,0 +1,466 @@
+"""Versioned JSON gameplay API (/api/v1)
+
+The same rules as the page routes, without rendering a page per click.
+Payloads are compact: questions are ``[id, text, [a, b, c, d]]`` lists sent
+once, and answers return only what changed (correctness, points, the next
+question id). Authentication is the normal login session cookie. A
+question's correct answer and the bot's answer to it are only sent in the
+response that grades the player's answer.
+"""
+import time
+
+from flask import Blueprint, current_app, get_flashed_messages, jsonify, request, session
+
+from bot_session import FINISHED, BotSession
+from content import MAIN_TRACK, role_track
+from gameplay import (storage, content, progress, opponents, reviews, answer_bot_question, answer_bot_batch,
+                      bot_prefetch, leaderboard, pick_bot_questions, save_level_result, save_role_level_result,
+                      rpg_progress, save_rpg_progress, world)
+from leaderboard import GLOBAL, role_board, week_board
+from records import AnswerResult
+from world import TALK_RANGE
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# How old a client timestamp in a bulk submission may be, and how far ahead
+MAX_ANSWER_AGE = 24 * 60 * 60
+MAX_CLOCK_SKEW = 5 * 60
+
+# How long clients may reuse RPG world chunks before revalidating their ETag
+WORLD_MAX_AGE = 300
+# Most NPC ids or concept bits one RPG save may add
+MAX_SAVE_ITEMS = 256
+# How far from an NPC a save may report visiting it: the talk range plus
+# the distance walked while its dialogue loads
+VISIT_RANGE = 2 * TALK_RANGE + 20
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+@api.errorhandler(ApiError)
+def handle_api_error(e):
+    return jsonify(error=str(e)), e.status
+
+
+@api.errorhandler(Exception)
+def handle_exception(e):
+    print(f"API error: {e}")
+    return jsonify(error='internal error'), 500
+
+
+@api.before_request
+def require_login():
+    if 'user_id' not in session:
+        return jsonify(error='login required'), 401
+
+
+def payload():
+    return request.get_json(silent=True) or {}
+
+
+def int_field(data, key):
+    value = data.get(key)
+    return int(value) if str(value).isdigit() else None
+
+
+def compact_question(question, text_field='question_text'):
+    return [question.id, getattr(question, text_field),
+            [question.option_a, question.option_b, question.option_c, question.option_d]]
+
+
+def round_state(bot):
+    return {'state': bot.state, 'index': bot.index, 'total': bot.total, 'question_id': bot.question_id,
+            'score': [bot.user_score, bot.bot_score]}
+
+
+def current_round():
+    bot = BotSession.load(session)
+    if bot is None:
+        raise ApiError('no bot session', 404)
+    return bot
+
+
+# Progress
+
+@api.route('/progress')
+def get_progress():
+    user_id = session['user_id']
+    summary = progress.summary(user_id, MAIN_TRACK)
+    stats = storage.get_bot_stats(user_id)
+    return jsonify(levels={'completed': sorted(summary.completed), 'frontier': summary.frontier,
+                           'best': summary.best_scores},
+                   bot=[stats.answered, stats.correct, stats.points],
+                   reviews_due=reviews.due_count(user_id))
+
+
+@api.route('/progress/flags')
+def get_progress_flags():
+    """The per-user parts of the cached page shells, revalidated by ETag
+
+    ``?messages=1`` (sent by pages that show them) also takes the waiting
+    flashed messages; that response is never stored.
+    """
+    user_id = session['user_id']
+    track = content.track(MAIN_TRACK)
+    summary = progress.summary(user_id, MAIN_TRACK)
+    flags = {'username': session.get('username'),
+             'levels': {'completed': sorted(summary.completed),
+                        'unlocked': [level.id for level in track.levels if track.is_unlocked(level.id, summary.completed)]},
+             'scenarios': {'completed': sorted(storage.completed_scenario_ids(user_id))}}
+    messages = get_flashed_messages() if request.args.get('messages') else []
+    if messages:
+        response = jsonify(dict(flags, messages=messages))
+        response.cache_control.no_store = True
+        return response
+    response = jsonify(flags)
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+# You vs Bot
+
+@api.route('/bot/questions')
+def get_bot_questions():
+    ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip().isdigit()]
+    questions = [content.bot_question(i) for i in ids]
+    return jsonify(questions=[compact_question(q) for q in questions if q])
+
+
+@api.route('/bot/sessions', methods=['POST'])
+def start_bot_session():
+    data = payload()
+    user_id = session['user_id']
+    count = int_field(data, 'count') if 'count' in data else 5
+    if not count:
+        raise ApiError('count must be a positive integer')
+    questions = pick_bot_questions(user_id, count, shuffle=bool(data.get('shuffle')),
+                                   adaptive=bool(data.get('adaptive')))
+    if not questions:
+        raise ApiError('no unanswered questions', 409)
+    bot = BotSession.start(questions, int_field(data, 'seed'), opponents.get(data.get('opponent')))
+    bot.save(session)
+    return jsonify(dict(round_state(bot), questions=[compact_question(q) for q in questions],
+                        prefetch=bot_prefetch(bot))), 201
+
+
+@api.route('/bot/session')
+def get_bot_session():
+    return jsonify(round_state(current_round()))
+
+
+@api.route('/bot/answers', methods=['POST'])
+def submit_bot_answer():
+    data = payload()
+    question = content.bot_question(int_field(data, 'question_id'))
+    answer = data.get('answer')
+    if question is None or answer not in ('A', 'B', 'C', 'D'):
+        raise ApiError('question_id and answer (A-D) are required')
+    bot = BotSession.load(session)
+    if bot and not bot.has_question(question.id):
+        bot = None
+    if bot and not bot.accepts(question.id):
+        raise ApiError('the round is finished' if bot.state == FINISHED else 'not the current question of the round',
+                       409)
+    outcome = answer_bot_question(session['user_id'], question, answer, bot)
+    session.setdefault('user_answers', {})[str(question.id)] = answer
+    session.modified = True
+    result = {'correct': outcome.is_correct, 'correct_answer': question.correct_answer,
+              'ai_answer': outcome.ai_answer, 'points': [outcome.user_points, outcome.bot_points]}
+    if bot:
+        bot.save(session)
+        result.update(round_state(bot), prefetch=bot_prefetch(bot))
+    return jsonify(result)
+
+
+def client_timestamp(value, now):
+    """Validated epoch-seconds timestamp as a UTC SQL timestamp string, or None"""
+    if value is None:
+        return None
+    if not isinstance(value, (int, float)) or not now - MAX_ANSWER_AGE <= value <= now + MAX_CLOCK_SKEW:
+        raise ApiError('answered_at must be epoch seconds within the last day')
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(min(value, now)))
+
+
+@api.route('/bot/answers/batch', methods=['POST'])
+def submit_bot_answers():
+    """Grade the rest of a round at once: ``answers: [{question_id, answer, answered_at}]``
+
+    Each answer counts as one more attempt at its question, as the session
+    has them; only the current question and later ones can be answered.
+    """
+    bot = current_round()
+    items = payload().get('answers')
+    if not isinstance(items, list) or not items:
+        raise ApiError('answers must be a non-empty list')
+    if bot.state == FINISHED:
+        raise ApiError('the round is finished', 409)
+    now = time.time()
+    entries = []
+    seen = set()
+    for item in items:
+        question_id = int_field(item, 'question_id')
+        if not bot.has_question(question_id):
+            raise ApiError(f'question {item.get("question_id")} is not part of this session')
+        if question_id in seen:
+            raise ApiError(f'question {question_id} is answered twice')
+        if not bot.is_open(question_id):
+            raise ApiError(f'question {question_id} was already answered or skipped', 409)
+        seen.add(question_id)
+        answer = item.get('answer')
+        if answer not in ('A', 'B', 'C', 'D'):
+            raise ApiError(f'question {question_id} needs an answer (A-D)')
+        entries.append((content.bot_question(question_id), answer, client_timestamp(item.get('answered_at'), now)))
+    # Settling a question moves the round past it, so earlier ones go first
+    entries.sort(key=lambda entry: bot.position[entry[0].id])
+
+    outcomes = answer_bot_batch(session['user_id'], bot, entries)
+    user_answers = session.setdefault('user_answers', {})
+    for question, answer, _ in entries:
+        user_answers[str(question.id)] = answer
+    session.modified = True
+    bot.save(session)
+    return jsonify(dict(round_state(bot),
+                        results=[[question.id, outcome.is_correct, question.correct_answer, outcome.ai_answer,
+                                  outcome.user_points, outcome.bot_points]
+                                 for (question, _, _), outcome in zip(entries, outcomes)],
+                        correct=[sum(o.is_correct for o in outcomes),
+                                 sum(o.ai_answer == e[0].correct_answer for e, o in zip(entries, outcomes))]))
+
+
+@api.route('/bot/continue', methods=['POST'])
+def continue_bot_session():
+    bot = current_round()
+    bot.advance()
+    bot.save(session)
+    return jsonify(round_state(bot))
+
+
+@api.route('/bot/retry', methods=['POST'])
+def retry_bot_question():
+    bot = current_round()
+    if not bot.retry(int_field(payload(), 'question_id')):
+        raise ApiError('question is not part of this session')
+    bot.save(session)
+    return jsonify(round_state(bot))
+
+
+@api.route('/bot/results')
+def get_bot_results():
+    stats = storage.get_bot_stats(session['user_id'])
+    bot = BotSession.load(session)
+    return jsonify(answered=stats.answered, correct=stats.correct, points=stats.points,
+                   total=content.bot_question_count(),
+                   score=[bot.user_score, bot.bot_score] if bot else None)
+
+
+# Levels and role levels
+
+def grade(questions, answers):
+    """AnswerResults for ``{question_id: letter}`` against the level's own questions"""
+    by_id = {question.id: question for question in questions}
+    results = []
+    for question_id, answer in answers.items():
+        question = by_id.get(int(question_id)) if str(question_id).isdigit() else None
+        if question is None:
+            raise ApiError(f'question {question_id} is not part of this level')
+        results.append(AnswerResult(question, answer, answer == question.correct_answer))
+    return results
+
+
+def level_result(results, score, completed, track, level_id):
+    return jsonify(score=score, completed=completed,
+                   missed={r.question.id: r.question.correct_answer for r in results if not r.is_correct},
+                   unlocked=track.successor.get(level_id) if completed else None)
+
+
+@api.route('/levels/<int:level_id>/questions')
+def get_level_questions(level_id):
+    return jsonify(questions=[compact_question(q) for q in storage.list_questions(level_id)])
+
+
+@api.route('/levels/<int:level_id>/answers', methods=['POST'])
+def submit_level(level_id):
+    questions = storage.list_questions(level_id)
+    results = grade(questions, payload().get('answers') or {})
+    if not results:
+        raise ApiError('answers are required')
+    score, completed = save_level_result(session['user_id'], level_id, results, len(questions))
+    return level_result(results, score, completed, content.track(MAIN_TRACK), level_id)
+
+
+@api.route('/role_levels/<int:role_level_id>/questions')
+def get_role_level_questions(role_level_id):
+    return jsonify(questions=[compact_question(q) for q in storage.list_role_questions(role_level_id)])
+
+
+@api.route('/role_levels/<int:role_level_id>/answers', methods=['POST'])
+def submit_role_level(role_level_id):
+    role_level = content.role_level(role_level_id)
+    if role_level is None:
+        raise ApiError('unknown role level', 404)
+    questions = storage.list_role_questions(role_level_id)
+    results = grade(questions, payload().get('answers') or {})
+    if not results:
+        raise ApiError('answers are required')
+    score, completed = save_role_level_result(session['user_id'], role_level, results, len(questions))
+    return level_result(results, score, completed, content.track(role_track(role_level.role_id)), role_level_id)
+
+
+# Scenarios
+
+def scenario_step(scenario_id, step_number):
+    graph = content.scenario(scenario_id)
+    step = graph.step(step_number) if graph else None
+    if step is None:
+        raise ApiError('unknown scenario step', 404)
+    return graph, step
+
+
+@api.route('/scenarios/<int:scenario_id>/steps/<int:step_number>')
+def get_scenario_step(scenario_id, step_number):
+    graph, step = scenario_step(scenario_id, step_number)
+    return jsonify(step=compact_question(step, 'story_context'), steps=graph.step_count)
+
+
+@api.route('/scenarios/<int:scenario_id>/steps/<int:step_number>/answer', methods=['POST'])
+def submit_scenario_answer(scenario_id, step_number):
+    graph, step = scenario_step(scenario_id, step_number)
+    answer = payload().get('answer')
+    is_correct = answer == step.correct_answer
+    session.setdefault('scenario_answers', []).append({
+        'question_number': step_number,
+        'question_text': step.story_context,
+        'selected_answer': answer,
+        'correct_answer': step.correct_answer,
+        'is_correct': is_correct
+    })
+    session.modified = True
+    next_step = graph.next_step(step_number, answer)
+    result = {'correct': is_correct, 'correct_answer': step.correct_answer, 'feedback': step.feedback,
+              'next': next_step}
+    if next_step is None:
+        storage.mark_scenario_completed(session['user_id'], scenario_id)
+        if graph.outcome:
+            result['outcome'] = [graph.outcome.final_outcome, graph.outcome.learning_summary]
+    return jsonify(result)
+
+
+# Leaderboards
+
+def leaderboard_result(name):
+    count = min(int_field(request.args, 'limit') or 10, 100)
+    entries, (rank, score, players) = leaderboard(name, session['user_id'], count)
+    return jsonify(top=[list(entry) for entry in entries], me=[rank, score], players=players)
+
+
+@api.route('/leaderboards/global')
+def get_global_leaderboard():
+    return leaderboard_result(GLOBAL)
+
+
+@api.route('/leaderboards/week')
+def get_weekly_leaderboard():
+    return leaderboard_result(week_board())
+
+
+@api.route('/leaderboards/roles/<int:role_id>')
+def get_role_leaderboard(role_id):
+    if content.role(role_id) is None:
+        raise ApiError('unknown role', 404)
+    return leaderboard_result(role_board(role_id))
+
+
+# RPG world
+
+def chunk_response(chunk):
+    """A pre-serialized world chunk, cacheable by the browser and revalidated by ETag"""
+    response = current_app.response_class(chunk.body, mimetype='application/json')
+    response.set_etag(chunk.etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = WORLD_MAX_AGE
+    return response.make_conditional(request)
+
+
+@api.route('/rpg/maps/<map_id>/regions/<int:rx>/<int:ry>')
+def get_rpg_region(map_id, rx, ry):
+    return chunk_response(world.region(map_id, rx, ry))
+
+
+@api.route('/rpg/maps/<map_id>/chunks')
+def get_rpg_chunks(map_id):
+    """Tile map chunks around pixel (x, y), minus the ``have=cx,cy;cx,cy`` ones the client holds"""
+    x, y = int_field(request.args, 'x'), int_field(request.args, 'y')
+    if x is None or y is None:
+        raise ApiError('x and y are required')
+    have = []
+    for key in filter(None, request.args.get('have', '').split(';')):
+        cx, _, cy = key.partition(',')
+        if not (cx.isdigit() and cy.isdigit()):
+            raise ApiError('have must look like 0,0;1,0')
+        have.append((int(cx), int(cy)))
+    chunks = current_app.extensions['tile_maps'].chunks_around(map_id, x, y, have)
+    if chunks is None:
+        raise ApiError('unknown map', 404)
+    return jsonify(chunks=chunks)
+
+
+@api.route('/rpg/npcs/<npc_id>')
+def get_rpg_npc(npc_id):
+    chunk = world.npc(npc_id)
+    if chunk is None:
+        raise ApiError('unknown NPC', 404)
+    return chunk_response(chunk)
+
+
+@api.route('/rpg/npcs/<npc_id>/dialogues/<int:index>/answer', methods=['POST'])
+def answer_rpg_question(npc_id, index):
+    question = world.question(npc_id, index)
+    if question is None:
+        raise ApiError('this dialogue has no question', 404)
+    answer = payload().get('answer')
+    if answer not in ('A', 'B', 'C', 'D'):
+        raise ApiError('answer (A-D) is required')
+    return jsonify(correct=answer == question.correct_answer, correct_answer=question.correct_answer,
+                   explanation=question.explanation)
+
+
+@api.route('/rpg/progress')
+def get_rpg_progress():
+    return jsonify(progress=rpg_progress(session['user_id']))
+
+
+@api.route('/rpg/progress', methods=['POST'])
+def save_rpg_progress_delta():
+    """Merge a save delta ``{map, x, y, visited: [npc ids], learned: [concept bits]}``
+
+    Only what changed since the client's last save is sent: the position
+    replaces the stored one, visited NPCs and learned concepts are added.
+    """
+    data = payload()
+    map_id = data.get('map')
+    x, y = int_field(data, 'x'), int_field(data, 'y')
+    if not isinstance(map_id, str) or not 0 < len(map_id) <= 32 or x is None or y is None:
+        raise ApiError('map, x and y are required')
+    visited, learned = data.get('visited', []), data.get('learned', [])
+    if not (isinstance(visited, list) and isinstance(learned, list)) or len(visited) + len(learned) > MAX_SAVE_ITEMS:
+        raise ApiError('visited and learned must be short lists')
+    if not all(isinstance(npc_id, str) and world.has_npc(npc_id) for npc_id in visited):
+        raise ApiError('unknown NPC in visited')
+    if not all(type(bit) is int and world.concept_npc(bit) for bit in learned):
+        raise ApiError('unknown concept in learned')
+    # The page saves as soon as it meets an NPC, so a new visit must be next to it
+    if visited and not set(visited) <= world.npcs_near(map_id, x, y, VISIT_RANGE):
+        raise ApiError('visited NPC is out of range', 409)
+    if learned:
+        saved = rpg_progress(session['user_id'])
+        met = set(visited) | set(saved['visited'] if saved else ())
+        if not all(world.concept_npc(bit) in met for bit in learned):
+            raise ApiError('concept learned from an NPC never visited', 409)
+    save_rpg_progress(session['user_id'], map_id, x, y, visited, learned)
+    return jsonify(saved=True)
@@ -1,54 +1,47 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-import sqlite3
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g
 import os
 import random
-from datetime import datetime
+
+from api import api
+from bot_session import ASKING, FINISHED, REVIEWING, BotSession
+from collision import init_app as init_collision
+from compression import init_app as init_compression
+from content import MAIN_TRACK, role_track
+from gameplay import (storage, content, progress, opponents, reviews, answer_bot_question, bot_prefetch,
+                      leaderboard, pick_bot_questions, reset_bot_progress, rpg_progress,
+                      save_level_result, save_role_level_result)
+from images import init_app as init_images
+from leaderboard import GLOBAL, role_board, week_board
+from maintenance import start_purger
+from page_cache import conditional_page, shell_page
+from review import BOT, LEVEL, ROLE
+from records import AnswerResult, MapEntry
+from sprites import init_app as init_sprites
+from static_bundle import init_app as init_static
+from tilemap import init_app as init_tilemaps
+from world import INTERACTION, REGION_SIZE, seed_world
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'fallback-secret-key')
-
-# Database setup for local development
-DB_FILE = 'law_game.db'
-
-def get_db_connection():
-    try:
-        print(f"Attempting to connect to database: {DB_FILE}")
-        
-        # Ensure database exists
-        if not os.path.exists(DB_FILE):
-            print(f"Database not found, creating at {DB_FILE}")
-            from init_db import init_database
-            init_database()
-        
-        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        print("Database connection successful")
-        
-        # Test connection
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM users")
-        user_count = cursor.fetchone()[0]
-        print(f"Database has {user_count} users")
-        
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
+app.register_blueprint(api)
+init_images(app)
+init_collision(app)
+init_tilemaps(app)
+init_sprites(app)
+init_static(app)
+init_compression(app)
 
 def init_db():
     try:
-        if not os.path.exists(DB_FILE):
-            print(f"Database not found at {DB_FILE}, initializing...")
-            from init_db import init_database
-            init_database()
-            print("Database initialized successfully")
-        else:
-            print(f"Database found at {DB_FILE}")
+        storage.ensure_database()
+        seed_world(storage)
+        print(f"Using {storage.name} storage")
     except Exception as e:
         print(f"Database initialization error: {e}")
 
 # Initialize database safely
 init_db()
+start_purger(storage)
 
 @app.errorhandler(Exception)
 def handle_exception(e):
@@ -81,39 +74,28 @@ def login():
                 flash('Please enter both username and password')
                 return render_template('login.html')
             
-            conn = get_db_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT id, username, password FROM users WHERE username = ?", (username,))
-                    user_row = cursor.fetchone()
-                    
-                    print(f"Database query result: {user_row}")
-                    
-                    if user_row:
-                        user = dict(user_row)
-                        print(f"User found: {user}")
-                        if user['password'] == password:
-                            session['user_id'] = user['id']
-                            session['username'] = user['username']
-                            print(f"Login successful for {username}")
-                            print(f"Session data: {dict(session)}")
-                            print(f"Redirecting to mode_select")
-                            return redirect(url_for('mode_select'))
-                        else:
-                            print("Password mismatch")
-                            flash('Invalid username or password')
+            try:
+                user = storage.get_user_by_username(username)
+                
+                print(f"Database query result: {user}")
+                
+                if user:
+                    if user['password'] == password:
+                        session['user_id'] = user['id']
+                        session['username'] = user['username']
+                        print(f"Login successful for {username}")
+                        print(f"Session data: {dict(session)}")
+                        print(f"Redirecting to mode_select")
+                        return redirect(url_for('mode_select'))
                     else:
-                        print("User not found")
+                        print("Password mismatch")
                         flash('Invalid username or password')
-                except Exception as e:
-                    print(f"Login query error: {e}")
-                    flash('Database error occurred')
-                finally:
-                    conn.close()
-            else:
-                print("Database connection failed")
-                flash('Database connection failed')
+                else:
+                    print("User not found")
+                    flash('Invalid username or password')
+            except Exception as e:
+                print(f"Login query error: {e}")
+                flash('Database error occurred')
         
         return render_template('login.html')
     except Exception as e:
@@ -137,28 +119,18 @@ def signup():
                 flash('Passwords do not match')
                 return render_template('signup.html')
             
-            conn = get_db_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-                    if cursor.fetchone():
-                        flash('Username already exists')
-                        return render_template('signup.html')
-                    
-                    cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-                    conn.commit()
-                    user_id = cursor.lastrowid
-                    session['user_id'] = user_id
-                    session['username'] = username
-                    return redirect(url_for('mode_select'))
-                except Exception as e:
-                    print(f"Signup query error: {e}")
-                    flash('Registration failed')
-                finally:
-                    conn.close()
-            else:
-                flash('Database connection failed')
+            try:
+                if storage.get_user_by_username(username):
+                    flash('Username already exists')
+                    return render_template('signup.html')
+                
+                user_id = storage.create_user(username, password)
+                session['user_id'] = user_id
+                session['username'] = username
+                return redirect(url_for('mode_select'))
+            except Exception as e:
+                print(f"Signup query error: {e}")
+                flash('Registration failed')
         
         return render_template('signup.html')
     except Exception as e:
@@ -175,116 +147,81 @@ def logout():
     return redirect(url_for('login'))
 
 @app.route('/mode_select')
+@shell_page()
 def mode_select():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     return render_template('mode_select.html')
 
 @app.route('/levels')
+@shell_page(content.content_version)
 def levels():
     try:
         if 'user_id' not in session:
             return redirect(url_for('login'))
         
-        user_id = session['user_id']
-        conn = get_db_connection()
-        
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, level_number, title, description FROM levels ORDER BY level_number")
-                all_levels = [dict(row) for row in cursor.fetchall()]
-                
-                cursor.execute("SELECT level_id FROM user_progress WHERE user_id = ? AND completed = 1", (user_id,))
-                completed_levels = {dict(row)['level_id'] for row in cursor.fetchall()}
-                
-                levels_data = []
-                for level in all_levels:
-                    level_id = level['id']
-                    level_num = level['level_number']
-                    
-                    if level_num == 1:
-                        unlocked = True
-                    else:
-                        prev_level = next((l for l in all_levels if l['level_number'] == level_num - 1), None)
-                        unlocked = prev_level['id'] in completed_levels if prev_level else False
-                    
-                    levels_data.append({
-                        'id': level_id,
-                        'level_number': level_num,
-                        'title': level['title'],
-                        'description': level['description'],
-                        'unlocked': unlocked,
-                        'completed': level_id in completed_levels
-                    })
-                
-                return render_template('levels.html', levels=levels_data)
-            except Exception as e:
-                print(f"Levels query error: {e}")
-                flash('Error loading levels')
-            finally:
-                conn.close()
+        try:
+            # Shell only: the player's completed and unlocked levels come from /api/v1/progress/flags
+            levels_data = content.track(MAIN_TRACK).entries(set())
+            
+            return render_template('levels.html', levels=levels_data)
+        except Exception as e:
+            print(f"Levels query error: {e}")
+            flash('Error loading levels')
         
         return redirect(url_for('mode_select'))
     except Exception as e:
         print(f"Levels route error: {e}")
         return redirect(url_for('mode_select'))
 
+def bot_mode_counts(user_id):
+    """(bot stats, due review count) for the page, read once per request"""
+    if 'bot_mode_counts' not in g:
+        g.bot_mode_counts = storage.get_bot_stats(user_id), reviews.due_count(user_id)
+    return g.bot_mode_counts
+
+def bot_mode_version(user_id):
+    return (content.content_version(),) + bot_mode_counts(user_id)
+
 @app.route('/bot_mode')
+@conditional_page(bot_mode_version, shows_flashes=True)
 def bot_mode():
     try:
         if 'user_id' not in session:
             return redirect(url_for('login'))
         
         user_id = session['user_id']
-        conn = get_db_connection()
         
-        if conn:
-            try:
-                cursor = conn.cursor()
-                
-                # Get total questions
-                cursor.execute("SELECT COUNT(*) FROM bot_questions")
-                total_questions = cursor.fetchone()[0]
-                
-                # Get answered questions for this user
-                cursor.execute("SELECT COUNT(*) FROM user_bot_progress WHERE user_id = ?", (user_id,))
-                answered_questions = cursor.fetchone()[0]
-                
-                remaining_questions = total_questions - answered_questions
-                
-                print(f"Bot mode stats: total={total_questions}, answered={answered_questions}, remaining={remaining_questions}")
-                
-                # Always show question selection unless no questions remaining
-                if remaining_questions > 0:
-                    return render_template('bot_question_selection.html', 
-                                         total_questions=total_questions,
-                                         answered_questions=answered_questions,
-                                         remaining_questions=remaining_questions)
-                else:
-                    # Show completion page
-                    cursor.execute("""
-                        SELECT ubp.is_correct, bq.correct_answer, bq.explanation, bq.question_text, bq.option_a, bq.option_b, bq.option_c, bq.option_d
-                        FROM user_bot_progress ubp
-                        JOIN bot_questions bq ON ubp.question_id = bq.id
-                        WHERE ubp.user_id = ?
-                    """, (user_id,))
-                    results = cursor.fetchall()
-                    
-                    total_answered = len(results)
-                    correct_answers = sum(1 for r in results if r[0] == 1)
-                    user_score = correct_answers * 3  # 3 points per correct answer
-                    
-                    return render_template('bot_completion.html', 
-                                         total_answered=total_answered,
-                                         correct_answers=correct_answers,
-                                         user_score=user_score,
-                                         total_questions=total_questions)
-            except Exception as e:
-                print(f"Bot mode query error: {e}")
-                flash('Error loading bot mode')
-            finally:
-                conn.close()
+        try:
+            # Get total questions (cached with the content)
+            total_questions = content.bot_question_count()
+            
+            # Running totals and due reviews, shared with the ETag check
+            stats, due_reviews = bot_mode_counts(user_id)
+            answered_questions = stats.answered
+            
+            remaining_questions = total_questions - answered_questions
+            
+            print(f"Bot mode stats: total={total_questions}, answered={answered_questions}, remaining={remaining_questions}")
+            
+            # Always show question selection unless no questions remaining
+            if remaining_questions > 0:
+                return render_template('bot_question_selection.html', 
+                                     total_questions=total_questions,
+                                     answered_questions=answered_questions,
+                                     remaining_questions=remaining_questions,
+                                     due_reviews=due_reviews)
+            else:
+                # Show completion page
+                return render_template('bot_completion.html', 
+                                     total_answered=stats.answered,
+                                     correct_answers=stats.correct,
+                                     user_score=stats.points,
+                                     total_questions=total_questions,
+                                     due_reviews=due_reviews)
+        except Exception as e:
+            print(f"Bot mode query error: {e}")
+            flash('Error loading bot mode')
         
         return redirect(url_for('mode_select'))
     except Exception as e:
@@ -292,34 +229,19 @@ def bot_mode():
         return redirect(url_for('mode_select'))
 
 @app.route('/scenario_chains')
+@shell_page(content.content_version)
 def scenario_chains():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    user_id = session['user_id']
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # Get all scenarios
-            cursor.execute("SELECT id, domain, law_involved, title FROM scenario_chains")
-            scenarios = [dict(row) for row in cursor.fetchall()]
-            
-            # Get completed scenarios for this user
-            cursor.execute("SELECT scenario_id FROM user_scenario_progress WHERE user_id = ? AND completed = 1", (user_id,))
-            completed_scenarios = {row['scenario_id'] for row in cursor.fetchall()}
-            
-            # Add completion status to each scenario
-            for scenario in scenarios:
-                scenario['completed'] = scenario['id'] in completed_scenarios
-            
-            return render_template('scenario_chains.html', scenarios=scenarios)
-        except Exception as e:
-            print(f"Scenario chains error: {e}")
-            flash('Error loading scenarios')
-        finally:
-            conn.close()
+    try:
+        # Shell only: the player's completed scenarios come from /api/v1/progress/flags
+        scenarios = [MapEntry(scenario) for scenario in content.scenario_list()]
+        
+        return render_template('scenario_chains.html', scenarios=scenarios)
+    except Exception as e:
+        print(f"Scenario chains error: {e}")
+        flash('Error loading scenarios')
     
     return redirect(url_for('mode_select'))
 
@@ -340,36 +262,30 @@ def show_scenario_question(scenario_id, question_number):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # Get scenario info
-            cursor.execute("SELECT * FROM scenario_chains WHERE id = ?", (scenario_id,))
-            scenario = dict(cursor.fetchone())
-            
-            # Get the current question/step
-            cursor.execute("SELECT * FROM scenario_steps WHERE scenario_id = ? AND step_number = ?", (scenario_id, question_number))
-            question_data = cursor.fetchone()
+    try:
+        # Get the compiled scenario graph
+        graph = content.scenario(scenario_id)
+        if graph is None:
+            raise LookupError(f"Unknown scenario {scenario_id}")
+        scenario = graph.scenario
+        
+        # Get the current question/step
+        question = graph.step(question_number)
+        
+        if question:
+            return render_template('scenario_question.html', 
+                                 scenario=scenario, 
+                                 question=question,
+                                 question_number=question_number)
+        else:
+            # No more questions, show completion
+            return render_template('scenario_complete.html',
+                                 scenario=scenario,
+                                 answers=session.get('scenario_answers', []))
             
-            if question_data:
-                question = dict(question_data)
-                return render_template('scenario_question.html', 
-                                     scenario=scenario, 
-                                     question=question,
-                                     question_number=question_number)
-            else:
-                # No more questions, show completion
-                return render_template('scenario_complete.html',
-                                     scenario=scenario,
-                                     answers=session.get('scenario_answers', []))
-                
-        except Exception as e:
-            print(f"Show scenario question error: {e}")
-            flash('Error loading question')
-        finally:
-            conn.close()
+    except Exception as e:
+        print(f"Show scenario question error: {e}")
+        flash('Error loading question')
     
     return redirect(url_for('scenario_chains'))
 
@@ -378,25 +294,70 @@ def play_level(level_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM levels WHERE id = ?", (level_id,))
-            level = dict(cursor.fetchone())
-            
-            cursor.execute("SELECT * FROM questions WHERE level_id = ?", (level_id,))
-            questions = [dict(row) for row in cursor.fetchall()]
-            
-            return render_template('play_level.html', level=level, questions=questions)
-        except Exception as e:
-            print(f"Play level error: {e}")
-            flash('Error loading level')
-        finally:
-            conn.close()
+    try:
+        level = storage.get_level(level_id)
+        questions = storage.list_questions(level_id)
+        
+        return render_template('play_level.html', level=level, questions=questions)
+    except Exception as e:
+        print(f"Play level error: {e}")
+        flash('Error loading level')
     
     return redirect(url_for('levels'))
 
+def render_bot_question(bot):
+    """bot_mode.html for the current question of a round"""
+    question = content.bot_question(bot.question_id)
+    ai_answer = bot.ai_answer(bot.question_id)
+    return render_template('bot_mode.html', 
+                         question=question,
+                         question_number=bot.question_number,
+                         total_questions=bot.total,
+                         user_score=bot.user_score,
+                         bot_score=bot.bot_score,
+                         ai_answer=ai_answer,
+                         is_ai_correct=ai_answer == question.correct_answer,
+                         show_result=False,
+                         prefetch=bot_prefetch(bot))
+
+def render_bot_feedback(bot, question, selected_answer):
+    """bot_mode.html with the feedback for a wrong answer"""
+    ai_answer = bot.ai_answer(question.id)
+    return render_template('bot_mode.html',
+                         previous_question=question,
+                         user_answer=selected_answer,
+                         is_user_correct=selected_answer == question.correct_answer,
+                         ai_answer=ai_answer,
+                         is_ai_correct=ai_answer == question.correct_answer,
+                         correct_answer=question.correct_answer,
+                         show_result=True,
+                         question_number=bot.question_number,
+                         total_questions=bot.total,
+                         user_score=bot.user_score,
+                         bot_score=bot.bot_score)
+
+def finish_bot_session(bot):
+    """Keep the finished round for its scores and show the results page"""
+    bot.save(session)
+    print(f"Session complete, final scores: User={bot.user_score}, Bot={bot.bot_score}")
+    return redirect(url_for('bot_results', user_score=bot.user_score, bot_score=bot.bot_score))
+
+@app.route('/bot_round')
+def bot_round():
+    """The running round where the server left it, for pages that answered through the API"""
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    bot = BotSession.load(session)
+    if bot is None:
+        return redirect(url_for('bot_mode'))
+    if bot.state == FINISHED:
+        return finish_bot_session(bot)
+    if bot.state == REVIEWING:
+        question = content.bot_question(bot.question_id)
+        return render_bot_feedback(bot, question, session.get('user_answers', {}).get(str(question.id)))
+    return render_bot_question(bot)
+
 @app.route('/start_bot_session', methods=['POST'])
 def start_bot_session():
     if 'user_id' not in session:
@@ -405,86 +366,33 @@ def start_bot_session():
     user_id = session['user_id']
     question_count = int(request.form.get('question_count', 5))  # Default 5 questions
     shuffle = request.form.get('shuffle', 'off')
+    adaptive = request.form.get('adaptive', 'off')
+    seed = request.form.get('seed', type=int)  # Fixed seed replays the same opponent answers
+    opponent = opponents.get(request.form.get('opponent'))
     
     print(f"Starting bot session: user_id={user_id}, questions={question_count}, shuffle={shuffle}")
     
-    conn = get_db_connection()
-    
-    if conn:
-        try:
-            cursor = conn.cursor()
+    try:
+        # Get multiple unanswered questions based on user's choice
+        questions = pick_bot_questions(user_id, question_count, shuffle=shuffle == 'on', adaptive=adaptive == 'on')
+        
+        if questions:
+            # Pre-roll the AI's answers and store the round compactly in the session
+            bot = BotSession.start(questions, seed, opponent)
+            bot.save(session)
+            session.setdefault('user_answers', {})  # Track actual user answers
             
-            # Get multiple unanswered questions based on user's choice
-            if shuffle == 'on':
-                cursor.execute("""
-                    SELECT bq.* FROM bot_questions bq 
-                    LEFT JOIN user_bot_progress ubp ON bq.id = ubp.question_id AND ubp.user_id = ?
-                    WHERE ubp.question_id IS NULL 
-                    ORDER BY RANDOM() 
-                    LIMIT ?
-                """, (user_id, question_count))
-            else:
-                cursor.execute("""
-                    SELECT bq.* FROM bot_questions bq 
-                    LEFT JOIN user_bot_progress ubp ON bq.id = ubp.question_id AND ubp.user_id = ?
-                    WHERE ubp.question_id IS NULL 
-                    ORDER BY bq.id 
-                    LIMIT ?
-                """, (user_id, question_count))
+            print(f"Started session with {len(questions)} questions ({opponent.name} opponent, seed {bot.seed})")
             
-            questions = cursor.fetchall()
+            return render_bot_question(bot)
+        else:
+            # All questions answered, show results
+            print("All questions answered, showing results")
+            return redirect(url_for('bot_results'))
             
-            if questions:
-                # Store session questions and scoring in session
-                session['bot_session_questions'] = [dict(q) for q in questions]
-                session['current_question_index'] = 0
-                session['total_session_questions'] = len(questions)
-                
-                # Initialize scoring
-                session['user_score'] = 0
-                session['bot_score'] = 0
-                session['question_attempts'] = {}  # Track attempts per question
-                session['user_answers'] = {}  # Track actual user answers
-                session['session_start_time'] = str(datetime.now())
-                
-                print(f"Started session with {len(questions)} questions")
-                
-                # Generate AI answer for the first question
-                import random
-                ai_accuracy = 0.8
-                first_question = session['bot_session_questions'][0]
-                
-                if random.random() < ai_accuracy:
-                    ai_answer = first_question['correct_answer']
-                    ai_is_correct = True
-                else:
-                    options = ['A', 'B', 'C', 'D']
-                    wrong_options = [opt for opt in options if opt != first_question['correct_answer']]
-                    ai_answer = random.choice(wrong_options)
-                    ai_is_correct = False
-                
-                return render_template('bot_mode.html', 
-                                     question=first_question,
-                                     question_number=1,
-                                     total_questions=len(questions),
-                                     user_score=0,
-                                     bot_score=0,
-                                     ai_answer=ai_answer,
-                                     is_ai_correct=ai_is_correct,
-                                     show_result=False)
-            else:
-                # All questions answered, show results
-                print("All questions answered, showing results")
-                return redirect(url_for('bot_results'))
-                
-        except Exception as e:
-            print(f"Start bot session error: {e}")
-            flash('Error starting bot session')
-        finally:
-            conn.close()
-    else:
-        print("Database connection failed")
-        flash('Database connection failed')
+    except Exception as e:
+        print(f"Start bot session error: {e}")
+        flash('Error starting bot session')
     
     return redirect(url_for('bot_mode'))
 
@@ -495,10 +403,7 @@ def submit_bot_answer():
     
     user_id = session['user_id']
     
-    # Debug: Print all form data
-    print(f"Form data received: {dict(request.form)}")
-    
-    question_id = request.form.get('question_id')
+    question_id = request.form.get('question_id', type=int)
     selected_answer = request.form.get('answer')
     
     print(f"Bot answer submission: user_id={user_id}, question_id={question_id}, answer={selected_answer}")
@@ -508,179 +413,63 @@ def submit_bot_answer():
         flash('Please select an answer')
         return redirect(url_for('bot_mode'))
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
+    try:
+        # Get the correct answer and question details
+        question = content.bot_question(question_id)
+        
+        if question:
+            correct_answer = question.correct_answer
+            bot = BotSession.load(session)
+            if bot and not bot.has_question(question_id):
+                bot = None
+            if bot and not bot.accepts(question_id):
+                # A stale form (back button, second submit): show where the round is instead
+                print(f"Question {question_id} is not the current question of the round")
+                return redirect(url_for('bot_round'))
+            
+            # Score against the pre-rolled AI answer and move the round on
+            is_correct, ai_answer, user_points, bot_points = answer_bot_question(user_id, question, selected_answer, bot)
+            ai_is_correct = ai_answer == correct_answer
+            if bot:
+                bot.save(session)
+                print(f"Score update: User +{user_points}, Bot +{bot_points}")
+                print(f"Current scores: User={bot.user_score}, Bot={bot.bot_score}")
             
-            # Get the correct answer and question details
-            cursor.execute("SELECT * FROM bot_questions WHERE id = ?", (question_id,))
-            question_row = cursor.fetchone()
+            # Track user's actual answer for results display
+            session.setdefault('user_answers', {})[str(question_id)] = selected_answer
+            session.modified = True
             
-            if question_row:
-                question = dict(question_row)
-                correct_answer = question['correct_answer']
-                is_correct = selected_answer == correct_answer
-                
-                print(f"Correct answer: {correct_answer}, Selected: {selected_answer}, Is correct: {is_correct}")
-                
-                # Track attempts for this question
-                if 'question_attempts' not in session:
-                    session['question_attempts'] = {}
-                session['question_attempts'][question_id] = session['question_attempts'].get(question_id, 0) + 1
-                attempts = session['question_attempts'][question_id]
-                
-                # Generate AI answer and calculate scores
-                import random
-                ai_accuracy = 0.8  # AI gets 80% of questions correct
-                
-                # Generate AI answer
-                if random.random() < ai_accuracy:
-                    ai_answer = correct_answer  # AI gets it right
-                    ai_is_correct = True
-                else:
-                    # AI gets it wrong - pick a wrong option
-                    options = ['A', 'B', 'C', 'D']
-                    wrong_options = [opt for opt in options if opt != correct_answer]
-                    ai_answer = random.choice(wrong_options)
-                    ai_is_correct = False
-                
-                print(f"AI answer: {ai_answer}, Correct: {ai_is_correct}")
-                
-                # Calculate points
-                if is_correct:
-                    if attempts == 1:
-                        user_points = 3
-                    elif attempts == 2:
-                        user_points = 2
-                    elif attempts == 3:
-                        user_points = 1
-                    else:
-                        user_points = 0
-                else:
-                    user_points = 0
-                
-                # AI gets points if correct (always award for new question)
-                bot_points = 0
-                if ai_is_correct:
-                    bot_points = 3  # AI gets 3 points for correct answer
-                    print(f"AI awarded {bot_points} points for question {question_id}")
-                
-                # Update scores
-                session['user_score'] = session.get('user_score', 0) + user_points
-                session['bot_score'] = session.get('bot_score', 0) + bot_points
-                
-                print(f"Score update: User +{user_points}, Bot +{bot_points}")
-                print(f"Current scores: User={session['user_score']}, Bot={session['bot_score']}")
-                
-                # Record the answer (record both correct and incorrect to track attempts)
-                cursor.execute("""
-                    INSERT OR REPLACE INTO user_bot_progress (user_id, question_id, answered_at, is_correct)
-                    VALUES (?, ?, datetime('now'), ?)
-                """, (user_id, question_id, 1 if is_correct else 0))
-                conn.commit()
-                
-                # Mark this question as attempted in current session
-                if 'attempted_questions' not in session:
-                    session['attempted_questions'] = []
-                session['attempted_questions'].append(question_id)
-                
-                # Track user's actual answer for results display
-                if 'user_answers' not in session:
-                    session['user_answers'] = {}
-                session['user_answers'][question_id] = selected_answer
-                
-                print(f"Question {question_id} recorded as attempted (correct: {is_correct}, answer: {selected_answer})")
-                
-                print("Answer processed successfully")
-                
-                # Check if we're in a session
-                if 'bot_session_questions' in session:
-                    current_index = session['current_question_index']
-                    total_questions = session['total_session_questions']
-                    user_score = session['user_score']
-                    bot_score = session['bot_score']
-                    
-                    if is_correct:
-                        # Move to next question if correct
-                        current_index += 1
-                        
-                        if current_index < total_questions:
-                            # Show next question
-                            session['current_question_index'] = current_index
-                            next_question = session['bot_session_questions'][current_index]
-                            
-                            # Generate AI answer for next question
-                            import random
-                            ai_accuracy = 0.8
-                            
-                            if random.random() < ai_accuracy:
-                                ai_answer = next_question['correct_answer']
-                                ai_is_correct = True
-                            else:
-                                options = ['A', 'B', 'C', 'D']
-                                wrong_options = [opt for opt in options if opt != next_question['correct_answer']]
-                                ai_answer = random.choice(wrong_options)
-                                ai_is_correct = False
-                            
-                            return render_template('bot_mode.html', 
-                                                 question=next_question,
-                                                 question_number=current_index + 1,
-                                                 total_questions=total_questions,
-                                                 user_score=user_score,
-                                                 bot_score=bot_score,
-                                                 ai_answer=ai_answer,
-                                                 is_ai_correct=ai_is_correct,
-                                                 show_result=False)
-                        else:
-                            # Session complete, show results
-                            final_user_score = session['user_score']
-                            final_bot_score = session['bot_score']
-                            
-                            session.pop('bot_session_questions', None)
-                            session.pop('current_question_index', None)
-                            session.pop('total_session_questions', None)
-                            
-                            return redirect(url_for('bot_results', user_score=final_user_score, bot_score=final_bot_score))
-                    else:
-                        # Wrong answer - show feedback and allow continue to next question
-                        return render_template('bot_mode.html',
-                                             previous_question=question,
-                                             user_answer=selected_answer,
-                                             is_user_correct=is_correct,
-                                             ai_answer=ai_answer,
-                                             is_ai_correct=ai_is_correct,
-                                             correct_answer=correct_answer,
-                                             show_result=True,
-                                             question_number=session.get('current_question_index', 1),
-                                             total_questions=session.get('total_session_questions', 1),
-                                             user_score=session.get('user_score', 0),
-                                             bot_score=session.get('bot_score', 0))
+            print(f"Question {question_id} recorded (correct: {is_correct}, answer: {selected_answer}, AI: {ai_answer})")
+            
+            # Check if we're in a session
+            if bot:
+                if bot.state == ASKING:
+                    # Correct answer, show next question
+                    return render_bot_question(bot)
+                elif bot.state == FINISHED:
+                    return finish_bot_session(bot)
                 else:
-                    # Not in a session, show feedback and continue
-                    return render_template('bot_feedback.html', 
-                                         question=question,
-                                         selected_answer=selected_answer,
-                                         correct_answer=correct_answer,
-                                         ai_answer=ai_answer,
-                                         is_ai_correct=ai_is_correct,
-                                         is_correct=is_correct)
+                    # Wrong answer - show feedback and allow continue to next question
+                    return render_bot_feedback(bot, question, selected_answer)
             else:
-                print("Question not found")
-                flash('Question not found')
-                return redirect(url_for('bot_mode'))
-            
-        except Exception as e:
-            print(f"Submit bot answer error: {e}")
-            import traceback
-            traceback.print_exc()
-            flash(f'Error submitting answer: {str(e)}')
+                # Not in a session, show feedback and continue
+                return render_template('bot_feedback.html', 
+                                     question=question,
+                                     selected_answer=selected_answer,
+                                     correct_answer=correct_answer,
+                                     ai_answer=ai_answer,
+                                     is_ai_correct=ai_is_correct,
+                                     is_correct=is_correct)
+        else:
+            print("Question not found")
+            flash('Question not found')
             return redirect(url_for('bot_mode'))
-        finally:
-            conn.close()
-    else:
-        print("Database connection failed")
-        flash('Database connection failed')
+        
+    except Exception as e:
+        print(f"Submit bot answer error: {e}")
+        import traceback
+        traceback.print_exc()
+        flash(f'Error submitting answer: {str(e)}')
         return redirect(url_for('bot_mode'))
 
 @app.route('/submit_level/<int:level_id>', methods=['POST'])
@@ -703,76 +492,49 @@ def submit_level(level_id):
         flash('Please answer all questions')
         return redirect(url_for('play_level', level_id=level_id))
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # Get detailed results with explanations
-            results = []
-            total_questions = len(answers)
-            correct_answers = 0
-            
-            for question_id, selected_answer in answers.items():
-                cursor.execute("SELECT * FROM questions WHERE id = ?", (question_id,))
-                question_row = cursor.fetchone()
-                
-                if not question_row:
-                    print(f"Question not found: {question_id}")
-                    flash(f'Question {question_id} not found')
-                    return redirect(url_for('play_level', level_id=level_id))
-                
-                question = dict(question_row)
-                is_correct = selected_answer == question['correct_answer']
-                if is_correct:
-                    correct_answers += 1
-                
-                results.append({
-                    'question': question,
-                    'user_answer': selected_answer,
-                    'selected_answer': selected_answer,
-                    'is_correct': is_correct,
-                    'question_text': question['question_text'],
-                    'explanation': question['explanation'],
-                    'correct_answer': question['correct_answer'],
-                    'options': {
-                        'A': question['option_a'],
-                        'B': question['option_b'],
-                        'C': question['option_c'],
-                        'D': question['option_d']
-                    }
-                })
-            
-            score = int((correct_answers / total_questions) * 100) if total_questions > 0 else 0
-            
-            # Update user progress
-            cursor.execute("""
-                INSERT OR REPLACE INTO user_progress (user_id, level_id, score, completed, updated_at)
-                VALUES (?, ?, ?, ?, datetime('now'))
-            """, (user_id, level_id, score, 1 if score >= 60 else 0))
-            conn.commit()
-            
-            print(f"Level completed: score={score}%")
+    try:
+        # Get detailed results with explanations
+        results = []
+        # Only this level's questions are graded, and the score is out of all of them
+        questions = {str(question.id): question for question in storage.list_questions(level_id)}
+        total_questions = len(questions)
+        correct_answers = 0
+        
+        for question_id, selected_answer in answers.items():
+            question = questions.get(question_id)
             
-            # Show detailed results
-            cursor.execute("SELECT * FROM levels WHERE id = ?", (level_id,))
-            level = dict(cursor.fetchone())
+            if not question:
+                print(f"Question {question_id} is not part of level {level_id}")
+                flash(f'Question {question_id} not found')
+                return redirect(url_for('play_level', level_id=level_id))
             
-            return render_template('play_level.html', 
-                                 level=level, 
-                                 results=results,
-                                 show_results=True,
-                                 score=score,
-                                 correct_answers=correct_answers,
-                                 total_questions=total_questions)
+            is_correct = selected_answer == question.correct_answer
+            if is_correct:
+                correct_answers += 1
             
-        except Exception as e:
-            print(f"Submit level error: {e}")
-            import traceback
-            traceback.print_exc()
-            flash(f'Error submitting level: {str(e)}')
-        finally:
-            conn.close()
+            results.append(AnswerResult(question, selected_answer, is_correct))
+        
+        # Update user progress
+        score, completed = save_level_result(user_id, level_id, results, total_questions)
+        
+        print(f"Level completed: score={score}%")
+        
+        # Show detailed results
+        level = storage.get_level(level_id)
+        
+        return render_template('play_level.html', 
+                             level=level, 
+                             results=results,
+                             show_results=True,
+                             score=score,
+                             correct_answers=correct_answers,
+                             total_questions=total_questions)
+        
+    except Exception as e:
+        print(f"Submit level error: {e}")
+        import traceback
+        traceback.print_exc()
+        flash(f'Error submitting level: {str(e)}')
     
     return redirect(url_for('levels'))
 
@@ -783,42 +545,35 @@ def submit_scenario_answer(scenario_id, question_number):
     
     selected_answer = request.form.get('answer')
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # Get current question data
-            cursor.execute("SELECT * FROM scenario_steps WHERE scenario_id = ? AND step_number = ?", (scenario_id, question_number))
-            question = dict(cursor.fetchone())
-            
-            # Check if answer is correct
-            is_correct = selected_answer == question['correct_answer']
-            
-            # Store the answer
-            if 'scenario_answers' not in session:
-                session['scenario_answers'] = []
-            session['scenario_answers'].append({
-                'question_number': question_number,
-                'question_text': question['story_context'],
-                'selected_answer': selected_answer,
-                'correct_answer': question['correct_answer'],
-                'is_correct': is_correct
-            })
+    try:
+        # Get current question data
+        question = content.scenario(scenario_id).step(question_number)
+        
+        # Check if answer is correct
+        is_correct = selected_answer == question['correct_answer']
+        
+        # Store the answer
+        if 'scenario_answers' not in session:
+            session['scenario_answers'] = []
+        session['scenario_answers'].append({
+            'question_number': question_number,
+            'question_text': question['story_context'],
+            'selected_answer': selected_answer,
+            'correct_answer': question['correct_answer'],
+            'is_correct': is_correct
+        })
+        
+        # Show feedback
+        return render_template('scenario_feedback.html',
+                             scenario_id=scenario_id,
+                             question_number=question_number,
+                             question=question,
+                             selected_answer=selected_answer,
+                             is_correct=is_correct)
             
-            # Show feedback
-            return render_template('scenario_feedback.html',
-                                 scenario_id=scenario_id,
-                                 question_number=question_number,
-                                 question=question,
-                                 selected_answer=selected_answer,
-                                 is_correct=is_correct)
-                
-        except Exception as e:
-            print(f"Submit scenario answer error: {e}")
-            flash('Error submitting answer')
-        finally:
-            conn.close()
+    except Exception as e:
+        print(f"Submit scenario answer error: {e}")
+        flash('Error submitting answer')
     
     return redirect(url_for('play_scenario', scenario_id=scenario_id))
 
@@ -827,41 +582,33 @@ def continue_scenario(scenario_id, question_number):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    next_question = question_number + 1
+    # Follow the branch for the answer just given to this step, if any
+    answer = next((a['selected_answer'] for a in reversed(session.get('scenario_answers', []))
+                   if a['question_number'] == question_number), None)
     
     # Check if there are more questions
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM scenario_steps WHERE scenario_id = ? AND step_number = ?", (scenario_id, next_question))
-            has_next = cursor.fetchone()[0] > 0
+    try:
+        graph = content.scenario(scenario_id)
+        next_question = graph.next_step(question_number, answer)
+        
+        if next_question is not None:
+            return redirect(url_for('show_scenario_question', scenario_id=scenario_id, question_number=next_question))
+        else:
+            # Scenario complete - record completion and show completion page
+            scenario = graph.scenario
             
-            if has_next:
-                return redirect(url_for('show_scenario_question', scenario_id=scenario_id, question_number=next_question))
-            else:
-                # Scenario complete - record completion and show completion page
-                cursor.execute("SELECT * FROM scenario_chains WHERE id = ?", (scenario_id,))
-                scenario = dict(cursor.fetchone())
-                
-                # Record scenario completion in database
-                user_id = session['user_id']
-                cursor.execute("""
-                    INSERT OR REPLACE INTO user_scenario_progress (user_id, scenario_id, completed, completed_at)
-                    VALUES (?, ?, 1, datetime('now'))
-                """, (user_id, scenario_id))
-                conn.commit()
-                print(f"Scenario {scenario_id} marked as completed for user {user_id}")
-                
-                return render_template('scenario_complete.html',
-                                     scenario=scenario,
-                                     answers=session.get('scenario_answers', []))
-                
-        except Exception as e:
-            print(f"Continue scenario error: {e}")
-            flash('Error continuing scenario')
-        finally:
-            conn.close()
+            # Record scenario completion in database
+            user_id = session['user_id']
+            storage.mark_scenario_completed(user_id, scenario_id)
+            print(f"Scenario {scenario_id} marked as completed for user {user_id}")
+            
+            return render_template('scenario_complete.html',
+                                 scenario=scenario,
+                                 answers=session.get('scenario_answers', []))
+            
+    except Exception as e:
+        print(f"Continue scenario error: {e}")
+        flash('Error continuing scenario')
     
     return redirect(url_for('scenario_chains'))
 
@@ -870,38 +617,29 @@ def play_scenario_step(scenario_id, step_number):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # Get scenario info
-            cursor.execute("SELECT * FROM scenario_chains WHERE id = ?", (scenario_id,))
-            scenario = dict(cursor.fetchone())
-            
-            # Get the specific step
-            cursor.execute("SELECT * FROM scenario_steps WHERE scenario_id = ? AND step_number = ?", (scenario_id, step_number))
-            current_step_data = cursor.fetchone()
+    try:
+        # Get scenario info
+        graph = content.scenario(scenario_id)
+        scenario = graph.scenario
+        
+        # Get the specific step
+        current_step = graph.step(step_number)
+        
+        if current_step:
+            return render_template('play_scenario.html', 
+                                 scenario=scenario, 
+                                 current_step=current_step,
+                                 step_number=step_number)
+        else:
+            # No more steps, show outcome
+            outcome = graph.outcome
+            return render_template('scenario_outcome.html',
+                                 scenario_id=scenario_id,
+                                 outcome=outcome)
             
-            if current_step_data:
-                current_step = dict(current_step_data)
-                return render_template('play_scenario.html', 
-                                     scenario=scenario, 
-                                     current_step=current_step,
-                                     step_number=step_number)
-            else:
-                # No more steps, show outcome
-                cursor.execute("SELECT * FROM scenario_outcomes WHERE scenario_id = ?", (scenario_id,))
-                outcome = dict(cursor.fetchone())
-                return render_template('scenario_outcome.html',
-                                     scenario_id=scenario_id,
-                                     outcome=outcome)
-                
-        except Exception as e:
-            print(f"Play scenario step error: {e}")
-            flash('Error loading scenario step')
-        finally:
-            conn.close()
+    except Exception as e:
+        print(f"Play scenario step error: {e}")
+        flash('Error loading scenario step')
     
     return redirect(url_for('scenario_chains'))
 
@@ -910,24 +648,17 @@ def show_scenario_outcome(scenario_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # Get outcome
-            cursor.execute("SELECT * FROM scenario_outcomes WHERE scenario_id = ?", (scenario_id,))
-            outcome = dict(cursor.fetchone())
+    try:
+        # Get outcome
+        outcome = content.scenario(scenario_id).outcome
+        
+        return render_template('scenario_outcome.html',
+                             scenario_id=scenario_id,
+                             outcome=outcome)
             
-            return render_template('scenario_outcome.html',
-                                 scenario_id=scenario_id,
-                                 outcome=outcome)
-                
-        except Exception as e:
-            print(f"Show scenario outcome error: {e}")
-            flash('Error loading outcome')
-        finally:
-            conn.close()
+    except Exception as e:
+        print(f"Show scenario outcome error: {e}")
+        flash('Error loading outcome')
     
     return redirect(url_for('scenario_chains'))
 
@@ -936,27 +667,15 @@ def retry_same_question():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    question_id = request.form.get('question_id')
+    question_id = request.form.get('question_id', type=int)
     
     print(f"Retry same question: question_id={question_id}")
     
-    if 'bot_session_questions' in session and question_id:
-        # Find the question in the session and show it again
-        for question in session['bot_session_questions']:
-            if str(question['id']) == str(question_id):
-                current_index = session['current_question_index']
-                total_questions = session['total_session_questions']
-                user_score = session.get('user_score', 0)
-                bot_score = session.get('bot_score', 0)
-                
-                print(f"Found question for retry, current scores: User={user_score}, Bot={bot_score}")
-                
-                return render_template('bot_mode.html', 
-                                     question=question,
-                                     question_number=current_index + 1,
-                                     total_questions=total_questions,
-                                     user_score=user_score,
-                                     bot_score=bot_score)
+    bot = BotSession.load(session)
+    if bot and question_id and bot.retry(question_id):
+        bot.save(session)
+        print(f"Found question for retry, current scores: User={bot.user_score}, Bot={bot.bot_score}")
+        return render_bot_question(bot)
     
     print("Question not found for retry, falling back to bot_mode")
     # Fallback to bot_mode
@@ -972,90 +691,33 @@ def continue_bot_session():
     print("Continue bot session called")
     
     # Check if we're in a session
-    if 'bot_session_questions' in session:
-        current_index = session['current_question_index']
-        total_questions = session['total_session_questions']
-        user_score = session.get('user_score', 0)
-        bot_score = session.get('bot_score', 0)
-        
-        print(f"Session data: current_index={current_index}, total={total_questions}")
-        
+    bot = BotSession.load(session)
+    if bot and bot.state != FINISHED:
         # Move to next question
-        current_index += 1
+        bot.advance()
         
-        if current_index < total_questions:
-            # Show next question
-            session['current_question_index'] = current_index
-            next_question = session['bot_session_questions'][current_index]
-            
-            print(f"Moving to next question: {current_index + 1} of {total_questions}")
-            
-            # Generate AI answer for next question
-            import random
-            ai_accuracy = 0.8
-            
-            if random.random() < ai_accuracy:
-                ai_answer = next_question['correct_answer']
-                ai_is_correct = True
-            else:
-                options = ['A', 'B', 'C', 'D']
-                wrong_options = [opt for opt in options if opt != next_question['correct_answer']]
-                ai_answer = random.choice(wrong_options)
-                ai_is_correct = False
-            
-            return render_template('bot_mode.html', 
-                                 question=next_question,
-                                 question_number=current_index + 1,
-                                 total_questions=total_questions,
-                                 user_score=user_score,
-                                 bot_score=bot_score,
-                                 ai_answer=ai_answer,
-                                 is_ai_correct=ai_is_correct,
-                                 show_result=False)
+        if bot.state == ASKING:
+            bot.save(session)
+            print(f"Moving to next question: {bot.question_number} of {bot.total}")
+            return render_bot_question(bot)
         else:
-            # Session complete, show results
-            final_user_score = session.get('user_score', 0)
-            final_bot_score = session.get('bot_score', 0)
-            
-            print(f"Session complete, final scores: User={final_user_score}, Bot={final_bot_score}")
-            
-            session.pop('bot_session_questions', None)
-            session.pop('current_question_index', None)
-            session.pop('total_session_questions', None)
-            
-            return redirect(url_for('bot_results', user_score=final_user_score, bot_score=final_bot_score))
+            return finish_bot_session(bot)
     else:
         print("Not in a session, getting random question")
         # Not in a session, get a random question
-        conn = get_db_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    SELECT bq.* FROM bot_questions bq 
-                    LEFT JOIN user_bot_progress ubp ON bq.id = ubp.question_id AND ubp.user_id = ?
-                    WHERE ubp.question_id IS NULL 
-                    ORDER BY RANDOM() 
-                    LIMIT 1
-                """, (user_id,))
-                next_question = cursor.fetchone()
-                
-                if next_question:
-                    next_question_dict = dict(next_question)
-                    return render_template('bot_mode.html', question=next_question_dict)
-                else:
-                    # No more questions, show final results
-                    return redirect(url_for('bot_results'))
-                
-            except Exception as e:
-                print(f"Continue bot session error: {e}")
-                flash('Error getting next question')
-                return redirect(url_for('bot_mode'))
-            finally:
-                conn.close()
-    
-    return redirect(url_for('bot_mode'))
+        try:
+            unanswered = storage.list_unanswered_bot_questions(user_id, 1, shuffle=True)
+            
+            if unanswered:
+                return render_template('bot_mode.html', question=unanswered[0])
+            else:
+                # No more questions, show final results
+                return redirect(url_for('bot_results'))
+            
+        except Exception as e:
+            print(f"Continue bot session error: {e}")
+            flash('Error getting next question')
+            return redirect(url_for('bot_mode'))
 
 @app.route('/bot_results')
 def bot_results():
@@ -1067,114 +729,236 @@ def bot_results():
     print(f"Bot results called for user: {user_id}")
     
     # Get scores from URL parameters or session
-    user_score = request.args.get('user_score', type=int) or session.get('user_score', 0)
-    bot_score = request.args.get('bot_score', type=int) or session.get('bot_score', 0)
+    bot = BotSession.load(session)
+    user_score = request.args.get('user_score', type=int) or (bot.user_score if bot else 0)
+    bot_score = request.args.get('bot_score', type=int) or (bot.bot_score if bot else 0)
     
     print(f"Scores: User={user_score}, Bot={bot_score}")
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # Get user's bot progress with details
-            cursor.execute("""
-                SELECT ubp.question_id, ubp.is_correct, bq.correct_answer, bq.explanation, bq.question_text, bq.option_a, bq.option_b, bq.option_c, bq.option_d
-                FROM user_bot_progress ubp
-                JOIN bot_questions bq ON ubp.question_id = bq.id
-                WHERE ubp.user_id = ?
-                ORDER BY ubp.answered_at ASC
-            """, (user_id,))
-            results = cursor.fetchall()
-            
-            total_answered = len(results)
-            correct_answers = sum(1 for r in results if r[0] == 1)
-            
-            # Check if all questions are completed
-            cursor.execute("SELECT COUNT(*) FROM bot_questions")
-            total_questions = cursor.fetchone()[0]
-            all_completed = total_answered >= total_questions
-            
-            print(f"Database results: {total_answered} questions, {correct_answers} correct, all_completed: {all_completed}")
+    try:
+        # Get user's bot progress with details
+        results = storage.bot_answer_history(user_id)
+        
+        stats = storage.get_bot_stats(user_id)
+        total_answered = stats.answered
+        correct_answers = stats.correct
+        
+        # Check if all questions are completed
+        total_questions = content.bot_question_count()
+        all_completed = total_answered >= total_questions
+        
+        print(f"Database results: {total_answered} questions, {correct_answers} correct, all_completed: {all_completed}")
+        
+        # Structure data for template: the answers as recorded, and the
+        # opponent's pre-rolled ones for the questions of the current round
+        questions = []
+        user_answers = []
+        ai_answers = []
+        
+        for r in results:
+            questions.append({
+                'question_text': r.question_text,
+                'correct_answer': r.correct_answer,
+                'explanation': r.explanation
+            })
             
-            # Structure data for template
-            questions = []
-            user_answers = []
-            ai_answers = []
-            user_answers_session = session.get('user_answers', {})
+            user_answers.append({
+                'answer': r.answer or '-',
+                'is_correct': bool(r.is_correct)
+            })
             
-            for r in results:
-                question_id = str(r[0])  # question_id is first column
-                
-                # Question data
-                questions.append({
-                    'question_text': r[4],
-                    'correct_answer': r[2],
-                    'explanation': r[3]
-                })
-                
-                # User answer data - use actual answer from session
-                actual_user_answer = user_answers_session.get(question_id, r[2])  # Fallback to correct answer if not found
-                
-                user_answers.append({
-                    'answer': actual_user_answer,
-                    'is_correct': r[1] == 1
-                })
-                
-                # AI answer data (simulate AI response - AI gets it right)
+            if bot and bot.has_question(r.question_id):
+                ai_answer = bot.ai_answer(r.question_id)
                 ai_answers.append({
-                    'answer': r[2],  # AI gives correct answer
-                    'is_correct': True
+                    'answer': ai_answer,
+                    'is_correct': ai_answer == r.correct_answer
                 })
-            
-            # Calculate total possible points
-            total_possible_points = total_answered * 3
-            
-            return render_template('bot_results.html', 
-                                 questions=questions,
-                                 user_answers=user_answers,
-                                 ai_answers=ai_answers,
-                                 user_score=user_score,
-                                 ai_score=bot_score,
-                                 total_questions=total_answered,
-                                 total_possible_points=total_possible_points,
-                                 all_completed=all_completed)
-            
-        except Exception as e:
-            print(f"Bot results error: {e}")
-            import traceback
-            traceback.print_exc()
-            flash('Error loading results')
-            return redirect(url_for('bot_mode'))
-        finally:
-            conn.close()
-    else:
-        print("Database connection failed for bot results")
-        flash('Database connection failed')
+            else:
+                ai_answers.append(None)
+        
+        # Calculate total possible points
+        total_possible_points = total_answered * 3
+        
+        return render_template('bot_results.html', 
+                             questions=questions,
+                             user_answers=user_answers,
+                             ai_answers=ai_answers,
+                             user_score=user_score,
+                             ai_score=bot_score,
+                             total_questions=total_answered,
+                             total_possible_points=total_possible_points,
+                             all_completed=all_completed)
+        
+    except Exception as e:
+        print(f"Bot results error: {e}")
+        import traceback
+        traceback.print_exc()
+        flash('Error loading results')
         return redirect(url_for('bot_mode'))
 
+@app.route('/multiplayer')
+def multiplayer():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    # Matches themselves run on the ASGI server (asgi.py) under /match
+    return render_template('multiplayer.html')
+
+@app.route('/leaderboard')
+def show_leaderboard():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    try:
+        role = content.role(request.args.get('role', type=int))
+        weekly = request.args.get('period') == 'week'
+        if role:
+            name, title = role_board(role.id), role.name
+        elif weekly:
+            name, title = week_board(), 'This Week'
+        else:
+            name, title = GLOBAL, 'All Time'
+        entries, (rank, score, players) = leaderboard(name, session['user_id'])
+        return render_template('leaderboard.html',
+                             title=title,
+                             entries=entries,
+                             rank=rank,
+                             score=score,
+                             players=players,
+                             roles=content.role_list(),
+                             current_role=role,
+                             weekly=weekly and not role)
+    except Exception as e:
+        print(f"Leaderboard error: {e}")
+        flash('Error loading leaderboard')
+    
+    return redirect(url_for('mode_select'))
+
 @app.route('/reset_bot_questions')
 def reset_bot_questions():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
     user_id = session['user_id']
-    conn = get_db_connection()
+    try:
+        reset_bot_progress(user_id)
+        flash('Bot progress reset successfully')
+    except Exception as e:
+        print(f"Reset bot questions error: {e}")
+        flash('Error resetting progress')
     
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM user_bot_progress WHERE user_id = ?", (user_id,))
-            conn.commit()
-            flash('Bot progress reset successfully')
-        except Exception as e:
-            print(f"Reset bot questions error: {e}")
-            flash('Error resetting progress')
-        finally:
-            conn.close()
+    return redirect(url_for('bot_mode'))
+
+def review_question(kind, question_id):
+    """Question row for a review card, from whichever table it came from"""
+    if kind == BOT:
+        return content.bot_question(question_id)
+    if kind == LEVEL:
+        return storage.get_question(question_id)
+    if kind == ROLE:
+        return storage.get_role_question(question_id)
+    return None
+
+def render_review_question(review):
+    """bot_mode.html in review mode for the current card of a review round"""
+    kind, question_id = review['items'][review['index']]
+    return render_template('bot_mode.html',
+                         review=True,
+                         review_kind=kind,
+                         question=review_question(kind, question_id),
+                         question_number=review['index'] + 1,
+                         total_questions=len(review['items']),
+                         show_result=False)
+
+@app.route('/review')
+def start_review():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    user_id = session['user_id']
+    try:
+        cards = reviews.due(user_id)
+        if not cards:
+            flash('No reviews due right now')
+            return redirect(url_for('bot_mode'))
+        
+        session['review'] = {'items': [[card.kind, card.question_id] for card in cards], 'index': 0, 'correct': 0}
+        print(f"Started review for user {user_id} with {len(cards)} cards")
+        return render_review_question(session['review'])
+    except Exception as e:
+        print(f"Start review error: {e}")
+        flash('Error starting review')
+    
+    return redirect(url_for('bot_mode'))
+
+@app.route('/submit_review_answer', methods=['POST'])
+def submit_review_answer():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    user_id = session['user_id']
+    review = session.get('review')
+    question_id = request.form.get('question_id', type=int)
+    selected_answer = request.form.get('answer')
+    
+    if not review or not question_id or not selected_answer:
+        flash('Please select an answer')
+        return redirect(url_for('bot_mode'))
+    
+    # Grade only the round's current card, and each card once: the index
+    # moves past it here, so a resubmitted form no longer matches
+    if review['index'] >= len(review['items']):
+        flash('This review round is already complete')
+        return redirect(url_for('bot_mode'))
+    kind, current_id = review['items'][review['index']]
+    if question_id != current_id or request.form.get('kind') != kind:
+        flash('That question is not the current review question')
+        return redirect(url_for('bot_mode'))
+    
+    try:
+        question = review_question(kind, question_id)
+        if question is None:
+            flash(f'Question {question_id} not found')
+            return redirect(url_for('bot_mode'))
+        is_correct = selected_answer == question.correct_answer
+        card = reviews.grade(user_id, kind, question_id, is_correct)
+        print(f"Review {kind}:{question_id} correct={is_correct}, next in {card.interval_days:g} days")
+        
+        if is_correct:
+            review['correct'] += 1
+        review['index'] += 1
+        session['review'] = review
+        
+        return render_template('bot_mode.html',
+                             review=True,
+                             previous_question=question,
+                             user_answer=selected_answer,
+                             is_user_correct=is_correct,
+                             correct_answer=question.correct_answer,
+                             show_result=True,
+                             question_number=review['index'],
+                             total_questions=len(review['items']))
+    except Exception as e:
+        print(f"Submit review answer error: {e}")
+        flash('Error submitting answer')
     
     return redirect(url_for('bot_mode'))
 
+@app.route('/continue_review', methods=['POST'])
+def continue_review():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    review = session.get('review')
+    if not review:
+        return redirect(url_for('bot_mode'))
+    
+    if review['index'] < len(review['items']):
+        return render_review_question(review)
+    
+    session.pop('review', None)
+    flash(f"Review complete: {review['correct']} of {len(review['items'])} correct")
+    return redirect(url_for('bot_mode'))
+
 @app.route('/reset_scenario/<int:scenario_id>')
 def reset_scenario(scenario_id):
     if 'user_id' not in session:
@@ -1184,29 +968,27 @@ def reset_scenario(scenario_id):
 
 
 @app.route('/rpg_game')
+@conditional_page(rpg_progress)
 def rpg_game():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    return render_template('rpg_game.html')
+    return render_template('rpg_game.html', region_size=REGION_SIZE, interaction=INTERACTION,
+                           saved=rpg_progress(session['user_id']))
 
 
 @app.route('/role_select')
+@shell_page(content.content_version)
 def role_select():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name, description FROM roles")
-            roles = [dict(row) for row in cursor.fetchall()]
-            return render_template('role_select.html', roles=roles)
-        except Exception as e:
-            print(f"Role select error: {e}")
-            flash('Error loading roles')
-        finally:
-            conn.close()
+    try:
+        # Cached content, so the shell_page version covers it
+        roles = content.role_list()
+        return render_template('role_select.html', roles=roles)
+    except Exception as e:
+        print(f"Role select error: {e}")
+        flash('Error loading roles')
     
     return redirect(url_for('mode_select'))
 
@@ -1226,47 +1008,16 @@ def role_levels(role_id):
         return redirect(url_for('login'))
     
     user_id = session['user_id']
-    conn = get_db_connection()
-    
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT id, name, description FROM roles WHERE id = ?", (role_id,))
-            role = dict(cursor.fetchone())
-            
-            cursor.execute("SELECT id, role_id, level_number, title, description FROM role_levels WHERE role_id = ? ORDER BY level_number", (role_id,))
-            all_levels = [dict(row) for row in cursor.fetchall()]
-            
-            cursor.execute("SELECT role_level_id FROM user_role_progress WHERE user_id = ? AND role_id = ? AND completed = 1", (user_id, role_id))
-            completed_levels = {dict(row)['role_level_id'] for row in cursor.fetchall()}
-            
-            levels_data = []
-            for level in all_levels:
-                level_id = level['id']
-                level_num = level['level_number']
-                
-                if level_num == 1:
-                    unlocked = True
-                else:
-                    prev_level = next((l for l in all_levels if l['level_number'] == level_num - 1), None)
-                    unlocked = prev_level['id'] in completed_levels if prev_level else False
-                
-                levels_data.append({
-                    'id': level_id,
-                    'level_number': level_num,
-                    'title': level['title'],
-                    'description': level['description'],
-                    'unlocked': unlocked,
-                    'completed': level_id in completed_levels
-                })
-            
-            return render_template('role_levels.html', role=role, levels=levels_data)
-        except Exception as e:
-            print(f"Role levels error: {e}")
-            flash('Error loading levels')
-        finally:
-            conn.close()
+    try:
+        role = content.role(role_id)
+        track = content.track(role_track(role_id))
+        summary = progress.summary(user_id, role_track(role_id))
+        levels_data = track.entries(summary.completed)
+        
+        return render_template('role_levels.html', role=role, levels=levels_data)
+    except Exception as e:
+        print(f"Role levels error: {e}")
+        flash('Error loading levels')
     
     return redirect(url_for('role_select'))
 
@@ -1276,26 +1027,15 @@ def play_role_level(role_level_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM role_levels WHERE id = ?", (role_level_id,))
-            role_level = dict(cursor.fetchone())
-            
-            cursor.execute("SELECT * FROM role_questions WHERE role_level_id = ?", (role_level_id,))
-            questions = [dict(row) for row in cursor.fetchall()]
-            
-            cursor.execute("SELECT name FROM roles WHERE id = ?", (role_level['role_id'],))
-            role_name = cursor.fetchone()['name']
-            
-            return render_template('play_role_level.html', role_level=role_level, questions=questions, role_name=role_name)
-        except Exception as e:
-            print(f"Play role level error: {e}")
-            flash('Error loading level')
-        finally:
-            conn.close()
+    try:
+        role_level = content.role_level(role_level_id)
+        questions = storage.list_role_questions(role_level_id)
+        role_name = content.role(role_level.role_id).name
+        
+        return render_template('play_role_level.html', role_level=role_level, questions=questions, role_name=role_name)
+    except Exception as e:
+        print(f"Play role level error: {e}")
+        flash('Error loading level')
     
     return redirect(url_for('role_select'))
 
@@ -1306,7 +1046,6 @@ def submit_role_level(role_level_id):
         return redirect(url_for('login'))
     
     user_id = session['user_id']
-    role_id = session.get('selected_role_id')
     
     answers = {}
     for key in request.form:
@@ -1318,79 +1057,51 @@ def submit_role_level(role_level_id):
         flash('Please answer all questions')
         return redirect(url_for('play_role_level', role_level_id=role_level_id))
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            results = []
-            total_questions = len(answers)
-            correct_answers = 0
-            
-            for question_id, selected_answer in answers.items():
-                cursor.execute("SELECT * FROM role_questions WHERE id = ?", (question_id,))
-                question_row = cursor.fetchone()
-                
-                if not question_row:
-                    continue
-                
-                question = dict(question_row)
-                is_correct = selected_answer == question['correct_answer']
-                if is_correct:
-                    correct_answers += 1
-                
-                results.append({
-                    'question': question,
-                    'user_answer': selected_answer,
-                    'selected_answer': selected_answer,
-                    'is_correct': is_correct,
-                    'question_text': question['question_text'],
-                    'explanation': question['explanation'],
-                    'correct_answer': question['correct_answer'],
-                    'options': {
-                        'A': question['option_a'],
-                        'B': question['option_b'],
-                        'C': question['option_c'],
-                        'D': question['option_d']
-                    }
-                })
-            
-            score = int((correct_answers / total_questions) * 100) if total_questions > 0 else 0
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO user_role_progress (user_id, role_id, role_level_id, score, completed, updated_at)
-                VALUES (?, ?, ?, ?, ?, datetime('now'))
-            """, (user_id, role_id, role_level_id, score, 1 if score >= 60 else 0))
-            conn.commit()
-            
-            cursor.execute("SELECT * FROM role_levels WHERE id = ?", (role_level_id,))
-            role_level = dict(cursor.fetchone())
+    try:
+        results = []
+        questions = {str(question.id): question for question in storage.list_role_questions(role_level_id)}
+        total_questions = len(questions)
+        correct_answers = 0
+        
+        for question_id, selected_answer in answers.items():
+            question = questions.get(question_id)
             
-            cursor.execute("SELECT name FROM roles WHERE id = ?", (role_id,))
-            role_name = cursor.fetchone()['name']
+            if not question:
+                continue
             
-            return render_template('play_role_level.html', 
-                                 role_level=role_level, 
-                                 questions=[],
-                                 role_name=role_name,
-                                 results=results,
-                                 show_results=True,
-                                 score=score,
-                                 correct_answers=correct_answers,
-                                 total_questions=total_questions)
+            is_correct = selected_answer == question.correct_answer
+            if is_correct:
+                correct_answers += 1
             
-        except Exception as e:
-            print(f"Submit role level error: {e}")
-            import traceback
-            traceback.print_exc()
-            flash(f'Error submitting level: {str(e)}')
-        finally:
-            conn.close()
+            results.append(AnswerResult(question, selected_answer, is_correct))
+        
+        # The track comes from the level itself, not from whichever role was last selected
+        role_level = content.role_level(role_level_id)
+        score, completed = save_role_level_result(user_id, role_level, results, total_questions)
+        
+        role_name = content.role(role_level.role_id).name
+        
+        return render_template('play_role_level.html', 
+                             role_level=role_level, 
+                             questions=[],
+                             role_name=role_name,
+                             results=results,
+                             show_results=True,
+                             score=score,
+                             correct_answers=correct_answers,
+                             total_questions=total_questions)
+        
+    except Exception as e:
+        print(f"Submit role level error: {e}")
+        import traceback
+        traceback.print_exc()
+        flash(f'Error submitting level: {str(e)}')
     
     return redirect(url_for('role_select'))
 
 
 @app.route('/legal_chatbot', methods=['GET', 'POST'])
+@conditional_page()
 def legal_chatbot():
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -1419,57 +1130,50 @@ def legal_chatbot():
                     print(f"AI search error: {e}")
             
             # Also check database for matching scenario
-            conn = get_db_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    
-                    cursor.execute("SELECT id, domain, law_involved, title FROM scenario_chains")
-                    all_scenarios = [dict(row) for row in cursor.fetchall()]
-                    
-                    user_scenario_lower = user_scenario.lower()
-                    
-                    keywords_map = {
-                        'consumer': ['consumer', 'mrp', 'overcharge', 'refund', 'defective', 'warranty', 'shop', 'store', 'buy', 'purchase', 'product', 'bad'],
-                        'labour': ['employee', 'employer', 'workplace', 'salary', 'leave', 'maternity', 'rights', 'termination', 'harassment', 'fired', 'job'],
-                        'cyber': ['aadhaar', 'data', 'privacy', 'online', 'digital', 'password', 'account', 'hack', 'cyber', 'spam', 'email'],
-                        'property': ['property', 'land', 'house', 'rent', 'tenant', 'landlord', 'ownership', 'deed', 'eviction'],
-                        'contract': ['contract', 'agreement', 'breach', 'party', 'terms', 'promise', 'signed'],
-                        'criminal': ['theft', 'robbery', 'assault', 'murder', 'fraud', 'crime', 'police', 'arrested'],
-                        'constitutional': ['rights', 'freedom', 'constitution', 'discrimination', 'equal', ' discrimination']
-                    }
-                    
-                    scenario_scores = []
-                    for scenario in all_scenarios:
-                        score = 0
-                        domain_lower = scenario['domain'].lower()
-                        law_lower = scenario['law_involved'].lower()
-                        title_lower = scenario['title'].lower()
-                        
-                        for category, keywords in keywords_map.items():
-                            if any(kw in user_scenario_lower for kw in keywords):
-                                if category in domain_lower or category in law_lower:
-                                    score += 3
-                                if any(kw in title_lower for kw in keywords):
-                                    score += 2
-                        
-                        scenario_scores.append((scenario, score))
+            try:
+                all_scenarios = storage.list_scenarios()
+                
+                user_scenario_lower = user_scenario.lower()
+                
+                keywords_map = {
+                    'consumer': ['consumer', 'mrp', 'overcharge', 'refund', 'defective', 'warranty', 'shop', 'store', 'buy', 'purchase', 'product', 'bad'],
+                    'labour': ['employee', 'employer', 'workplace', 'salary', 'leave', 'maternity', 'rights', 'termination', 'harassment', 'fired', 'job'],
+                    'cyber': ['aadhaar', 'data', 'privacy', 'online', 'digital', 'password', 'account', 'hack', 'cyber', 'spam', 'email'],
+                    'property': ['property', 'land', 'house', 'rent', 'tenant', 'landlord', 'ownership', 'deed', 'eviction'],
+                    'contract': ['contract', 'agreement', 'breach', 'party', 'terms', 'promise', 'signed'],
+                    'criminal': ['theft', 'robbery', 'assault', 'murder', 'fraud', 'crime', 'police', 'arrested'],
+                    'constitutional': ['rights', 'freedom', 'constitution', 'discrimination', 'equal', ' discrimination']
+                }
+                
+                scenario_scores = []
+                for scenario in all_scenarios:
+                    score = 0
+                    domain_lower = scenario['domain'].lower()
+                    law_lower = scenario['law_involved'].lower()
+                    title_lower = scenario['title'].lower()
                     
-                    scenario_scores.sort(key=lambda x: x[1], reverse=True)
+                    for category, keywords in keywords_map.items():
+                        if any(kw in user_scenario_lower for kw in keywords):
+                            if category in domain_lower or category in law_lower:
+                                score += 3
+                            if any(kw in title_lower for kw in keywords):
+                                score += 2
                     
-                    if scenario_scores and scenario_scores[0][1] > 0:
-                        matched_scenario = scenario_scores[0][0]
-                    else:
-                        matched_scenario = None
+                    scenario_scores.append((scenario, score))
+                
+                scenario_scores.sort(key=lambda x: x[1], reverse=True)
+                
+                if scenario_scores and scenario_scores[0][1] > 0:
+                    matched_scenario = scenario_scores[0][0]
+                else:
+                    matched_scenario = None
+                
+                # Get fallback legal info from database
+                if not ai_response:
+                    legal_info = get_legal_guidance(user_scenario)
                     
-                    # Get fallback legal info from database
-                    if not ai_response:
-                        legal_info = get_legal_guidance(user_scenario)
-                        
-                except Exception as e:
-                    print(f"Chatbot error: {e}")
-                finally:
-                    conn.close()
+            except Exception as e:
+                print(f"Chatbot error: {e}")
     
     return render_template('legal_chatbot.html', 
                           user_scenario=user_scenario, 
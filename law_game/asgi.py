@@ -0,0 +1,10 @@
+"""ASGI entry point: head-to-head matches on the event loop, Flask for everything else
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+from multiplayer import Multiplayer
+
+application = Multiplayer(app, fallback=WsgiToAsgi(app))
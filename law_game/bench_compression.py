@@ -0,0 +1,46 @@
+"""Size and speed of each compression level on the rendered pages
+
+Logs a throwaway user in, renders the heaviest pages once, then compresses
+them at every gzip level (and Brotli quality, when installed) to pick
+compression.GZIP_LEVEL and BROTLI_QUALITY:
+
+    python bench_compression.py --repeat 20
+"""
+import argparse
+import time
+import uuid
+
+from app import app
+from compression import compress, encodings
+from gameplay import storage
+
+PAGES = ['/rpg_game', '/legal_chatbot', '/bot_mode', '/levels', '/mode_select']
+LEVELS = {'gzip': range(1, 10), 'br': range(0, 12)}
+
+
+def render_pages(paths):
+    user_id = storage.create_user(f"bench_{uuid.uuid4().hex[:8]}", 'bench')
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return [client.get(path).get_data() for path in paths]
+
+
+def run(pages, repeat):
+    total = sum(len(page) for page in pages)
+    print(f"{len(pages)} pages, {total // 1024} KB uncompressed")
+    for encoding in encodings():
+        for level in LEVELS[encoding]:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                size = sum(len(compress(page, encoding, level)) for page in pages)
+            elapsed = (time.perf_counter() - start) / repeat
+            print(f"{encoding} {level:2}: {size / total:6.1%} of the size, "
+                  f"{elapsed * 1000:6.2f} ms, {total / elapsed / 2 ** 20:6.1f} MB/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    run(render_pages(PAGES), args.repeat)
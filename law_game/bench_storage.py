@@ -0,0 +1,65 @@
+"""Throughput benchmark for the storage backends
+
+Runs the same mix of gameplay operations against whichever backend
+DATABASE_URL selects, so SQLite and PostgreSQL can be compared directly:
+
+    python bench_storage.py --users 20 --threads 8
+    DATABASE_URL=postgresql://localhost/law_game python bench_storage.py
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+
+from storage import get_storage
+
+
+def play_session(storage, user_id, rng):
+    """One simulated visit: level map, a level submission and a bot round"""
+    levels = storage.list_levels()
+    storage.completed_level_ids(user_id)
+    level = rng.choice(levels)
+    storage.list_questions(level['id'])
+    storage.save_level_progress(user_id, level['id'], rng.randint(0, 100), rng.random() < 0.6)
+
+    storage.count_bot_questions()
+    storage.get_bot_stats(user_id)
+    for question in storage.list_unanswered_bot_questions(user_id, 5, shuffle=True):
+        storage.record_bot_answer(user_id, question['id'], rng.random() < 0.7)
+    storage.bot_answer_history(user_id)
+
+
+def run(storage, users, threads, rounds):
+    storage.ensure_database()
+    tag = uuid.uuid4().hex[:8]
+    user_ids = [storage.create_user(f"bench_{tag}_{i}", 'bench') for i in range(users)]
+    counter = [0]
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(rounds):
+            play_session(storage, rng.choice(user_ids), rng)
+            with lock:
+                counter[0] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    print(f"{storage.name}: {counter[0]} sessions in {elapsed:.2f}s "
+          f"({counter[0] / elapsed:.1f} sessions/s, {threads} threads)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+    run(get_storage(args.database_url), args.users, args.threads, args.rounds)
@@ -0,0 +1,142 @@
+"""You-vs-Bot session engine
+
+A round moves through three states: ASKING (the current question is shown),
+REVIEWING (feedback for a wrong answer is shown) and FINISHED. The opponent's
+answer to every question is rolled once, from a seeded RNG, when the round
+starts, so each request does constant work and a seed replays a round exactly.
+"""
+import random
+
+from opponents import FixedOpponent
+
+ASKING = 'asking'
+REVIEWING = 'reviewing'
+FINISHED = 'finished'
+
+SESSION_KEY = 'bot_session'
+POINTS_BY_ATTEMPT = {1: 3, 2: 2, 3: 1}
+BOT_POINTS = 3
+
+
+class BotSession:
+    """One round against the bot, stored compactly in the Flask session"""
+
+    __slots__ = ('question_ids', 'ai_answers', 'seed', 'index', 'state', 'user_score', 'bot_score',
+                 'attempts', 'position')
+
+    def __init__(self, question_ids, ai_answers, seed, index=0, state=ASKING, user_score=0, bot_score=0,
+                 attempts=None):
+        self.question_ids = question_ids
+        self.ai_answers = ai_answers
+        self.seed = seed
+        self.index = index
+        self.state = state
+        self.user_score = user_score
+        self.bot_score = bot_score
+        self.attempts = attempts or {}
+        self.position = {question_id: i for i, question_id in enumerate(question_ids)}
+
+    @classmethod
+    def start(cls, questions, seed=None, opponent=None):
+        """New round over ``questions`` with every answer of ``opponent`` pre-rolled"""
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        rng = random.Random(seed)
+        opponent = opponent or FixedOpponent()
+        ai_answers = ''.join(opponent.answer(rng, question) for question in questions)
+        return cls([question.id for question in questions], ai_answers, seed)
+
+    @classmethod
+    def load(cls, session):
+        data = session.get(SESSION_KEY)
+        if not data:
+            return None
+        return cls(data['q'], data['a'], data['seed'], data['i'], data['s'], data['u'], data['b'],
+                   {int(question_id): n for question_id, n in data['t'].items()})
+
+    def save(self, session):
+        session[SESSION_KEY] = {'q': self.question_ids, 'a': self.ai_answers, 'seed': self.seed,
+                                'i': self.index, 's': self.state, 'u': self.user_score, 'b': self.bot_score,
+                                't': {str(question_id): n for question_id, n in self.attempts.items()}}
+
+    @property
+    def total(self):
+        return len(self.question_ids)
+
+    @property
+    def question_number(self):
+        return min(self.index, self.total - 1) + 1
+
+    @property
+    def question_id(self):
+        return self.question_ids[self.index] if self.state != FINISHED else None
+
+    def ai_answer(self, question_id):
+        return self.ai_answers[self.position[question_id]]
+
+    def has_question(self, question_id):
+        return question_id in self.position
+
+    def accepts(self, question_id):
+        """Whether ``question_id`` can be answered now: the current question of an unfinished round"""
+        return self.state != FINISHED and question_id == self.question_id
+
+    def is_open(self, question_id):
+        """Whether ``question_id`` can still be settled: the current question or a later one, before the end"""
+        return self.state != FINISHED and self.position.get(question_id, -1) >= self.index
+
+    def answer(self, question_id, selected_answer, correct_answer):
+        """Score an answer and transition; returns (is_correct, user_points, bot_points).
+
+        A correct answer moves on to the next question, a wrong one shows
+        feedback. The user earns fewer points per retry, and the opponent
+        scores only on a question's first attempt. Raises ValueError for
+        anything but the current question of an unfinished round.
+        """
+        if not self.accepts(question_id):
+            raise ValueError(f'question {question_id} is not the current question of this round')
+        attempts = self.attempts.get(question_id, 0) + 1
+        self.attempts[question_id] = attempts
+        is_correct = selected_answer == correct_answer
+        user_points = POINTS_BY_ATTEMPT.get(attempts, 0) if is_correct else 0
+        bot_points = BOT_POINTS if attempts == 1 and self.ai_answer(question_id) == correct_answer else 0
+        self.user_score += user_points
+        self.bot_score += bot_points
+        if is_correct:
+            self.advance()
+        else:
+            self.state = REVIEWING
+        return is_correct, user_points, bot_points
+
+    def settle(self, question_id, selected_answer, correct_answer):
+        """Score a question answered offline, for bulk submission; returns like answer().
+
+        This counts as one more attempt at the question, scored as answer()
+        would, and the round moves past it, skipping any open questions
+        before it. Raises ValueError unless the question is still open.
+        """
+        if not self.is_open(question_id):
+            raise ValueError(f'question {question_id} is not open in this round')
+        attempts = self.attempts.get(question_id, 0) + 1
+        self.attempts[question_id] = attempts
+        is_correct = selected_answer == correct_answer
+        user_points = POINTS_BY_ATTEMPT.get(attempts, 0) if is_correct else 0
+        bot_points = BOT_POINTS if attempts == 1 and self.ai_answer(question_id) == correct_answer else 0
+        self.user_score += user_points
+        self.bot_score += bot_points
+        self.index = max(self.index, self.position[question_id] + 1)
+        self.state = ASKING if self.index < self.total else FINISHED
+        return is_correct, user_points, bot_points
+
+    def advance(self):
+        """Move past the current question"""
+        self.index += 1
+        self.state = ASKING if self.index < self.total else FINISHED
+
+    def retry(self, question_id):
+        """Show a question of this round again; False when it is not part of it"""
+        if question_id not in self.position or self.state == FINISHED:
+            return False
+        self.index = self.position[question_id]
+        self.state = ASKING
+        return True
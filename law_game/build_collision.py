@@ -0,0 +1,79 @@
+"""Offline collision build: bit-packed walkability grids for the RPG maps
+
+    python build_collision.py
+
+Scales each map background to the size the game draws it at, marks every
+CELL px cell walkable when the pixel at its top-left corner is brighter
+than THRESHOLD (the rule the page used to apply on every load), applies
+the overrides, and writes the packed grid to static/build/ under a
+content-hashed name along with the manifest read by collision.py.
+
+Overrides live in a JSON file next to the background (``background.png``
+-> ``background.collision.json``): a list of rectangles in cells, applied
+in order, e.g. ``[{"x": 10, "y": 4, "width": 3, "height": 1, "walkable": false}]``.
+Run it after changing a background or its overrides, and on every deploy.
+"""
+import argparse
+import hashlib
+import json
+import os
+
+from PIL import Image
+
+from collision import CELL, MANIFEST, MAP_HEIGHT, MAP_WIDTH, THRESHOLD, grid_size, pack_bits
+from images import BUILD_DIR
+
+SOURCES = ['rpg_assets/background.png']
+
+
+def overrides_path(path):
+    return os.path.splitext(path)[0] + '.collision.json'
+
+
+def load_overrides(path):
+    try:
+        with open(overrides_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def compile_grid(image, overrides=(), width=MAP_WIDTH, height=MAP_HEIGHT, cell=CELL):
+    """Flat row-major list of walkable flags for ``image`` drawn at ``width`` x ``height``"""
+    pixels = image.convert('RGB').resize((width, height), Image.BILINEAR).load()
+    columns, rows = grid_size(width, height, cell)
+    cells = [sum(pixels[x * cell, y * cell]) / 3 > THRESHOLD for y in range(rows) for x in range(columns)]
+    for rect in overrides:
+        for y in range(max(rect['y'], 0), min(rect['y'] + rect.get('height', 1), rows)):
+            for x in range(max(rect['x'], 0), min(rect['x'] + rect.get('width', 1), columns)):
+                cells[y * columns + x] = rect['walkable']
+    return cells
+
+
+def build(static_folder, sources=SOURCES):
+    """Write every grid and return the manifest"""
+    out_dir = os.path.join(static_folder, BUILD_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    columns, rows = grid_size()
+    manifest = {}
+    for source in sources:
+        path = os.path.join(static_folder, source)
+        with Image.open(path) as image:
+            cells = compile_grid(image, load_overrides(path))
+        data = pack_bits(cells)
+        stem = os.path.splitext(os.path.basename(source))[0]
+        name = f'collision-{stem}.{hashlib.sha256(data).hexdigest()[:10]}.bin'
+        with open(os.path.join(out_dir, name), 'wb') as f:
+            f.write(data)
+        manifest[source] = {'path': f'{BUILD_DIR}/{name}', 'columns': columns, 'rows': rows, 'cell': CELL}
+        print(f"{name}: {columns}x{rows} cells, {sum(cells)} walkable, {len(data)} bytes")
+    with open(os.path.join(static_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build bit-packed RPG collision grids into static/build')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+    build(args.static)
@@ -0,0 +1,84 @@
+"""Offline image build: responsive, modern-format variants of the big static images
+
+Writes AVIF, WebP and optimized PNG copies of each source at several widths
+to static/build/img/ with content-hashed names, plus the manifest that the
+template helpers in images.py read:
+
+    python build_images.py
+
+Run it after changing an image and as part of a deploy; pages fall back to
+the original files while no manifest exists. Needs Pillow (AVIF needs
+Pillow 11.2+ or the pillow-avif-plugin; it is skipped when unavailable).
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+
+from PIL import Image, features
+
+from images import BUILD_DIR, MANIFEST
+
+SOURCES = ['courtroom.png', 'rpg_assets/background.png', 'rpg_assets/Main Character.png']
+WIDTHS = [480, 768, 1024, 1536]
+
+# format -> (file extension, Pillow save options)
+FORMATS = {
+    'avif': ('avif', {'quality': 55}),
+    'webp': ('webp', {'quality': 80, 'method': 6}),
+    'png': ('png', {'optimize': True}),
+}
+
+
+def available_formats():
+    return [name for name in FORMATS if name != 'avif' or features.check('avif')]
+
+
+def slug(path):
+    stem = os.path.splitext(path)[0]
+    return re.sub(r'[^a-z0-9/]+', '-', stem.lower()).strip('-')
+
+
+def encode(image, fmt):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt.upper(), **FORMATS[fmt][1])
+    return buffer.getvalue()
+
+
+def build(static_folder, sources=SOURCES, widths=WIDTHS):
+    """Write every variant and return the manifest"""
+    formats = available_formats()
+    out_dir = os.path.join(static_folder, BUILD_DIR, 'img')
+    manifest = {}
+    for source in sources:
+        with Image.open(os.path.join(static_folder, source)) as original:
+            original.load()
+            entry = {'width': original.width, 'height': original.height, 'variants': {fmt: [] for fmt in formats}}
+            # Never upscale; the full width is always included
+            sizes = sorted({w for w in widths if w < original.width} | {original.width})
+            for width in sizes:
+                height = round(original.height * width / original.width)
+                resized = original.resize((width, height), Image.LANCZOS) if width != original.width else original
+                for fmt in formats:
+                    data = encode(resized, fmt)
+                    digest = hashlib.sha256(data).hexdigest()[:10]
+                    name = f'{slug(source)}-{width}.{digest}.{FORMATS[fmt][0]}'
+                    path = os.path.join(out_dir, name)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'wb') as f:
+                        f.write(data)
+                    entry['variants'][fmt].append([width, f'{BUILD_DIR}/img/{name}'])
+                    print(f"{name}: {len(data) // 1024} KB")
+            manifest[source] = entry
+    with open(os.path.join(static_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build responsive image variants into static/build')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+    build(args.static)
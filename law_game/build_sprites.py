@@ -0,0 +1,86 @@
+"""Offline sprite build: every RPG character frame packed into one atlas
+
+    python build_sprites.py
+
+Reads the sprite definitions (see sprites.py), scales each frame to the
+size it is drawn at (nearest-neighbour when enlarging, so pixel art stays
+sharp), packs the frames into shelves of one lossless WebP texture and
+writes it to static/build/ under a content-hashed name, together with the
+static/build/sprites.json frame index. Map tiles have their own atlas,
+built by build_tilemap.py. Run it after changing a sprite, and on every
+deploy.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+
+from PIL import Image
+
+from images import BUILD_DIR
+from sprites import MANIFEST, SOURCE
+
+ATLAS_WIDTH = 1024
+# Transparent gap around every frame so filtering never bleeds a neighbour in
+PADDING = 1
+
+
+def scaled_frame(static_folder, path, size):
+    with Image.open(os.path.join(static_folder, path)) as image:
+        image = image.convert('RGBA')
+        resample = Image.NEAREST if size[0] >= image.width else Image.LANCZOS
+        return image.resize(tuple(size), resample)
+
+
+def pack_shelves(sizes, width=ATLAS_WIDTH):
+    """Top-left corner of each (w, h), tallest first on left-to-right shelves; returns (positions, height)"""
+    positions = [None] * len(sizes)
+    x = y = shelf_height = 0
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+        w, h = sizes[i][0] + 2 * PADDING, sizes[i][1] + 2 * PADDING
+        if w > width:
+            raise ValueError(f"a {sizes[i][0]} px wide frame does not fit a {width} px atlas")
+        if x + w > width:
+            x, y, shelf_height = 0, y + shelf_height, 0
+        positions[i] = (x + PADDING, y + PADDING)
+        x += w
+        shelf_height = max(shelf_height, h)
+    return positions, y + shelf_height
+
+
+def build(static_folder):
+    """Write the atlas and return the manifest"""
+    with open(os.path.join(static_folder, SOURCE)) as f:
+        sources = json.load(f)
+    frames = []
+    for name, sprite in sources.items():
+        for path in sprite['frames']:
+            frames.append((name, scaled_frame(static_folder, path, sprite['size'])))
+    positions, height = pack_shelves([image.size for _, image in frames])
+    width = max(x + image.width + PADDING for (_, image), (x, _) in zip(frames, positions))
+    atlas = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    sprites = {name: dict(sprite, frames=[]) for name, sprite in sources.items()}
+    for (name, image), (x, y) in zip(frames, positions):
+        atlas.paste(image, (x, y))
+        sprites[name]['frames'].append([x, y, image.width, image.height])
+
+    buffer = io.BytesIO()
+    atlas.save(buffer, 'WEBP', lossless=True, method=6)
+    data = buffer.getvalue()
+    os.makedirs(os.path.join(static_folder, BUILD_DIR), exist_ok=True)
+    name = f'sprites.{hashlib.sha256(data).hexdigest()[:10]}.webp'
+    with open(os.path.join(static_folder, BUILD_DIR, name), 'wb') as f:
+        f.write(data)
+    manifest = {'image': f'{BUILD_DIR}/{name}', 'sprites': sprites}
+    with open(os.path.join(static_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    print(f"{name}: {len(frames)} frames, {width}x{height}, {len(data) // 1024} KB")
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack the RPG sprites into one atlas in static/build')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+    build(args.static)
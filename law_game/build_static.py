@@ -0,0 +1,104 @@
+"""Offline static build: minified, content-hashed, precompressed CSS and JS
+
+    python build_static.py
+
+For each .css/.js file directly in static/ this writes a minified copy to
+static/build/<name>.<hash>.<ext> with .gz and .br versions beside it, and
+the static/build/static.json manifest read by static_bundle.py. Relative
+url()s in CSS are rewritten to absolute /static/ paths, since the copy
+lives in a different directory. Brotli output needs the Brotli package and
+is skipped without it. Run it on every deploy, after build_images.py.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+from static_bundle import BUILD_DIR, MANIFEST
+
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s*([{};:,>])\s*')
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def minify_css(text):
+    text = CSS_COMMENT.sub('', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = CSS_SPACE.sub(r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """Drop indentation, blank lines and whole-line // comments.
+
+    Line breaks are kept so automatic semicolon insertion still sees the
+    same statements; anything more needs a real JS parser.
+    """
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+
+
+def absolute_urls(text, source, static_url):
+    """Rewrite relative url()s in a CSS file at static/``source`` to absolute paths"""
+    base = posixpath.join(static_url, posixpath.dirname(source))
+
+    def rewrite(match):
+        url = match.group(2)
+        if url.startswith(('/', 'data:', 'http:', 'https:', '#')):
+            return match.group(0)
+        return f'url("{posixpath.normpath(posixpath.join(base, url))}")'
+    return CSS_URL.sub(rewrite, text)
+
+
+def compressors():
+    result = [('.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        print("Brotli is not installed; skipping .br files (pip install Brotli)")
+    else:
+        result.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    return result
+
+
+def build(static_folder, static_url='/static'):
+    """Write every bundle and return the manifest"""
+    manifest = {}
+    encoders = compressors()
+    out_dir = os.path.join(static_folder, BUILD_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    for name in sorted(os.listdir(static_folder)):
+        stem, ext = os.path.splitext(name)
+        if ext not in ('.css', '.js'):
+            continue
+        with open(os.path.join(static_folder, name), encoding='utf-8') as f:
+            text = f.read()
+        if ext == '.css':
+            text = minify_css(absolute_urls(text, name, static_url))
+        else:
+            text = minify_js(text)
+        data = text.encode('utf-8')
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+        with open(os.path.join(out_dir, hashed), 'wb') as f:
+            f.write(data)
+        sizes = [len(data)]
+        for suffix, compress in encoders:
+            compressed = compress(data)
+            with open(os.path.join(out_dir, hashed + suffix), 'wb') as f:
+                f.write(compressed)
+            sizes.append(len(compressed))
+        manifest[name] = f'{BUILD_DIR}/{hashed}'
+        print(f"{name} -> {hashed}: " + ' / '.join(f'{size // 1024} KB' for size in sizes))
+    with open(os.path.join(static_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build fingerprinted, precompressed CSS/JS into static/build')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+    build(args.static)
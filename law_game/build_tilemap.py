@@ -0,0 +1,139 @@
+"""Offline tile-map build: per-chunk tilesets plus chunked tile and collision layers
+
+    python build_tilemap.py
+
+Cuts each map image (drawn at its ``width`` x ``height``) into TILE px tiles
+and groups them in CHUNK_TILES square chunks. Every chunk gets its own
+lossless WebP tileset holding each of its distinct tiles once, so the page
+downloads tiles only for the chunks it shows; its tile layer indexes that
+tileset. The tile and collision layers of all chunks go to one pack file,
+in the format tilemap.py serves. Collision uses the rule and the
+``<image>.collision.json`` overrides of build_collision.py, one cell per
+tile. Everything goes to static/build/maps/ under content-hashed names with
+the static/build/maps.json manifest.
+
+A map is only built when its tilesets add up to less than the WebP the
+page would otherwise load for the background (build_images.py's encoding):
+a painted image with few repeated tiles is skipped and keeps its
+background image. Run it after changing a map, and on every deploy.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import struct
+
+from PIL import Image
+
+from build_collision import compile_grid, load_overrides
+from build_images import encode
+from collision import MAP_HEIGHT, MAP_WIDTH, grid_size, pack_bits
+from images import BUILD_DIR
+from tilemap import CHUNK_TILES, EMPTY_TILE, MANIFEST, TILE
+
+MAPS = {
+    'town': {'image': 'rpg_assets/background.png', 'width': MAP_WIDTH, 'height': MAP_HEIGHT},
+}
+ATLAS_COLUMNS = CHUNK_TILES
+
+
+def cut_chunk(image, cx, cy, columns, rows):
+    """A chunk's tile ids (row by row, EMPTY_TILE outside the map) and its distinct tiles in atlas order"""
+    index = {}
+    tiles = []
+    tile_ids = []
+    for ly in range(CHUNK_TILES):
+        for lx in range(CHUNK_TILES):
+            tx, ty = cx * CHUNK_TILES + lx, cy * CHUNK_TILES + ly
+            if tx >= columns or ty >= rows:
+                tile_ids.append(EMPTY_TILE)
+                continue
+            tile = image.crop((tx * TILE, ty * TILE, (tx + 1) * TILE, (ty + 1) * TILE))
+            key = tile.tobytes()
+            if key not in index:
+                index[key] = len(tiles)
+                tiles.append(tile)
+            tile_ids.append(index[key])
+    return tile_ids, tiles
+
+
+def make_atlas(tiles):
+    rows = -(-len(tiles) // ATLAS_COLUMNS)
+    atlas = Image.new('RGB', (ATLAS_COLUMNS * TILE, rows * TILE))
+    for i, tile in enumerate(tiles):
+        atlas.paste(tile, ((i % ATLAS_COLUMNS) * TILE, (i // ATLAS_COLUMNS) * TILE))
+    buffer = io.BytesIO()
+    atlas.save(buffer, 'WEBP', lossless=True, method=6)
+    return buffer.getvalue()
+
+
+def pack_chunks(chunk_tile_ids, walkable, columns, rows):
+    """Every chunk's tile ids and collision bits, row-major, as one bytes object"""
+    cells = CHUNK_TILES * CHUNK_TILES
+    chunk_columns = -(-columns // CHUNK_TILES)
+    pack = bytearray()
+    for i, tile_ids in enumerate(chunk_tile_ids):
+        cx, cy = i % chunk_columns, i // chunk_columns
+        flags = []
+        for ly in range(CHUNK_TILES):
+            for lx in range(CHUNK_TILES):
+                x, y = cx * CHUNK_TILES + lx, cy * CHUNK_TILES + ly
+                flags.append(x < columns and y < rows and walkable[y * columns + x])
+        pack += struct.pack(f'<{cells}H', *tile_ids) + pack_bits(flags)
+    return bytes(pack)
+
+
+def write_hashed(out_dir, stem, ext, data):
+    name = f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}.{ext}'
+    with open(os.path.join(out_dir, name), 'wb') as f:
+        f.write(data)
+    return f'{BUILD_DIR}/maps/{name}'
+
+
+def build(static_folder, maps=MAPS):
+    """Write every map worth tiling and return the manifest"""
+    out_dir = os.path.join(static_folder, BUILD_DIR, 'maps')
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    for map_id, spec in maps.items():
+        path = os.path.join(static_folder, spec['image'])
+        width, height = spec['width'], spec['height']
+        columns, rows = grid_size(width, height, TILE)
+        with Image.open(path) as source:
+            walkable = compile_grid(source, load_overrides(path), width, height, TILE)
+            background = encode(source.convert('RGB').resize((width, height), Image.LANCZOS), 'webp')
+            # Whole tiles only: the last row or column is padded with black
+            image = Image.new('RGB', (columns * TILE, rows * TILE))
+            image.paste(source.convert('RGB').resize((width, height), Image.BILINEAR))
+        chunk_tile_ids, atlases = [], []
+        for cy in range(-(-rows // CHUNK_TILES)):
+            for cx in range(-(-columns // CHUNK_TILES)):
+                tile_ids, tiles = cut_chunk(image, cx, cy, columns, rows)
+                chunk_tile_ids.append(tile_ids)
+                atlases.append(make_atlas(tiles))
+        # Chunks with the same tiles share one file
+        tileset_bytes = sum(len(atlas) for atlas in set(atlases))
+        if tileset_bytes >= len(background):
+            print(f"{map_id}: skipped, {tileset_bytes // 1024} KB of tilesets against a "
+                  f"{len(background) // 1024} KB background; the page keeps the background image")
+            continue
+        chunks = pack_chunks(chunk_tile_ids, walkable, columns, rows)
+        manifest[map_id] = {
+            'columns': columns, 'rows': rows, 'tile': TILE, 'chunk': CHUNK_TILES, 'width': width, 'height': height,
+            'tilesets': [write_hashed(out_dir, f'{map_id}-tiles', 'webp', atlas) for atlas in atlases],
+            'tileset_columns': ATLAS_COLUMNS,
+            'chunks': write_hashed(out_dir, f'{map_id}-chunks', 'bin', chunks),
+        }
+        print(f"{map_id}: {columns}x{rows} tiles in {len(atlases)} chunks, {len(chunks) // 1024} KB of chunks, "
+              f"{tileset_bytes // 1024} KB of tilesets against a {len(background) // 1024} KB background")
+    with open(os.path.join(static_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build chunked RPG tile maps into static/build/maps')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+    build(args.static)
@@ -0,0 +1,68 @@
+"""RPG collision grids compiled by build_collision.py
+
+A grid covers the map in CELL px squares, row by row, one bit per cell
+(set = walkable, least significant bit first). The manifest maps each map
+background (relative to static/) to its grid file and size, and the page
+decodes the file into a Uint8Array. Until it has been built the page
+falls back to sampling the background itself.
+"""
+import json
+import os
+
+from flask import url_for
+
+from images import BUILD_DIR
+
+MANIFEST = f'{BUILD_DIR}/collision.json'
+CELL = 16
+MAP_WIDTH = 800
+MAP_HEIGHT = 600
+# Cells darker than this average RGB value are walls, water, etc.
+THRESHOLD = 50
+
+
+def grid_size(width=MAP_WIDTH, height=MAP_HEIGHT, cell=CELL):
+    """(columns, rows) covering the map, counting partial cells at the edges"""
+    return -(-width // cell), -(-height // cell)
+
+
+def pack_bits(cells):
+    """Bit-pack a flat sequence of booleans"""
+    packed = bytearray((len(cells) + 7) // 8)
+    for i, walkable in enumerate(cells):
+        if walkable:
+            packed[i >> 3] |= 1 << (i & 7)
+    return bytes(packed)
+
+
+class CollisionManifest:
+    """Loaded once per process from static/build/collision.json"""
+
+    def __init__(self, static_folder):
+        self.path = os.path.join(static_folder, MANIFEST)
+        self._grids = None
+
+    @property
+    def grids(self):
+        if self._grids is None:
+            try:
+                with open(self.path) as f:
+                    self._grids = json.load(f)
+            except (OSError, ValueError):
+                self._grids = {}
+        return self._grids
+
+    def grid(self, name):
+        """``{url, columns, rows, cell}`` for the map background ``name``, or None"""
+        entry = self.grids.get(name)
+        if not entry:
+            return None
+        return {'url': url_for('static', filename=entry['path']), 'columns': entry['columns'],
+                'rows': entry['rows'], 'cell': entry['cell']}
+
+
+def init_app(app):
+    """Register ``collision_grid(name)`` as a template global"""
+    manifest = CollisionManifest(app.static_folder)
+    app.add_template_global(manifest.grid, 'collision_grid')
+    return manifest
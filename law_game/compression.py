@@ -0,0 +1,74 @@
+"""On-the-fly compression of rendered pages and API responses
+
+Static files under static/build/ are compressed once by build_static.py;
+everything the app generates goes through the after_request hook that
+init_app() registers. A 200 response with a text type and at least
+MIN_SIZE bytes is sent as Brotli when the client accepts it and the module
+is installed, otherwise as gzip. Smaller bodies are sent as they are,
+because the headers and the CPU cost outweigh the bytes saved. Responses
+that already carry a Content-Encoding, such as the page shells that
+page_cache.py keeps compressed, are left alone.
+
+The levels come from bench_compression.py on the rendered pages. Gzip
+level 6 comes within a fraction of a percent of level 9's size at under
+half its CPU time. Brotli quality 5 plays the same role: the top
+qualities are meant for build-time compression, not for every request.
+"""
+import gzip
+
+from static_bundle import accepted_encodings
+
+MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE = {'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+                'application/json', 'image/svg+xml'}
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def compress(data, encoding, level=None):
+    """``data`` compressed with ``encoding`` ('br' or 'gzip') at ``level`` (default: the tuned one)"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    return gzip.compress(data, GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def encodings():
+    """Content codings available here, best first"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate(size):
+    """The coding to send ``size`` bytes in for this request, or None to send them as they are"""
+    if size < MIN_SIZE:
+        return None
+    accepted = accepted_encodings()
+    return next((name for name in encodings() if name in accepted), None)
+
+
+def init_app(app):
+    """Compress large text responses to clients that accept it"""
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE):
+            return response
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        encoding = negotiate(len(data))
+        if encoding is None:
+            return response
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # The bytes changed, so a strong validator becomes a weak one
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return encodings()
@@ -0,0 +1,195 @@
+"""In-memory content cache with precomputed level unlock and scenario graphs"""
+import hashlib
+import threading
+from collections import defaultdict
+
+from records import MapEntry
+
+MAIN_TRACK = 'main'
+
+
+def role_track(role_id):
+    return ('role', role_id)
+
+
+class Track:
+    """Ordered levels of one track with predecessor/successor maps.
+
+    ``predecessor[level_id]`` is the id that must be completed to unlock the
+    level, or None when nothing is required (level 1) or the chain has a gap
+    (see ``always_unlocked``). Built once per content load, so unlock checks
+    are dict lookups instead of a scan per level.
+    """
+
+    __slots__ = ('levels', 'by_id', 'predecessor', 'successor', 'always_unlocked')
+
+    def __init__(self, levels):
+        self.levels = list(levels)
+        self.by_id = {level.id: level for level in self.levels}
+        by_number = {level.level_number: level for level in self.levels}
+        self.predecessor = {}
+        self.successor = {}
+        self.always_unlocked = set()
+        for level in self.levels:
+            prev = by_number.get(level.level_number - 1)
+            self.predecessor[level.id] = prev.id if prev else None
+            if prev:
+                self.successor[prev.id] = level.id
+            if level.level_number == 1:
+                self.always_unlocked.add(level.id)
+
+    def is_unlocked(self, level_id, completed):
+        if level_id in self.always_unlocked:
+            return True
+        prev_id = self.predecessor.get(level_id)
+        return prev_id is not None and prev_id in completed
+
+    def entries(self, completed):
+        """Level map rows with per-user unlocked/completed flags"""
+        return [MapEntry(level, self.is_unlocked(level.id, completed), level.id in completed)
+                for level in self.levels]
+
+    def first_level_id(self):
+        return self.levels[0].id if self.levels else None
+
+
+class ScenarioGraph:
+    """One scenario chain compiled into a step graph.
+
+    ``edges[step_number]`` is the default next step (step_number + 1 when it
+    exists, else None) and ``branches[(step_number, answer)]`` overrides it for
+    a specific answer, so a transition is one or two dict lookups. A step whose
+    next step is None is terminal and leads to the chain's outcome.
+    """
+
+    __slots__ = ('scenario', 'steps', 'edges', 'branches', 'outcome')
+
+    def __init__(self, scenario, steps, branches=(), outcome=None):
+        self.scenario = scenario
+        self.steps = {step.step_number: step for step in steps}
+        self.edges = {number: number + 1 if number + 1 in self.steps else None for number in self.steps}
+        self.branches = {(branch.step_number, branch.answer): branch.next_step for branch in branches}
+        self.outcome = outcome
+
+    @property
+    def step_count(self):
+        return len(self.steps)
+
+    def step(self, step_number):
+        return self.steps.get(step_number)
+
+    def next_step(self, step_number, answer=None):
+        """Step number reached from ``step_number`` with ``answer``, or None at the end"""
+        key = (step_number, answer)
+        if key in self.branches:
+            next_number = self.branches[key]
+            return next_number if next_number in self.steps else None
+        return self.edges.get(step_number)
+
+    def is_terminal(self, step_number, answer=None):
+        return self.next_step(step_number, answer) is None
+
+
+class ContentCache:
+    """Read-mostly content loaded from storage once per process"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._load()
+            self._loaded = True
+
+    def _load(self):
+        self.tracks = {MAIN_TRACK: Track(self.storage.list_levels())}
+        self.roles = {role.id: role for role in self.storage.list_roles()}
+        self.role_levels = {}
+        for role_id in self.roles:
+            track = Track(self.storage.list_role_levels(role_id))
+            self.tracks[role_track(role_id)] = track
+            self.role_levels.update(track.by_id)
+        self.bot_questions = {question.id: question for question in self.storage.list_bot_questions()}
+        self.bot_question_total = len(self.bot_questions)
+        self.scenarios = self._compile_scenarios()
+        self.version = self._fingerprint()
+        print(f"Content loaded: {len(self.tracks)} tracks, {len(self.role_levels)} role levels, "
+              f"{len(self.scenarios)} scenarios")
+
+    def _compile_scenarios(self):
+        steps = defaultdict(list)
+        for step in self.storage.list_all_scenario_steps():
+            steps[step.scenario_id].append(step)
+        branches = defaultdict(list)
+        for branch in self.storage.list_scenario_branches():
+            branches[branch.scenario_id].append(branch)
+        outcomes = {}
+        for outcome in self.storage.list_scenario_outcomes():
+            outcomes.setdefault(outcome.scenario_id, outcome)
+        return {scenario.id: ScenarioGraph(scenario, steps[scenario.id], branches[scenario.id],
+                                           outcomes.get(scenario.id))
+                for scenario in self.storage.list_scenarios()}
+
+    def _fingerprint(self):
+        """Hash of everything loaded: equal in every process that loaded the same content"""
+        digest = hashlib.sha1()
+        for key in sorted(self.tracks, key=repr):
+            digest.update(repr((key, self.tracks[key].levels)).encode())
+        digest.update(repr(sorted(self.roles.items())).encode())
+        digest.update(repr(sorted(self.bot_questions.items())).encode())
+        for _, graph in sorted(self.scenarios.items()):
+            digest.update(repr((graph.scenario, sorted(graph.steps.items()), sorted(graph.branches.items()),
+                                graph.outcome)).encode())
+        return digest.hexdigest()[:16]
+
+    def invalidate(self):
+        """Drop cached content; the next access reloads it from storage"""
+        with self._lock:
+            self._loaded = False
+
+    def content_version(self):
+        """Fingerprint of the loaded content, for cache keys and page ETags"""
+        self._ensure_loaded()
+        return self.version
+
+    def track(self, key):
+        self._ensure_loaded()
+        return self.tracks.get(key)
+
+    def role(self, role_id):
+        self._ensure_loaded()
+        return self.roles.get(role_id)
+
+    def role_list(self):
+        self._ensure_loaded()
+        return list(self.roles.values())
+
+    def role_level(self, role_level_id):
+        self._ensure_loaded()
+        return self.role_levels.get(role_level_id)
+
+    def scenario(self, scenario_id):
+        self._ensure_loaded()
+        return self.scenarios.get(scenario_id)
+
+    def scenario_list(self):
+        self._ensure_loaded()
+        return [graph.scenario for graph in self.scenarios.values()]
+
+    def bot_question(self, question_id):
+        self._ensure_loaded()
+        return self.bot_questions.get(question_id)
+
+    def bot_question_list(self):
+        self._ensure_loaded()
+        return list(self.bot_questions.values())
+
+    def bot_question_count(self):
+        self._ensure_loaded()
+        return self.bot_question_total
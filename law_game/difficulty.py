@@ -0,0 +1,195 @@
+"""Adaptive difficulty for You-vs-Bot question selection
+
+Players and bot questions carry Elo ratings. After each answer both move by
+K * (result - expected), where expected is the chance that a player of that
+skill answers a question of that difficulty:
+
+    expected = 1 / (1 + 10 ** ((difficulty - skill) / 400))
+
+Selection aims for TARGET_SUCCESS: it solves for the difficulty with that
+expected score and takes unanswered questions from the nearest buckets of a
+difficulty index, so choosing a round touches a handful of buckets instead of
+sorting the whole question bank.
+
+Recalibrate all ratings from the full answer history with:
+
+    python difficulty.py
+"""
+import argparse
+import math
+import os
+import threading
+from collections import OrderedDict, defaultdict
+
+from records import Rating
+
+INITIAL_RATING = 1500.0
+USER_K = 32.0
+QUESTION_K = 16.0
+BUCKET_WIDTH = 50.0
+TARGET_SUCCESS = float(os.environ.get('BOT_TARGET_SUCCESS', 0.7))
+
+
+def expected(skill, difficulty):
+    """Probability that ``skill`` answers a question of ``difficulty`` correctly"""
+    return 1.0 / (1.0 + 10.0 ** ((difficulty - skill) / 400.0))
+
+
+def target_difficulty(skill, success=TARGET_SUCCESS):
+    """Difficulty at which ``skill`` is expected to succeed with probability ``success``"""
+    return skill + 400.0 * math.log10(1.0 / success - 1.0)
+
+
+def updated(skill, difficulty, is_correct, user_k=USER_K, question_k=QUESTION_K):
+    """New (skill, difficulty) after one answer"""
+    delta = (1.0 if is_correct else 0.0) - expected(skill, difficulty)
+    return skill + user_k * delta, difficulty - question_k * delta
+
+
+def bucket_of(rating):
+    return int(rating // BUCKET_WIDTH)
+
+
+class DifficultyIndex:
+    """Question ratings plus a bucket -> question ids index"""
+
+    def __init__(self, question_ids, ratings):
+        self.ratings = {question_id: INITIAL_RATING for question_id in question_ids}
+        self.answers = defaultdict(int)
+        for row in ratings:
+            if row.id in self.ratings:
+                self.ratings[row.id] = row.rating
+                self.answers[row.id] = row.answers
+        self.buckets = defaultdict(set)
+        for question_id, rating in self.ratings.items():
+            self.buckets[bucket_of(rating)].add(question_id)
+        self.low = min(self.buckets, default=0)
+        self.high = max(self.buckets, default=0)
+
+    def move(self, question_id, rating):
+        old = bucket_of(self.ratings[question_id])
+        new = bucket_of(rating)
+        self.ratings[question_id] = rating
+        if old != new:
+            self.buckets[old].discard(question_id)
+            self.buckets[new].add(question_id)
+            self.low = min(self.low, new)
+            self.high = max(self.high, new)
+
+    def nearest(self, difficulty, count, exclude):
+        """Up to ``count`` ids closest to ``difficulty``, searching buckets outward"""
+        center = bucket_of(difficulty)
+        chosen = []
+        for distance in range(max(center - self.low, self.high - center) + 1):
+            candidates = [q for bucket in {center - distance, center + distance}
+                          for q in self.buckets.get(bucket, ()) if q not in exclude]
+            candidates.sort(key=lambda q: abs(self.ratings[q] - difficulty))
+            chosen.extend(candidates)
+            if len(chosen) >= count:
+                break
+        return chosen[:count]
+
+
+class AdaptiveSelector:
+    """Picks bot questions near each player's target difficulty and updates ratings"""
+
+    def __init__(self, storage, content, max_users=None):
+        self.storage = storage
+        self.content = content
+        self.max_users = max_users or int(os.environ.get('PROGRESS_CACHE_SIZE', 10000))
+        self._index = None
+        self._skills = OrderedDict()
+        self._lock = threading.Lock()
+
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    question_ids = [q.id for q in self.content.bot_question_list()]
+                    self._index = DifficultyIndex(question_ids, self.storage.list_bot_question_ratings())
+        return self._index
+
+    def skill(self, user_id):
+        """(rating, answers) for a user, cached after the first lookup"""
+        with self._lock:
+            if user_id in self._skills:
+                self._skills.move_to_end(user_id)
+                return self._skills[user_id]
+        row = self.storage.get_bot_rating(user_id)
+        skill = (row.rating, row.answers) if row else (INITIAL_RATING, 0)
+        with self._lock:
+            self._skills[user_id] = skill
+            if len(self._skills) > self.max_users:
+                self._skills.popitem(last=False)
+        return skill
+
+    def select(self, user_id, count):
+        """Ids of up to ``count`` unanswered questions, closest to the target difficulty first"""
+        answered = self.storage.answered_bot_question_ids(user_id)
+        return self.index().nearest(target_difficulty(self.skill(user_id)[0]), count, answered)
+
+    def record(self, user_id, question_id, is_correct):
+        """Apply one answer to both ratings in memory and persist them"""
+        self.record_many(user_id, [(question_id, is_correct)])
+
+    def record_many(self, user_id, results):
+        """Apply (question_id, is_correct) answers in order and persist the ratings in one write"""
+        index = self.index()
+        results = [(q, is_correct) for q, is_correct in results if q in index.ratings]
+        if not results:
+            return
+        skill, answers = self.skill(user_id)
+        question_ratings = []
+        with self._lock:
+            for question_id, is_correct in results:
+                skill, difficulty = updated(skill, index.ratings[question_id], is_correct)
+                index.move(question_id, difficulty)
+                index.answers[question_id] += 1
+                answers += 1
+                question_ratings.append(Rating(question_id, difficulty, index.answers[question_id]))
+            self._skills[user_id] = (skill, answers)
+        self.storage.save_bot_ratings(Rating(user_id, skill, answers), question_ratings)
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+            self._skills.clear()
+
+
+def recalibrate(log, passes=3):
+    """Replay an answer log ``passes`` times from initial ratings.
+
+    Returns (user ratings, question ratings) as Rating rows. Later passes
+    shrink K so the ratings settle instead of chasing the last answers.
+    """
+    skills = defaultdict(lambda: INITIAL_RATING)
+    difficulties = defaultdict(lambda: INITIAL_RATING)
+    user_answers = defaultdict(int)
+    question_answers = defaultdict(int)
+    for answer in log:
+        user_answers[answer.user_id] += 1
+        question_answers[answer.question_id] += 1
+    for n in range(passes):
+        scale = 1.0 / (n + 1)
+        for answer in log:
+            skills[answer.user_id], difficulties[answer.question_id] = updated(
+                skills[answer.user_id], difficulties[answer.question_id], answer.is_correct,
+                USER_K * scale, QUESTION_K * scale)
+    return ([Rating(user_id, skills[user_id], n) for user_id, n in user_answers.items()],
+            [Rating(question_id, difficulties[question_id], n) for question_id, n in question_answers.items()])
+
+
+if __name__ == '__main__':
+    from storage import get_storage
+
+    parser = argparse.ArgumentParser(description='Recalibrate bot ratings from the full answer history')
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--passes', type=int, default=3)
+    args = parser.parse_args()
+    storage = get_storage(args.database_url)
+    storage.ensure_database()
+    log = storage.bot_answer_log()
+    user_ratings, question_ratings = recalibrate(log, args.passes)
+    storage.replace_bot_ratings(user_ratings, question_ratings)
+    print(f"Recalibrated {len(user_ratings)} players and {len(question_ratings)} questions "
+          f"from {len(log)} answers")
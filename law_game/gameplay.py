@@ -0,0 +1,179 @@
+"""Shared services and gameplay rules for the page routes and the JSON API"""
+import random
+from collections import namedtuple
+
+from bot_session import FINISHED
+from content import ContentCache, MAIN_TRACK, role_track
+from difficulty import AdaptiveSelector
+from leaderboard import GLOBAL, TOP_SIZE, Leaderboards, role_board, week_board
+from opponents import Opponents
+from prefetch import PREFETCH_SIZE, make_bundle
+from progress import ProgressTracker
+from review import BOT, LEVEL, ROLE, ReviewScheduler
+from storage import get_storage
+from world import World
+
+# Storage backend: SQLite file by default, PostgreSQL when DATABASE_URL is set
+storage = get_storage()
+content = ContentCache(storage)
+progress = ProgressTracker(storage, content)
+opponents = Opponents(storage)
+selector = AdaptiveSelector(storage, content)
+reviews = ReviewScheduler(storage)
+leaderboards = Leaderboards(storage)
+world = World(storage, content)
+
+# Score for a level or role level at which it counts as completed
+PASS_SCORE = 60
+
+BotOutcome = namedtuple('BotOutcome', 'is_correct ai_answer user_points bot_points')
+
+
+def award_points(user_id, points, role_id=None):
+    """Move a player's leaderboard scores by ``points``, the week's board included"""
+    deltas = {GLOBAL: points, week_board(): points}
+    if role_id is not None:
+        deltas[role_board(role_id)] = points
+    leaderboards.add(user_id, deltas)
+
+
+def pick_bot_questions(user_id, count, shuffle=False, adaptive=False):
+    """Unanswered bot questions for a new round"""
+    if adaptive:
+        # Questions closest to the difficulty this user should get right ~70% of the time
+        return [content.bot_question(q) for q in selector.select(user_id, count)]
+    return storage.list_unanswered_bot_questions(user_id, count, shuffle=shuffle)
+
+
+def answer_bot_question(user_id, question, selected_answer, bot=None):
+    """Grade one bot answer and record it everywhere it counts.
+
+    When ``bot`` is a round containing the question it is scored against the
+    pre-rolled AI answer and advanced (the caller saves it); otherwise the
+    default opponent answers on the spot and no points are given. Raises
+    ValueError, before anything is recorded, when the question is in the
+    round but not the one it is on (see BotSession.accepts).
+    """
+    correct_answer = question.correct_answer
+    first_attempt = True
+    if bot and bot.has_question(question.id):
+        ai_answer = bot.ai_answer(question.id)
+        is_correct, user_points, bot_points = bot.answer(question.id, selected_answer, correct_answer)
+        first_attempt = bot.attempts[question.id] == 1
+    else:
+        ai_answer = opponents.get().answer(random, question)
+        is_correct = selected_answer == correct_answer
+        user_points = bot_points = 0
+
+    # Record the answer (record both correct and incorrect to track attempts)
+    award_points(user_id, storage.record_bot_answer(user_id, question.id, is_correct, selected_answer))
+    opponents.record(question.id, is_correct)
+    if not is_correct:
+        reviews.missed(user_id, BOT, [question.id])
+    if first_attempt:
+        # Retries would reward the same question twice, so only first tries move ratings
+        selector.record(user_id, question.id, is_correct)
+    return BotOutcome(is_correct, ai_answer, user_points, bot_points)
+
+
+def answer_bot_batch(user_id, bot, entries):
+    """Grade a batch of (question, answer, answered_at) from one round, in round order.
+
+    Every progress row and the stats delta are written in one transaction,
+    ratings in one more write; returns a BotOutcome per entry. The caller
+    has checked the questions are open in the round and saves ``bot`` after.
+    """
+    outcomes = []
+    rows = []
+    for question, answer, answered_at in entries:
+        is_correct, user_points, bot_points = bot.settle(question.id, answer, question.correct_answer)
+        outcomes.append(BotOutcome(is_correct, bot.ai_answer(question.id), user_points, bot_points))
+        rows.append((question.id, is_correct, answer, answered_at))
+
+    award_points(user_id, storage.record_bot_answers(user_id, rows))
+    for question_id, is_correct, _, _ in rows:
+        opponents.record(question_id, is_correct)
+    # Anything that needed a retry was missed at first, for reviews and ratings alike
+    first_tries = [(question.id, outcome.is_correct and bot.attempts[question.id] == 1)
+                   for (question, _, _), outcome in zip(entries, outcomes)]
+    reviews.missed(user_id, BOT, [question_id for question_id, ok in first_tries if not ok])
+    selector.record_many(user_id, first_tries)
+    return outcomes
+
+
+def bot_prefetch(bot, size=PREFETCH_SIZE):
+    """Prefetch bundle of the round's current question and the ``size`` after it"""
+    if bot.state == FINISHED:
+        return None
+    questions = [content.bot_question(q) for q in bot.question_ids[bot.index:bot.index + size + 1]]
+    return make_bundle(questions)
+
+
+def leaderboard(name, user_id, count=TOP_SIZE):
+    """(top entries as (rank, user_id, username, score), (rank, score, players) for ``user_id``)"""
+    entries = leaderboards.top(name, count)
+    usernames = storage.list_usernames([entry[1] for entry in entries])
+    return ([(rank, entry_user, usernames.get(entry_user, '?'), score) for rank, entry_user, score in entries],
+            leaderboards.standing(name, user_id))
+
+
+def save_match_answers(user_id, rows):
+    """Store a batch of (question_id, is_correct, answer, answered_at) from head-to-head matches"""
+    award_points(user_id, storage.record_bot_answers(user_id, rows))
+    for question_id, is_correct, _, _ in rows:
+        opponents.record(question_id, is_correct)
+    reviews.missed(user_id, BOT, [question_id for question_id, is_correct, _, _ in rows if not is_correct])
+
+
+def reset_bot_progress(user_id):
+    """Start a user's bot progress over and take their bot points off the global and weekly boards"""
+    leaderboards.update(user_id, storage.reset_bot_progress(user_id, [GLOBAL, week_board()]))
+
+
+def level_score(results, total=None):
+    """Percentage of correct AnswerResults out of ``total`` (default: all results), rounded down"""
+    total = len(results) if total is None else total
+    correct = sum(1 for result in results if result.is_correct)
+    return int((correct / total) * 100) if total > 0 else 0
+
+
+def save_level_result(user_id, level_id, results, total=None):
+    """Store a main-track level submission; returns (score, completed)"""
+    score = level_score(results, total)
+    completed = score >= PASS_SCORE
+    # Only a new best score counts, as in user_progress
+    best = storage.save_level_progress(user_id, level_id, score, completed)
+    award_points(user_id, max(score - best, 0))
+    progress.record(user_id, MAIN_TRACK, level_id, score, completed)
+    reviews.missed(user_id, LEVEL, [r.question.id for r in results if not r.is_correct])
+    return score, completed
+
+
+def save_role_level_result(user_id, role_level, results, total=None):
+    """Store a role level submission; returns (score, completed)"""
+    score = level_score(results, total)
+    completed = score >= PASS_SCORE
+    best = storage.save_role_level_progress(user_id, role_level.role_id, role_level.id, score, completed)
+    award_points(user_id, max(score - best, 0), role_level.role_id)
+    progress.record(user_id, role_track(role_level.role_id), role_level.id, score, completed)
+    reviews.missed(user_id, ROLE, [r.question.id for r in results if not r.is_correct])
+    return score, completed
+
+
+def rpg_progress(user_id):
+    """The user's RPG save for the page, or None before their first save"""
+    saved = storage.get_rpg_progress(user_id)
+    if saved is None:
+        return None
+    learned = int(saved.learned, 16)
+    return {'map': saved.map_id, 'x': saved.x, 'y': saved.y,
+            'visited': list(filter(None, saved.visited.split(','))),
+            'learned': [bit for bit in range(learned.bit_length()) if learned >> bit & 1]}
+
+
+def save_rpg_progress(user_id, map_id, x, y, visited=(), learned=()):
+    """Merge one RPG save delta: position, newly visited NPC ids and newly learned concept bits"""
+    bits = 0
+    for bit in learned:
+        bits |= 1 << bit
+    storage.merge_rpg_progress(user_id, map_id, x, y, visited, bits)
@@ -0,0 +1,94 @@
+"""Template helpers for the responsive image variants written by build_images.py
+
+The manifest maps each source image (relative to static/) to its variants:
+``{format: [[width, path], ...]}`` from narrowest to widest. Until it has
+been built every helper falls back to the original file.
+"""
+import json
+import os
+
+from flask import url_for
+from markupsafe import Markup
+
+BUILD_DIR = 'build'
+MANIFEST = f'{BUILD_DIR}/images.json'
+
+# Preferred first; image-set() lets the browser take the first type it supports
+CSS_TYPES = [('avif', 'image/avif'), ('webp', 'image/webp'), ('png', 'image/png')]
+
+
+class ImageManifest:
+    """Loaded once per process from static/build/images.json"""
+
+    def __init__(self, static_folder):
+        self.path = os.path.join(static_folder, MANIFEST)
+        self._images = None
+
+    @property
+    def images(self):
+        if self._images is None:
+            try:
+                with open(self.path) as f:
+                    self._images = json.load(f)
+            except (OSError, ValueError):
+                self._images = {}
+        return self._images
+
+    def variants(self, name, fmt):
+        return self.images.get(name, {}).get('variants', {}).get(fmt, [])
+
+    def variant(self, name, fmt, width):
+        """Path of the narrowest ``fmt`` variant at least ``width`` wide (else the widest)"""
+        variants = self.variants(name, fmt)
+        for variant_width, path in variants:
+            if variant_width >= width:
+                return path
+        return variants[-1][1] if variants else None
+
+    def breakpoints(self, name):
+        return [width for width, _ in self.variants(name, 'png')]
+
+    def src(self, name, width=None, fmt='png'):
+        """URL of the best variant for a ``width`` px slot, or of the original"""
+        path = self.variant(name, fmt, width or 0) if width else None
+        return url_for('static', filename=path or name)
+
+    def srcset(self, name, fmt='webp'):
+        """``srcset`` value listing every ``fmt`` variant with its width"""
+        return ', '.join(f"{url_for('static', filename=path)} {width}w" for width, path in self.variants(name, fmt))
+
+    def image_set(self, name, width):
+        """CSS ``image-set()`` with every format's variant for a ``width`` px slot"""
+        options = []
+        for fmt, mime in CSS_TYPES:
+            path = self.variant(name, fmt, width)
+            if path:
+                options.append(f'url("{url_for("static", filename=path)}") type("{mime}")')
+        return f"image-set({', '.join(options)})" if options else None
+
+    def background(self, name, selector='body'):
+        """<style> giving ``selector`` a background sized to the viewport width.
+
+        Each breakpoint gets a plain url() for browsers without image-set(),
+        followed by the image-set() with AVIF/WebP/PNG for the rest.
+        """
+        widths = self.breakpoints(name)
+        if not widths:
+            return ''
+        rules = []
+        lower = 0
+        for width in widths:
+            rule = (f'{selector} {{ background-image: url("{self.src(name, width)}"); '
+                    f'background-image: {self.image_set(name, width)}; }}')
+            rules.append(f'@media (min-width: {lower + 1}px) {{ {rule} }}' if lower else rule)
+            lower = width
+        return Markup('<style>\n' + '\n'.join(rules) + '\n</style>')
+
+
+def init_app(app):
+    """Register the helpers as template globals"""
+    manifest = ImageManifest(app.static_folder)
+    app.add_template_global(manifest.src, 'image_src')
+    app.add_template_global(manifest.srcset, 'image_srcset')
+    app.add_template_global(manifest.background, 'responsive_background')
+    return manifest
@@ -0,0 +1,192 @@
+"""Leaderboards maintained incrementally as scores change
+
+Boards:
+
+- ``global``: bot points plus the best score of every level and role level
+- ``role:<id>``: best role level scores within one role
+- ``week:<year>-W<week>``: net points earned during one ISO week (UTC)
+
+Scores live in leaderboard_scores and are changed by deltas as answers and
+level results are saved, so no view aggregates the progress tables. Each
+board is also held in memory as a RankedList, so top-K and a player's rank
+cost O(log n) and an update O(log n) plus a shift inside one chunk. Boards
+are reloaded every LEADERBOARD_TTL seconds to pick up other app nodes'
+writes.
+"""
+import datetime
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+GLOBAL = 'global'
+TOP_SIZE = 10
+
+
+def role_board(role_id):
+    return f'role:{role_id}'
+
+
+def week_board(when=None):
+    moment = datetime.datetime.fromtimestamp(time.time() if when is None else when, datetime.timezone.utc)
+    year, week, _ = moment.isocalendar()
+    return f'week:{year}-W{week:02d}'
+
+
+class RankedList:
+    """Sorted list of (-score, user_id) with positional rank lookups.
+
+    Items are kept in sorted chunks of about CHUNK_SIZE with a Fenwick tree
+    over the chunk lengths, so the number of items before any key is a
+    bisect over the chunk maxima, a tree prefix sum and a bisect inside one
+    chunk.
+    """
+
+    CHUNK_SIZE = 512
+
+    def __init__(self, items=()):
+        items = sorted(items)
+        self._chunks = [items[i:i + self.CHUNK_SIZE] for i in range(0, len(items), self.CHUNK_SIZE)]
+        self._rebuild()
+
+    def _rebuild(self):
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._tree = [0] * (len(self._chunks) + 1)
+        for i, chunk in enumerate(self._chunks):
+            self._update(i, len(chunk))
+        self._len = sum(len(chunk) for chunk in self._chunks)
+
+    def _update(self, i, delta):
+        i += 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i):
+        """Items in the first ``i`` chunks"""
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def __len__(self):
+        return self._len
+
+    def add(self, item):
+        if not self._chunks:
+            self._chunks.append([item])
+            self._rebuild()
+            return
+        i = min(bisect_left(self._maxes, item), len(self._chunks) - 1)
+        chunk = self._chunks[i]
+        insort(chunk, item)
+        self._maxes[i] = chunk[-1]
+        self._len += 1
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            self._chunks[i:i + 1] = [chunk[:self.CHUNK_SIZE], chunk[self.CHUNK_SIZE:]]
+            self._rebuild()
+        else:
+            self._update(i, 1)
+
+    def remove(self, item):
+        i = bisect_left(self._maxes, item)
+        chunk = self._chunks[i]
+        del chunk[bisect_left(chunk, item)]
+        self._len -= 1
+        if chunk:
+            self._maxes[i] = chunk[-1]
+            self._update(i, -1)
+        else:
+            del self._chunks[i]
+            self._rebuild()
+
+    def count_before(self, key):
+        """Number of items that sort before ``key``"""
+        i = bisect_left(self._maxes, key)
+        if i == len(self._chunks):
+            return self._len
+        return self._prefix(i) + bisect_left(self._chunks[i], key)
+
+    def top(self, count):
+        items = []
+        for chunk in self._chunks:
+            items.extend(chunk[:count - len(items)])
+            if len(items) >= count:
+                break
+        return items
+
+
+class Board:
+    """One leaderboard: each player's score plus the ranked order"""
+
+    def __init__(self, rows):
+        self.scores = {row.user_id: row.score for row in rows}
+        self.ranked = RankedList((-score, user_id) for user_id, score in self.scores.items())
+        self.loaded_at = time.monotonic()
+
+    def set(self, user_id, score):
+        old = self.scores.get(user_id)
+        if old is not None:
+            self.ranked.remove((-old, user_id))
+        self.scores[user_id] = score
+        self.ranked.add((-score, user_id))
+
+    def rank(self, user_id):
+        """1-based rank of a player (ties share a rank), or None if not on the board"""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return self.ranked.count_before((-score,)) + 1
+
+    def top(self, count):
+        """[(rank, user_id, score)] for the best ``count`` players"""
+        entries = []
+        for i, (negative, user_id) in enumerate(self.ranked.top(count)):
+            rank = entries[-1][0] if entries and entries[-1][2] == -negative else i + 1
+            entries.append((rank, user_id, -negative))
+        return entries
+
+
+class Leaderboards:
+    """Leaderboard service: applies score deltas and answers ranking queries"""
+
+    def __init__(self, storage, ttl=None):
+        self.storage = storage
+        self.ttl = ttl if ttl is not None else float(os.environ.get('LEADERBOARD_TTL', 300))
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def board(self, name):
+        board = self._boards.get(name)
+        if board is None or time.monotonic() - board.loaded_at >= self.ttl:
+            board = Board(self.storage.list_leaderboard(name))
+            with self._lock:
+                self._boards[name] = board
+        return board
+
+    def add(self, user_id, deltas):
+        """Apply ``{board: points}`` for one player; zero deltas are skipped"""
+        deltas = {name: points for name, points in deltas.items() if points}
+        if not deltas:
+            return
+        self.update(user_id, self.storage.add_leaderboard_points(user_id, deltas))
+
+    def update(self, user_id, scores):
+        """Record ``{board: score}`` already written to storage in the loaded boards"""
+        with self._lock:
+            for name, score in scores.items():
+                board = self._boards.get(name)
+                if board is not None:
+                    board.set(user_id, score)
+
+    def top(self, name, count=TOP_SIZE):
+        board = self.board(name)
+        with self._lock:
+            return board.top(count)
+
+    def standing(self, name, user_id):
+        """(rank, score, players) for a player, rank None when they have no score yet"""
+        board = self.board(name)
+        with self._lock:
+            return board.rank(user_id), board.scores.get(user_id, 0), len(board.ranked)
@@ -0,0 +1,27 @@
+"""Background housekeeping threads"""
+import os
+import threading
+import time
+
+
+def purge_loop(storage, interval, batch_size):
+    """Delete superseded progress rows in small batches until none are left"""
+    while True:
+        try:
+            while storage.purge_superseded(batch_size) >= batch_size:
+                time.sleep(0.1)
+        except Exception as e:
+            print(f"Purge error: {e}")
+        time.sleep(interval)
+
+
+def start_purger(storage, interval=None, batch_size=None):
+    """Start the purge thread; PURGE_INTERVAL=0 disables it"""
+    interval = interval if interval is not None else float(os.environ.get('PURGE_INTERVAL', 300))
+    batch_size = batch_size or int(os.environ.get('PURGE_BATCH_SIZE', 500))
+    if interval <= 0:
+        return None
+    thread = threading.Thread(target=purge_loop, args=(storage, interval, batch_size),
+                              name='purge-superseded', daemon=True)
+    thread.start()
+    return thread
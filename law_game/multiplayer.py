@@ -0,0 +1,305 @@
+"""Real-time head-to-head matches on an asyncio event loop
+
+A plain ASGI application, so one process holds thousands of matches as
+coroutines instead of threads. Requests under /match are handled here and
+everything else is passed on to the Flask app (see asgi.py):
+
+- ``GET /match/events``: Server-Sent Events stream. Opening it joins the
+  matchmaking queue; the next player to join gets the same bot questions and
+  both receive ``start``, then ``score`` as either of them answers and
+  ``end`` when both are done or one leaves.
+- ``POST /match/answer``: ``{question_id, answer}``; graded here against the
+  in-memory match.
+
+Players are identified by the normal Flask session cookie. Matches live in
+memory only; answers are queued and written to the progress tables in
+batches every MATCH_FLUSH_INTERVAL seconds, in a worker thread.
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+from collections import OrderedDict, defaultdict
+from http.cookies import SimpleCookie
+
+from itsdangerous import BadSignature
+
+from gameplay import content, save_match_answers
+
+MATCH_SIZE = int(os.environ.get('MATCH_SIZE', 5))
+FLUSH_INTERVAL = float(os.environ.get('MATCH_FLUSH_INTERVAL', 2))
+HEARTBEAT = 15
+
+# A correct answer scores CORRECT_POINTS, plus FIRST_BONUS for beating the opponent to it
+CORRECT_POINTS = 3
+FIRST_BONUS = 1
+
+
+class Player:
+    __slots__ = ('user_id', 'username', 'events', 'match', 'answers', 'score')
+
+    def __init__(self, user_id, username):
+        self.user_id = user_id
+        self.username = username
+        self.events = asyncio.Queue()
+        self.match = None
+        self.answers = {}
+        self.score = 0
+
+    def send(self, event, data):
+        self.events.put_nowait((event, data))
+
+    def close(self):
+        self.events.put_nowait(None)
+
+
+class Match:
+    """Two players racing through the same questions"""
+
+    def __init__(self, match_id, questions, players):
+        self.id = match_id
+        self.questions = {question.id: question for question in questions}
+        self.order = [question.id for question in questions]
+        self.players = players
+        self.solved = set()
+        for player in players:
+            player.match = self
+
+    def opponent(self, player):
+        return self.players[1] if player is self.players[0] else self.players[0]
+
+    def answer(self, player, question_id, answer):
+        """Grade one answer; returns (is_correct, points)"""
+        is_correct = answer == self.questions[question_id].correct_answer
+        points = 0
+        if is_correct:
+            points = CORRECT_POINTS + (FIRST_BONUS if question_id not in self.solved else 0)
+            self.solved.add(question_id)
+        player.answers[question_id] = answer
+        player.score += points
+        return is_correct, points
+
+    @property
+    def done(self):
+        return all(len(player.answers) == len(self.order) for player in self.players)
+
+    def scores(self):
+        return [[player.username, player.score, len(player.answers)] for player in self.players]
+
+
+class Multiplayer:
+    """ASGI app for /match, passing other requests to ``fallback``"""
+
+    def __init__(self, flask_app, fallback=None):
+        self.sessions = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+        self.max_age = flask_app.permanent_session_lifetime.total_seconds()
+        self.fallback = fallback
+        self.waiting = OrderedDict()
+        self.players = {}
+        self.pending = defaultdict(list)
+        self.match_ids = itertools.count(1)
+        self._flusher = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['path'].startswith('/match/'):
+            if self._flusher is None:
+                self._flusher = asyncio.ensure_future(self.flush_loop())
+            user = self.user(scope)
+            if user is None:
+                return await self.respond(send, 401, {'error': 'login required'})
+            if scope['path'] == '/match/events' and scope['method'] == 'GET':
+                return await self.events(receive, send, user)
+            if scope['path'] == '/match/answer' and scope['method'] == 'POST':
+                return await self.submit_answer(receive, send, user)
+            return await self.respond(send, 404, {'error': 'not found'})
+        if self.fallback is None:
+            return await self.respond(send, 404, {'error': 'not found'})
+        return await self.fallback(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Load the question bank now rather than on the first match
+                await asyncio.get_running_loop().run_in_executor(None, content.bot_question_list)
+                self._flusher = asyncio.ensure_future(self.flush_loop())
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._flusher:
+                    self._flusher.cancel()
+                await self.flush()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def user(self, scope):
+        """(user_id, username) from the Flask session cookie, or None"""
+        cookies = SimpleCookie()
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                cookies.load(value.decode('latin-1'))
+        morsel = cookies.get(self.cookie_name)
+        if morsel is None:
+            return None
+        try:
+            data = self.sessions.loads(morsel.value, max_age=self.max_age)
+        except BadSignature:
+            return None
+        if 'user_id' not in data:
+            return None
+        return data['user_id'], data.get('username', '')
+
+    # Matchmaking
+
+    def join(self, player):
+        previous = self.players.get(player.user_id)
+        if previous is not None:
+            # A second tab replaces the first
+            self.leave(previous)
+            previous.send('replaced', {})
+            previous.close()
+        self.players[player.user_id] = player
+        if self.waiting:
+            _, opponent = self.waiting.popitem(last=False)
+            self.start_match([opponent, player])
+        else:
+            self.waiting[player.user_id] = player
+            player.send('waiting', {})
+
+    def start_match(self, players):
+        bank = content.bot_question_list()
+        questions = random.sample(bank, min(MATCH_SIZE, len(bank)))
+        match = Match(next(self.match_ids), questions, players)
+        for player in players:
+            player.send('start', {'match': match.id, 'opponent': match.opponent(player).username,
+                                  'questions': [[q.id, q.question_text,
+                                                 [q.option_a, q.option_b, q.option_c, q.option_d]]
+                                                for q in questions]})
+
+    def leave(self, player):
+        """Drop a player that disconnected; their opponent wins by forfeit"""
+        if self.waiting.get(player.user_id) is player:
+            del self.waiting[player.user_id]
+        if self.players.get(player.user_id) is player:
+            del self.players[player.user_id]
+        match = player.match
+        if match is not None and not match.done:
+            opponent = match.opponent(player)
+            self.finish(match, winner=opponent, forfeit=True)
+
+    def finish(self, match, winner=None, forfeit=False):
+        if winner is None:
+            first, second = match.players
+            winner = first if first.score > second.score else second if second.score > first.score else None
+        for player in match.players:
+            player.match = None
+            player.send('end', {'scores': match.scores(), 'winner': winner.username if winner else None,
+                                'forfeit': forfeit})
+            player.close()
+
+    # Streams and answers
+
+    async def events(self, receive, send, user):
+        player = Player(*user)
+        self.join(player)
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+                                (b'x-accel-buffering', b'no')]})
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        event = None
+        try:
+            while True:
+                event = event or asyncio.ensure_future(player.events.get())
+                done, _ = await asyncio.wait({event, disconnected}, timeout=HEARTBEAT,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    break
+                if event in done:
+                    item = event.result()
+                    event = None
+                    if item is None:
+                        break
+                    name, data = item
+                    body = f'event: {name}\ndata: {json.dumps(data)}\n\n'
+                else:
+                    body = ': ping\n\n'
+                await send({'type': 'http.response.body', 'body': body.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        except OSError:
+            pass
+        finally:
+            if event is not None:
+                event.cancel()
+            disconnected.cancel()
+            self.leave(player)
+
+    async def submit_answer(self, receive, send, user):
+        try:
+            data = json.loads(await read_body(receive) or b'{}')
+        except ValueError:
+            data = {}
+        player = self.players.get(user[0])
+        match = player.match if player else None
+        if match is None:
+            return await self.respond(send, 409, {'error': 'not in a match'})
+        question_id = data.get('question_id')
+        answer = data.get('answer')
+        if question_id not in match.questions or answer not in ('A', 'B', 'C', 'D'):
+            return await self.respond(send, 400, {'error': 'question_id of this match and answer (A-D) required'})
+        if question_id in player.answers:
+            return await self.respond(send, 409, {'error': 'question already answered'})
+
+        is_correct, points = match.answer(player, question_id, answer)
+        self.pending[player.user_id].append((question_id, is_correct, answer, None))
+        # The opponent only learns the scores, not which answer was right
+        for member in match.players:
+            member.send('score', {'scores': match.scores()})
+        if match.done:
+            self.finish(match)
+        await self.respond(send, 200, {'correct': is_correct, 'points': points, 'score': player.score,
+                                       'correct_answer': match.questions[question_id].correct_answer})
+
+    # Persistence
+
+    async def flush(self):
+        """Write queued answers, one transaction per player, off the event loop"""
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, defaultdict(list)
+        loop = asyncio.get_running_loop()
+        for user_id, rows in batch.items():
+            try:
+                await loop.run_in_executor(None, save_match_answers, user_id, rows)
+            except Exception as e:
+                print(f"Match flush error: {e}")
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await self.flush()
+
+    async def respond(self, send, status, data):
+        body = json.dumps(data).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return body
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
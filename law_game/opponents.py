@@ -0,0 +1,138 @@
+"""Opponent models for You-vs-Bot mode
+
+Every model picks the bot's answer to a question from a seeded RNG:
+
+- ``fixed``: correct with a constant probability (the classic 80% bot)
+- ``adaptive``: correct about as often as real players are on that question
+- ``ghost``: replays the recorded answers of the top-scoring player
+
+Per-question correctness counts are loaded once, updated in place as answers
+are recorded and reloaded every OPPONENT_STATS_TTL seconds, so picking an
+answer is a dict lookup.
+"""
+import os
+import threading
+import time
+
+OPTIONS = 'ABCD'
+AI_ACCURACY = 0.8
+DEFAULT_OPPONENT = os.environ.get('BOT_OPPONENT', 'fixed')
+
+# Pseudo-answers mixed into each question's rate, so rarely answered
+# questions stay close to AI_ACCURACY instead of swinging to 0% or 100%
+PRIOR_WEIGHT = 5
+
+
+def roll_answer(rng, correct_answer, accuracy=AI_ACCURACY):
+    """Correct with probability ``accuracy``, else a random wrong option"""
+    if rng.random() < accuracy:
+        return correct_answer
+    return rng.choice([option for option in OPTIONS if option != correct_answer])
+
+
+class FixedOpponent:
+    name = 'fixed'
+
+    def __init__(self, accuracy=AI_ACCURACY):
+        self.accuracy = accuracy
+
+    def answer(self, rng, question):
+        return roll_answer(rng, question.correct_answer, self.accuracy)
+
+
+class AdaptiveOpponent:
+    """Answers each question correctly at the players' observed rate"""
+
+    name = 'adaptive'
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def answer(self, rng, question):
+        return roll_answer(rng, question.correct_answer, self.stats.accuracy(question.id))
+
+
+class GhostOpponent:
+    """Replays a player's recorded answers; unseen questions fall back to ``fallback``"""
+
+    name = 'ghost'
+
+    def __init__(self, answers, fallback):
+        self.answers = answers
+        self.fallback = fallback
+
+    def answer(self, rng, question):
+        recorded = self.answers.get(question.id)
+        if recorded is None:
+            return self.fallback.answer(rng, question)
+        if isinstance(recorded, str):
+            return recorded
+        # Older rows only say whether the answer was correct
+        return roll_answer(rng, question.correct_answer, 1.0 if recorded else 0.0)
+
+
+class QuestionStats:
+    """Answered/correct counts per bot question across all players"""
+
+    def __init__(self, storage, ttl=None):
+        self.storage = storage
+        self.ttl = ttl if ttl is not None else float(os.environ.get('OPPONENT_STATS_TTL', 300))
+        self._counts = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        counts = {row.question_id: [row.answered, row.correct] for row in self.storage.bot_question_stats()}
+        with self._lock:
+            self._counts = counts
+            self._loaded_at = time.monotonic()
+
+    def record(self, question_id, is_correct):
+        with self._lock:
+            counts = self._counts.setdefault(question_id, [0, 0])
+            counts[0] += 1
+            counts[1] += 1 if is_correct else 0
+
+    def accuracy(self, question_id):
+        self._ensure_loaded()
+        answered, correct = self._counts.get(question_id, (0, 0))
+        return (correct + AI_ACCURACY * PRIOR_WEIGHT) / (answered + PRIOR_WEIGHT)
+
+
+class Opponents:
+    """Builds opponent models by name and keeps their shared statistics"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.stats = QuestionStats(storage)
+        self.fixed = FixedOpponent()
+        self.adaptive = AdaptiveOpponent(self.stats)
+        self._ghost = None
+        self._ghost_loaded_at = None
+
+    def get(self, name=None):
+        name = name or DEFAULT_OPPONENT
+        if name == 'adaptive':
+            return self.adaptive
+        if name == 'ghost':
+            return self.ghost()
+        return self.fixed
+
+    def ghost(self):
+        """Ghost of the current top player, rebuilt at most once per stats TTL"""
+        now = time.monotonic()
+        if self._ghost is None or now - self._ghost_loaded_at >= self.stats.ttl:
+            answers = {}
+            user_id = self.storage.top_bot_player()
+            if user_id is not None:
+                for row in self.storage.bot_answer_history(user_id):
+                    answers[row.question_id] = row.answer or bool(row.is_correct)
+            self._ghost = GhostOpponent(answers, self.adaptive)
+            self._ghost_loaded_at = now
+        return self._ghost
+
+    def record(self, question_id, is_correct):
+        """Count a just-recorded answer in the per-question statistics"""
+        self.stats.record(question_id, is_correct)
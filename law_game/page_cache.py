@@ -0,0 +1,118 @@
+"""Weak ETags for rendered pages, checked before anything is rendered
+
+A view wrapped with ``conditional_page(*versions)`` gets the ETag
+``W/"<hash>"``. The hash covers the release (the code, the templates and
+the build manifests), the URL, the user, and each ``version(user_id)``.
+Those are the cheap keys of whatever the page shows: the content version,
+a progress summary, a save. When If-None-Match matches, the browser gets
+a 304 and the view never runs. Pages are sent ``private, no-cache``: the browser keeps
+its copy but revalidates on every visit.
+
+Only GETs by a logged-in user are handled. On pages that show flashed
+messages (``shows_flashes=True``), a request with messages waiting always
+renders, so each message is shown exactly once.
+
+Pages whose only per-user parts are flags (completed, unlocked, the name)
+go further with ``shell_page(*versions)``. The view renders a shell with
+no user data, once per release and ``version()`` values, and every user
+gets those same bytes from memory, compressed once per content coding.
+static/page-progress.js then fills in the flags from /api/v1/progress/flags.
+"""
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+from compression import compress, negotiate
+from images import BUILD_DIR
+
+
+def release_version(app):
+    """Hash of the app's modules, templates and build manifests, computed once per process"""
+    version = app.extensions.get('page_release')
+    if version is None:
+        digest = hashlib.sha1()
+        template_folder = os.path.join(app.root_path, app.template_folder)
+        build_folder = os.path.join(app.static_folder, BUILD_DIR)
+        paths = [os.path.join(root, name) for root, _, files in os.walk(template_folder) for name in files]
+        paths += [os.path.join(app.root_path, name) for name in os.listdir(app.root_path) if name.endswith('.py')]
+        if os.path.isdir(build_folder):
+            paths += [os.path.join(build_folder, name) for name in os.listdir(build_folder) if name.endswith('.json')]
+        for path in sorted(paths):
+            digest.update(os.path.relpath(path, app.root_path).encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        version = app.extensions['page_release'] = digest.hexdigest()[:16]
+    return version
+
+
+# Most shells kept per view; all are dropped when full (old versions pile up)
+MAX_SHELLS = 64
+
+
+def page_etag(key):
+    return hashlib.sha1(repr([release_version(current_app), request.full_path] + key).encode()).hexdigest()[:20]
+
+
+def revalidated(response, etag):
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional_page(*versions, shows_flashes=False):
+    """Answer 304 before rendering when the page's ETag still matches"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = session.get('user_id')
+            if request.method != 'GET' or user_id is None or (shows_flashes and '_flashes' in session):
+                return view(*args, **kwargs)
+            etag = page_etag([user_id] + [version(user_id) for version in versions])
+            if request.if_none_match.contains_weak(etag):
+                return revalidated(current_app.response_class(status=304), etag)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            return revalidated(response, etag)
+        return wrapper
+    return decorator
+
+
+def shell_page(*versions):
+    """Render the view once per release and ``version()`` values and serve those bytes to every user
+
+    The view must not render anything user-specific, flashed messages
+    included, when the user is logged in.
+    """
+    def decorator(view):
+        # etag -> {content coding or None: body}
+        shells = {}
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or 'user_id' not in session:
+                return view(*args, **kwargs)
+            etag = page_etag([version() for version in versions])
+            if request.if_none_match.contains_weak(etag):
+                return revalidated(current_app.response_class(status=304), etag)
+            bodies = shells.get(etag)
+            if bodies is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if len(shells) >= MAX_SHELLS:
+                    shells.clear()
+                bodies = shells[etag] = {None: response.get_data()}
+            encoding = negotiate(len(bodies[None]))
+            if encoding not in bodies:
+                bodies[encoding] = compress(bodies[None], encoding)
+            response = current_app.response_class(bodies[encoding], mimetype='text/html')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return revalidated(response, etag)
+        return wrapper
+    return decorator
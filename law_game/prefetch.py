@@ -0,0 +1,18 @@
+"""Prefetch bundles for the next questions of a round
+
+A bundle carries the current question of a round and the next few in the
+API's compact ``[id, text, [a, b, c, d]]`` form, so the You vs Bot page can
+show the next question as soon as the server has graded an answer, without
+loading a new page. Nothing in it tells a right pick from a wrong one: every
+answer is graded by the server first, and only for the current question of
+the round saved in the session, so the bundle needs no signature of its own.
+"""
+import os
+
+PREFETCH_SIZE = int(os.environ.get('PREFETCH_SIZE', 3))
+
+
+def make_bundle(questions, text_field='question_text'):
+    """Bundle for ``questions``"""
+    return {'questions': [[q.id, getattr(q, text_field), [q.option_a, q.option_b, q.option_c, q.option_d]]
+                          for q in questions]}
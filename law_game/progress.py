@@ -0,0 +1,83 @@
+"""Per-user progress summaries kept in memory and updated on each submission"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from content import MAIN_TRACK
+
+
+class ProgressSummary:
+    """Completed levels, best scores and the current frontier for one track"""
+
+    __slots__ = ('completed', 'best_scores', 'frontier', 'loaded_at')
+
+    def __init__(self, track, rows):
+        self.completed = set()
+        self.best_scores = {}
+        for level_id, score, completed in rows:
+            if completed:
+                self.completed.add(level_id)
+            if score > self.best_scores.get(level_id, -1):
+                self.best_scores[level_id] = score
+        self.frontier = None
+        self.loaded_at = time.monotonic()
+        self._advance(track, track.first_level_id())
+
+    def _advance(self, track, level_id):
+        """Walk successors from ``level_id`` to the first incomplete level"""
+        while level_id is not None and level_id in self.completed:
+            level_id = track.successor.get(level_id)
+        self.frontier = level_id
+
+    def record(self, track, level_id, score, completed):
+        if score > self.best_scores.get(level_id, -1):
+            self.best_scores[level_id] = score
+        if completed and level_id not in self.completed:
+            self.completed.add(level_id)
+            if level_id == self.frontier:
+                self._advance(track, level_id)
+
+
+class ProgressTracker:
+    """LRU of progress summaries keyed by (user_id, track).
+
+    Summaries are loaded from storage on first use and then updated in place
+    when a level is submitted, so map pages need no progress queries. Entries
+    expire after PROGRESS_CACHE_TTL seconds so that other app nodes' writes
+    are picked up eventually.
+    """
+
+    def __init__(self, storage, content, max_entries=None, ttl=None):
+        self.storage = storage
+        self.content = content
+        self.max_entries = max_entries or int(os.environ.get('PROGRESS_CACHE_SIZE', 10000))
+        self.ttl = ttl if ttl is not None else float(os.environ.get('PROGRESS_CACHE_TTL', 60))
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load_rows(self, user_id, track_key):
+        if track_key == MAIN_TRACK:
+            return self.storage.list_level_progress(user_id)
+        return self.storage.list_role_level_progress(user_id, track_key[1])
+
+    def summary(self, user_id, track_key):
+        key = (user_id, track_key)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None and time.monotonic() - summary.loaded_at < self.ttl:
+                self._summaries.move_to_end(key)
+                return summary
+        summary = ProgressSummary(self.content.track(track_key), self._load_rows(user_id, track_key))
+        with self._lock:
+            self._summaries[key] = summary
+            if len(self._summaries) > self.max_entries:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def record(self, user_id, track_key, level_id, score, completed):
+        """Apply a just-saved submission to the cached summary, if any"""
+        with self._lock:
+            summary = self._summaries.get((user_id, track_key))
+            if summary is not None:
+                summary.record(self.content.track(track_key), level_id, score, completed)
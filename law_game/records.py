@@ -0,0 +1,141 @@
+"""Compact row types for content and progress
+
+Rows are tuple-backed (namedtuple with ``__slots__ = ()``), so a fetched row
+costs one tuple instead of a dict, and cached content rows are immutable.
+Both ``row.title`` and ``row['title']`` work, which keeps the existing route
+code and Jinja templates unchanged.
+"""
+from collections import namedtuple
+
+
+class Record:
+    """Mixin adding key access and helpers to namedtuple rows"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self._fields
+
+    def as_dict(self):
+        """Plain dict copy, for the session cookie or JSON"""
+        return dict(zip(self._fields, self))
+
+    @classmethod
+    def columns(cls, alias=None):
+        """Comma-separated column list in field order, for SELECT"""
+        if alias:
+            return ', '.join(f"{alias}.{name}" for name in cls._fields)
+        return ', '.join(cls._fields)
+
+
+def record(name, fields, base=Record):
+    """Build a tuple-backed row class with the given column fields"""
+    return type(name, (base, namedtuple(name, fields)), {'__slots__': ()})
+
+
+class Options:
+    """Letter -> option text view over a question row, without copying"""
+
+    __slots__ = ('row',)
+
+    def __init__(self, row):
+        self.row = row
+
+    def __getitem__(self, letter):
+        return getattr(self.row, 'option_' + letter.lower())
+
+
+class QuestionRecord(Record):
+    """Shared helpers for any row with option_a..option_d and correct_answer"""
+
+    __slots__ = ()
+
+    @property
+    def options(self):
+        return Options(self)
+
+    def option(self, letter):
+        return getattr(self, 'option_' + letter.lower())
+
+
+OPTION_FIELDS = 'option_a option_b option_c option_d correct_answer'
+
+User = record('User', 'id username password')
+Level = record('Level', 'id level_number title description')
+Question = record('Question', f'id level_id question_text {OPTION_FIELDS} explanation', QuestionRecord)
+BotQuestion = record('BotQuestion', f'id question_text {OPTION_FIELDS} explanation', QuestionRecord)
+ScenarioChain = record('ScenarioChain', 'id domain law_involved title')
+ScenarioStep = record('ScenarioStep', f'id scenario_id step_number story_context {OPTION_FIELDS} feedback',
+                      QuestionRecord)
+ScenarioOutcome = record('ScenarioOutcome', 'id scenario_id final_outcome learning_summary')
+ScenarioBranch = record('ScenarioBranch', 'scenario_id step_number answer next_step')
+Role = record('Role', 'id name description')
+RoleLevel = record('RoleLevel', 'id role_id level_number title description')
+RoleQuestion = record('RoleQuestion', f'id role_level_id question_text {OPTION_FIELDS} explanation',
+                      QuestionRecord)
+
+LevelProgress = record('LevelProgress', 'level_id score completed')
+RoleLevelProgress = record('RoleLevelProgress', 'role_level_id score completed')
+BotAnswer = record('BotAnswer', 'question_id is_correct answer question_text correct_answer explanation')
+BotQuestionStats = record('BotQuestionStats', 'question_id answered correct')
+Rating = record('Rating', 'id rating answers')
+BotAnswerLog = record('BotAnswerLog', 'user_id question_id is_correct')
+ReviewCard = record('ReviewCard', 'kind question_id easiness interval_days repetitions due_at')
+BotStats = record('BotStats', 'answered correct points last_answered_at')
+LeaderboardEntry = record('LeaderboardEntry', 'user_id score')
+
+RpgNpc = record('RpgNpc', 'id map_id name sprite x y')
+RpgDialogue = record('RpgDialogue', 'npc_id position concept intro scenario_id role_question_id concept_bit')
+RpgProgress = record('RpgProgress', 'map_id x y visited learned')
+RpgChoice = record('RpgChoice', 'npc_id dialogue_position position text concept feedback')
+
+
+class AnswerResult(Record, namedtuple('AnswerResult', 'question user_answer is_correct')):
+    """One graded answer on a level results page"""
+
+    __slots__ = ()
+
+    @property
+    def selected_answer(self):
+        return self.user_answer
+
+    @property
+    def question_text(self):
+        return self.question.question_text
+
+    @property
+    def explanation(self):
+        return self.question.explanation
+
+    @property
+    def correct_answer(self):
+        return self.question.correct_answer
+
+    @property
+    def options(self):
+        return self.question.options
+
+
+class MapEntry:
+    """A content row plus per-user unlocked/completed flags for map pages"""
+
+    __slots__ = ('row', 'unlocked', 'completed')
+
+    def __init__(self, row, unlocked=True, completed=False):
+        self.row = row
+        self.unlocked = unlocked
+        self.completed = completed
+
+    def __getattr__(self, name):
+        return getattr(self.row, name)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
@@ -0,0 +1,72 @@
+"""Spaced-repetition review of missed questions (SM-2)
+
+Any wrong answer (bot, level or role question) puts a card for that question
+in the player's review queue. Reviewing it grades the card SM-2 style: a
+correct answer waits 1 day, then 6 days, then interval * easiness; a wrong
+one lapses the card back to the start and lowers its easiness. Lapsed cards
+come back after RELEARN_DELAY instead of a full day, so a miss can be
+practised in the same sitting.
+"""
+import os
+import time
+
+from records import ReviewCard
+
+BOT = 'bot'
+LEVEL = 'level'
+ROLE = 'role'
+
+DAY = 24 * 60 * 60
+RELEARN_DELAY = int(os.environ.get('REVIEW_RELEARN_DELAY', 600))
+ROUND_SIZE = int(os.environ.get('REVIEW_ROUND_SIZE', 10))
+INITIAL_EASINESS = 2.5
+MIN_EASINESS = 1.3
+CORRECT_QUALITY = 4
+MISSED_QUALITY = 1
+
+
+def easiness_change(quality):
+    return 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+
+
+def sm2(card, quality, now):
+    """Card after one review graded ``quality`` (0-5) at ``now``"""
+    easiness = max(MIN_EASINESS, card.easiness + easiness_change(quality))
+    if quality < 3:
+        return card._replace(easiness=easiness, interval_days=1, repetitions=0, due_at=now + RELEARN_DELAY)
+    if card.repetitions == 0:
+        interval = 1
+    elif card.repetitions == 1:
+        interval = 6
+    else:
+        interval = card.interval_days * easiness
+    return card._replace(easiness=easiness, interval_days=interval, repetitions=card.repetitions + 1,
+                         due_at=now + interval * DAY)
+
+
+class ReviewScheduler:
+    """Per-user review queue stored in review_cards"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def missed(self, user_id, kind, question_ids):
+        """Queue (or lapse) the cards for questions just answered wrongly"""
+        if question_ids:
+            self.storage.record_missed_questions(user_id, kind, question_ids, time.time() + RELEARN_DELAY,
+                                                 -easiness_change(MISSED_QUALITY), MIN_EASINESS)
+
+    def grade(self, user_id, kind, question_id, is_correct):
+        """Apply a review answer to the card and reschedule it"""
+        now = time.time()
+        card = (self.storage.get_review_card(user_id, kind, question_id)
+                or ReviewCard(kind, question_id, INITIAL_EASINESS, 0, 0, now))
+        card = sm2(card, CORRECT_QUALITY if is_correct else MISSED_QUALITY, now)
+        self.storage.save_review_card(user_id, card)
+        return card
+
+    def due(self, user_id, limit=ROUND_SIZE):
+        return self.storage.due_review_cards(user_id, time.time(), limit)
+
+    def due_count(self, user_id):
+        return self.storage.count_due_reviews(user_id, time.time())
@@ -0,0 +1,75 @@
+"""RPG character sprites, from one atlas built by build_sprites.py
+
+static/rpg_assets/sprites/sprites.json defines each sprite: its animation
+frames (images relative to static/), the size it is drawn at, the anchor
+(the point placed on the entity's position) and its frame rate (0 = still).
+build_sprites.py packs every frame, already scaled to its drawn size, into
+one texture, so the page loads a single image and draws sub-rectangles of
+it. Until it has been built the page loads the source images instead.
+"""
+import json
+import os
+
+from flask import url_for
+
+from images import BUILD_DIR
+
+SOURCE = 'rpg_assets/sprites/sprites.json'
+MANIFEST = f'{BUILD_DIR}/sprites.json'
+
+
+def load_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+class SpriteSheet:
+    """Loaded once per process from the build manifest or the sprite definitions"""
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self._built = None
+        self._sources = None
+
+    @property
+    def built(self):
+        if self._built is None:
+            self._built = load_json(os.path.join(self.static_folder, MANIFEST), {})
+        return self._built
+
+    @property
+    def sources(self):
+        if self._sources is None:
+            self._sources = load_json(os.path.join(self.static_folder, SOURCE), {})
+        return self._sources
+
+    def sheet(self):
+        """``{images, sprites}`` for the page; each frame is ``[image index, x, y, w, h]``.
+
+        Without an atlas every frame is a whole source image (w and h are 0)
+        scaled to the sprite's size when drawn.
+        """
+        if self.built:
+            return {'images': [url_for('static', filename=self.built['image'])],
+                    'sprites': {name: dict(sprite, frames=[[0] + frame for frame in sprite['frames']])
+                                for name, sprite in self.built['sprites'].items()}}
+        files = []
+        sprites = {}
+        for name, sprite in self.sources.items():
+            frames = []
+            for path in sprite['frames']:
+                if path not in files:
+                    files.append(path)
+                frames.append([files.index(path), 0, 0, 0, 0])
+            sprites[name] = dict(sprite, frames=frames)
+        return {'images': [url_for('static', filename=path) for path in files], 'sprites': sprites}
+
+
+def init_app(app):
+    """Register ``sprite_sheet()`` as a template global"""
+    sheet = SpriteSheet(app.static_folder)
+    app.add_template_global(sheet.sheet, 'sprite_sheet')
+    return sheet
@@ -0,0 +1,94 @@
+// Per-user state for the cached page shells (see page_cache.shell_page): the
+// server sends every player the same page and this fills in their progress
+
+class LawGamePageProgress {
+    constructor(flags) {
+        this.flags = flags;
+    }
+
+    static load() {
+        const root = document.querySelector('[data-progress-url]');
+        if (!root) {
+            return;
+        }
+        // Only pages with somewhere to show flashed messages take them
+        const messages = document.querySelector('[data-flash-messages]') ? '?messages=1' : '';
+        fetch(root.dataset.progressUrl + messages, {credentials: 'same-origin'})
+            .then(response => response.ok ? response.json() : Promise.reject(new Error(`status ${response.status}`)))
+            .then(flags => new LawGamePageProgress(flags).apply())
+            .catch(error => console.error('Could not load progress', error));
+    }
+
+    // Unhide the children whose data-show is in states, hide the others
+    static show(element, states) {
+        element.querySelectorAll('[data-show]').forEach(child => {
+            child.hidden = !states.includes(child.dataset.show);
+        });
+    }
+
+    apply() {
+        document.querySelectorAll('[data-username]').forEach(element => {
+            element.textContent = this.flags.username;
+            element.closest('[hidden]')?.removeAttribute('hidden');
+        });
+        this.applyLevels();
+        this.applyScenarios();
+        this.showMessages(this.flags.messages || []);
+    }
+
+    applyLevels() {
+        const completed = new Set(this.flags.levels.completed);
+        const unlocked = new Set(this.flags.levels.unlocked);
+        let done = 0;
+        document.querySelectorAll('[data-level-id]').forEach(card => {
+            const id = Number(card.dataset.levelId);
+            const badge = completed.has(id) ? 'completed' : unlocked.has(id) ? 'available' : 'locked';
+            card.classList.toggle('completed', completed.has(id));
+            card.classList.toggle('locked', !unlocked.has(id));
+            LawGamePageProgress.show(card, [badge, unlocked.has(id) ? 'play' : 'disabled']);
+            done += completed.has(id) ? 1 : 0;
+        });
+        this.updateBar('levels', done);
+    }
+
+    applyScenarios() {
+        const completed = new Set(this.flags.scenarios.completed);
+        let done = 0;
+        document.querySelectorAll('[data-scenario-id]').forEach(card => {
+            const finished = completed.has(Number(card.dataset.scenarioId));
+            card.classList.toggle('completed', finished);
+            card.classList.toggle('locked', !finished);
+            LawGamePageProgress.show(card, finished ? ['completed', 'review'] : ['available', 'start']);
+            done += finished ? 1 : 0;
+        });
+        this.updateBar('scenarios', done);
+    }
+
+    updateBar(kind, done) {
+        const bar = document.querySelector(`[data-progress-of="${kind}"]`);
+        if (!bar) {
+            return;
+        }
+        const total = Number(bar.dataset.progressTotal);
+        const percentage = total ? Math.round(done / total * 100) : 0;
+        bar.querySelector('.progress-fill').style.width = `${percentage}%`;
+        bar.querySelector('[data-progress-count]').textContent = done;
+        bar.querySelector('.progress-percentage').textContent = `${percentage}%`;
+    }
+
+    showMessages(messages) {
+        const container = document.querySelector('[data-flash-messages]');
+        if (!container || !messages.length) {
+            return;
+        }
+        messages.forEach(message => {
+            const element = document.createElement('div');
+            element.className = 'flash-message';
+            element.textContent = message;
+            container.appendChild(element);
+        });
+        container.hidden = false;
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => LawGamePageProgress.load());
@@ -0,0 +1,94 @@
+// Prefetched questions for You vs Bot rounds (bundles come from prefetch.py)
+
+class LawGamePrefetch {
+    constructor(bundle) {
+        this.bundle = bundle;
+    }
+
+    static load() {
+        const element = document.getElementById('prefetch-bundle');
+        const bundle = element ? JSON.parse(element.textContent) : null;
+        return bundle && bundle.questions.length ? new LawGamePrefetch(bundle) : null;
+    }
+
+    find(questionId) {
+        return this.bundle.questions.find(question => question[0] === questionId);
+    }
+
+    // Answers are graded through the API; when the server says one was right,
+    // the next question comes from the bundle instead of a new page. Wrong
+    // answers and the end of the round load the round page, which shows the
+    // feedback or the results for the state the server saved.
+    setupBotRound(form) {
+        form.addEventListener('submit', (e) => {
+            const choice = form.querySelector('input[name="answer"]:checked');
+            const questionId = Number(form.elements.question_id.value);
+            if (!choice || !this.find(questionId)) {
+                return;
+            }
+            e.preventDefault();
+            this.record(form.dataset.answerUrl, {question_id: questionId, answer: choice.value})
+                .then(result => {
+                    const next = result.correct && result.state === 'asking' && this.find(result.question_id);
+                    if (!next) {
+                        return Promise.reject(result.state);
+                    }
+                    form.dataset.questionNumber = result.index + 1;
+                    this.showQuestion(form, next);
+                })
+                .catch(() => window.location.assign(form.dataset.roundUrl));
+        });
+    }
+
+    record(url, answer) {
+        return fetch(url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(answer)
+        })
+            .then(response => response.ok ? response.json() : Promise.reject(response.status))
+            .then(result => {
+                this.showScore(result.score);
+                if (result.prefetch) {
+                    this.bundle = result.prefetch;
+                }
+                return result;
+            });
+    }
+
+    showQuestion(form, question) {
+        const card = form.closest('.question-card');
+        card.style.opacity = '';
+        card.querySelector('h3').textContent = `Question ${form.dataset.questionNumber} of ${form.dataset.total}`;
+        card.querySelector('.question-text').textContent = question[1];
+        form.elements.question_id.value = question[0];
+        form.querySelectorAll('.option-label').forEach((label, i) => {
+            const radio = label.querySelector('input');
+            radio.checked = false;
+            label.querySelector('span').textContent = `${radio.value}) ${question[2][i]}`;
+            label.style.background = '';
+            label.style.borderColor = '';
+        });
+        const button = form.querySelector('button[type="submit"]');
+        button.classList.remove('btn-loading');
+        button.disabled = false;
+    }
+
+    showScore(score) {
+        const user = document.querySelector('.user-score .score-number');
+        const bot = document.querySelector('.bot-score .score-number');
+        if (score && user && bot) {
+            user.textContent = score[0];
+            bot.textContent = score[1];
+        }
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const prefetch = LawGamePrefetch.load();
+    const form = document.getElementById('answerForm');
+    if (prefetch && form && form.dataset.answerUrl) {
+        prefetch.setupBotRound(form);
+    }
+});
@@ -0,0 +1,81 @@
+"""Fingerprinted, precompressed static files (built by build_static.py)
+
+static/build/static.json maps each source CSS/JS file to its minified,
+content-hashed copy, e.g. ``style.css -> build/style.1a2b3c4d5e.css``,
+written next to ``.gz`` and ``.br`` versions. Once registered:
+
+- ``url_for('static', filename='style.css')`` returns the hashed name, so
+  templates need no changes
+- files under static/build/ are served picking the precompressed copy
+  that matches Accept-Encoding; content-hashed ones (``name.<10 hex>.ext``)
+  with ``Cache-Control: immutable``, since their names change whenever
+  their content does, and the manifests (images.json, maps.json, ...)
+  with ``no-cache``, so they are revalidated
+
+Without a manifest everything is served from the sources as before.
+"""
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory
+
+from images import BUILD_DIR
+
+MANIFEST = f'{BUILD_DIR}/static.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+# The build scripts name their output name.<first 10 hex digits of the SHA-256>.ext
+HASHED_NAME = re.compile(r'\.[0-9a-f]{10}\.[^/.]+$')
+
+# Content-Encoding -> file suffix, best first
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def accepted_encodings():
+    """Content codings the client accepts (q=0 excluded)"""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if name and params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def init_app(app):
+    """Resolve static URLs to hashed names and serve build files precompressed"""
+    manifest = load_manifest(app.static_folder)
+    default_static = app.view_functions['static']
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def static(filename):
+        if not filename.startswith(BUILD_DIR + '/'):
+            return default_static(filename=filename)
+        accepted = accepted_encodings()
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+                response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(app.static_folder, filename, mimetype=mimetype)
+        response.headers['Cache-Control'] = IMMUTABLE if HASHED_NAME.search(filename) else REVALIDATE
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.view_functions['static'] = static
+    return manifest
@@ -0,0 +1,988 @@
+"""Storage layer: one repository interface with SQLite and PostgreSQL drivers"""
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from records import (User, Level, Question, BotQuestion, ScenarioChain, ScenarioStep, ScenarioOutcome,
+                     ScenarioBranch, Role, RoleLevel, RoleQuestion, LevelProgress, RoleLevelProgress, BotAnswer,
+                     BotStats, BotQuestionStats, Rating, BotAnswerLog, ReviewCard, LeaderboardEntry, RpgNpc,
+                     RpgDialogue, RpgChoice, RpgProgress)
+
+DB_FILE = 'law_game.db'
+
+# Column added by a migration when the table does not have it yet
+AddColumn = namedtuple('AddColumn', 'table column definition')
+
+# Data migration run as ``Storage.<method>(cursor)`` in the migration transaction
+Backfill = namedtuple('Backfill', 'method')
+
+# Tracks whose progress can be reset by bumping the user's generation
+BOT_TRACK = 'bot'
+
+# Portable, idempotent schema additions applied by every driver on startup
+SCHEMA_MIGRATIONS = [
+    # Progress generations: a reset bumps the counter instead of deleting rows,
+    # queries only see rows of the current generation and purge_superseded()
+    # removes the rest in the background
+    '''CREATE TABLE IF NOT EXISTS user_generations (
+        user_id INTEGER NOT NULL,
+        track TEXT NOT NULL,
+        generation INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, track)
+    )''',
+    AddColumn('user_bot_progress', 'generation', 'INTEGER NOT NULL DEFAULT 0'),
+    # The option a player picked, replayed by the ghost opponent
+    AddColumn('user_bot_progress', 'answer', 'TEXT'),
+    '''CREATE INDEX IF NOT EXISTS idx_user_bot_progress_generation
+        ON user_bot_progress (user_id, generation)''',
+    # Optional answer-dependent scenario transitions; a step without a row for
+    # the chosen answer continues to step_number + 1, a NULL next_step ends the chain
+    '''CREATE TABLE IF NOT EXISTS scenario_branches (
+        scenario_id INTEGER NOT NULL,
+        step_number INTEGER NOT NULL,
+        answer TEXT NOT NULL,
+        next_step INTEGER,
+        PRIMARY KEY (scenario_id, step_number, answer)
+    )''',
+    # Running per-user bot totals, maintained by record_bot_answer
+    '''CREATE TABLE IF NOT EXISTS user_bot_stats (
+        user_id INTEGER PRIMARY KEY,
+        answered INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        points INTEGER NOT NULL DEFAULT 0,
+        last_answered_at TIMESTAMP
+    )''',
+    '''INSERT INTO user_bot_stats (user_id, answered, correct, points, last_answered_at)
+        SELECT ubp.user_id, COUNT(*), SUM(ubp.is_correct), 3 * SUM(ubp.is_correct), MAX(ubp.answered_at)
+        FROM user_bot_progress ubp
+        LEFT JOIN user_generations g ON g.user_id = ubp.user_id AND g.track = 'bot'
+        WHERE ubp.generation = COALESCE(g.generation, 0)
+        GROUP BY ubp.user_id
+        ON CONFLICT (user_id) DO NOTHING''',
+    # Elo ratings for adaptive question selection (see difficulty.py)
+    '''CREATE TABLE IF NOT EXISTS user_bot_ratings (
+        user_id INTEGER PRIMARY KEY,
+        rating REAL NOT NULL,
+        answers INTEGER NOT NULL DEFAULT 0
+    )''',
+    '''CREATE TABLE IF NOT EXISTS bot_question_ratings (
+        question_id INTEGER PRIMARY KEY,
+        rating REAL NOT NULL,
+        answers INTEGER NOT NULL DEFAULT 0
+    )''',
+    # Spaced-repetition cards for missed questions (see review.py); due_at is
+    # epoch seconds so due checks are portable range scans on the index
+    '''CREATE TABLE IF NOT EXISTS review_cards (
+        user_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        question_id INTEGER NOT NULL,
+        easiness REAL NOT NULL DEFAULT 2.5,
+        interval_days REAL NOT NULL DEFAULT 0,
+        repetitions INTEGER NOT NULL DEFAULT 0,
+        due_at REAL NOT NULL,
+        PRIMARY KEY (user_id, kind, question_id)
+    )''',
+    '''CREATE INDEX IF NOT EXISTS idx_review_cards_due ON review_cards (user_id, due_at)''',
+    # Leaderboard scores, changed by deltas as results are saved (see leaderboard.py)
+    '''CREATE TABLE IF NOT EXISTS leaderboard_scores (
+        board TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        score INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (board, user_id)
+    )''',
+    '''CREATE INDEX IF NOT EXISTS idx_leaderboard_scores_rank ON leaderboard_scores (board, score)''',
+    '''INSERT INTO leaderboard_scores (board, user_id, score)
+        SELECT 'global', user_id, SUM(points) FROM (
+            SELECT user_id, points FROM user_bot_stats
+            UNION ALL SELECT user_id, score FROM user_progress
+            UNION ALL SELECT user_id, score FROM user_role_progress
+        ) totals
+        WHERE points > 0
+        GROUP BY user_id
+        ON CONFLICT (board, user_id) DO NOTHING''',
+    '''INSERT INTO leaderboard_scores (board, user_id, score)
+        SELECT 'role:' || role_id, user_id, SUM(score) FROM user_role_progress
+        WHERE score > 0
+        GROUP BY role_id, user_id
+        ON CONFLICT (board, user_id) DO NOTHING''',
+    # RPG world content (see world.py): NPC placements per map, their dialogues
+    # in order, and each dialogue's choices; a dialogue may link a scenario
+    # chain to play or a role question to answer
+    '''CREATE TABLE IF NOT EXISTS rpg_npcs (
+        id TEXT PRIMARY KEY,
+        map_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        sprite TEXT NOT NULL,
+        x INTEGER NOT NULL,
+        y INTEGER NOT NULL
+    )''',
+    '''CREATE INDEX IF NOT EXISTS idx_rpg_npcs_map ON rpg_npcs (map_id)''',
+    '''CREATE TABLE IF NOT EXISTS rpg_dialogues (
+        npc_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        concept TEXT NOT NULL,
+        intro TEXT NOT NULL,
+        scenario_id INTEGER,
+        role_question_id INTEGER,
+        PRIMARY KEY (npc_id, position)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS rpg_choices (
+        npc_id TEXT NOT NULL,
+        dialogue_position INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        concept TEXT NOT NULL,
+        feedback TEXT NOT NULL,
+        PRIMARY KEY (npc_id, dialogue_position, position)
+    )''',
+    # Stable bit of each dialogue's concept in rpg_progress.learned
+    AddColumn('rpg_dialogues', 'concept_bit', 'INTEGER'),
+    Backfill('number_concept_bits'),
+    # One compact RPG save per user: position, visited NPC ids (comma-separated)
+    # and learned concepts as a hex bitset over concept_bit
+    '''CREATE TABLE IF NOT EXISTS rpg_progress (
+        user_id INTEGER PRIMARY KEY,
+        map_id TEXT NOT NULL,
+        x INTEGER NOT NULL,
+        y INTEGER NOT NULL,
+        visited TEXT NOT NULL DEFAULT '',
+        learned TEXT NOT NULL DEFAULT '0',
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+]
+
+# Points awarded per correct bot answer in the running totals
+BOT_POINTS_PER_CORRECT = 3
+
+
+class Storage:
+    """Repository for users, content and progress.
+
+    All queries are written once with ``?`` placeholders and portable SQL
+    (``ON CONFLICT ... DO UPDATE``, ``CURRENT_TIMESTAMP``, ``RETURNING``).
+    Drivers only provide connections and their placeholder style.
+    Queries that pass ``record`` get tuple-backed rows from ``records``
+    instead of dicts.
+    """
+
+    name = 'base'
+    placeholder = '?'
+
+    @contextmanager
+    def connection(self):
+        """Yield a connection; commit on success, roll back on error"""
+        raise NotImplementedError
+
+    def ensure_database(self):
+        """Create the schema (and sample content) if needed, then migrate"""
+        self._create_schema()
+        self.migrate()
+
+    def _create_schema(self):
+        raise NotImplementedError
+
+    def migrate(self):
+        """Apply SCHEMA_MIGRATIONS; every statement is idempotent"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for statement in SCHEMA_MIGRATIONS:
+                if isinstance(statement, Backfill):
+                    getattr(self, statement.method)(cursor)
+                    continue
+                if isinstance(statement, AddColumn):
+                    if self._has_column(cursor, statement.table, statement.column):
+                        continue
+                    statement = (f"ALTER TABLE {statement.table} "
+                                 f"ADD COLUMN {statement.column} {statement.definition}")
+                cursor.execute(statement)
+
+    def number_concept_bits(self, cursor):
+        """Give dialogues without a concept bit the next free ones, in (npc_id, position) order
+
+        Bits already given never change, since saved rpg_progress bitsets
+        depend on them; new ones always come after the highest in use.
+        """
+        cursor.execute("SELECT npc_id, position FROM rpg_dialogues WHERE concept_bit IS NULL "
+                       "ORDER BY npc_id, position")
+        missing = cursor.fetchall()
+        if not missing:
+            return
+        cursor.execute("SELECT COALESCE(MAX(concept_bit), -1) FROM rpg_dialogues")
+        highest = cursor.fetchone()[0]
+        cursor.executemany(self._sql("UPDATE rpg_dialogues SET concept_bit = ? WHERE npc_id = ? AND position = ?"),
+                           [(highest + 1 + i, npc_id, position) for i, (npc_id, position) in enumerate(missing)])
+
+    def _has_column(self, cursor, table, column):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _generation(track):
+        """SQL for the user's current generation on ``track`` (binds one user_id)"""
+        return (f"COALESCE((SELECT generation FROM user_generations "
+                f"WHERE user_id = ? AND track = '{track}'), 0)")
+
+    def _sql(self, sql):
+        if self.placeholder == '?':
+            return sql
+        return sql.replace('?', self.placeholder)
+
+    def _cursor(self, conn, record=None):
+        return conn.cursor()
+
+    def _rows(self, cursor, record=None):
+        if record is not None:
+            return list(map(record._make, cursor.fetchall()))
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def _all(self, sql, params=(), record=None):
+        with self.connection() as conn:
+            cursor = self._cursor(conn, record)
+            cursor.execute(self._sql(sql), params)
+            return self._rows(cursor, record)
+
+    def _one(self, sql, params=(), record=None):
+        rows = self._all(sql, params, record)
+        return rows[0] if rows else None
+
+    def _scalar(self, sql, params=()):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql(sql), params)
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def _execute(self, sql, params=()):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql(sql), params)
+
+    def _execute_many(self, sql, rows):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(self._sql(sql), rows)
+
+    # Users
+
+    def get_user_by_username(self, username):
+        return self._one(f"SELECT {User.columns()} FROM users WHERE username = ?", (username,), User)
+
+    def create_user(self, username, password):
+        return self._scalar("INSERT INTO users (username, password) VALUES (?, ?) RETURNING id",
+                            (username, password))
+
+    def count_users(self):
+        return self._scalar("SELECT COUNT(*) FROM users")
+
+    # Level content
+
+    def list_levels(self):
+        return self._all(f"SELECT {Level.columns()} FROM levels ORDER BY level_number", (), Level)
+
+    def get_level(self, level_id):
+        return self._one(f"SELECT {Level.columns()} FROM levels WHERE id = ?", (level_id,), Level)
+
+    def list_questions(self, level_id):
+        return self._all(f"SELECT {Question.columns()} FROM questions WHERE level_id = ?", (level_id,), Question)
+
+    def get_question(self, question_id):
+        return self._one(f"SELECT {Question.columns()} FROM questions WHERE id = ?", (question_id,), Question)
+
+    # Bot content
+
+    def count_bot_questions(self):
+        return self._scalar("SELECT COUNT(*) FROM bot_questions")
+
+    def list_bot_questions(self):
+        return self._all(f"SELECT {BotQuestion.columns()} FROM bot_questions ORDER BY id", (), BotQuestion)
+
+    def get_bot_question(self, question_id):
+        return self._one(f"SELECT {BotQuestion.columns()} FROM bot_questions WHERE id = ?", (question_id,),
+                         BotQuestion)
+
+    def list_unanswered_bot_questions(self, user_id, limit, shuffle=False):
+        order = "RANDOM()" if shuffle else "bq.id"
+        return self._all(f"""
+            SELECT {BotQuestion.columns('bq')} FROM bot_questions bq
+            LEFT JOIN user_bot_progress ubp ON bq.id = ubp.question_id AND ubp.user_id = ?
+                AND ubp.generation = {self._generation(BOT_TRACK)}
+            WHERE ubp.question_id IS NULL
+            ORDER BY {order}
+            LIMIT ?
+        """, (user_id, user_id, limit), BotQuestion)
+
+    # Scenario content
+
+    def list_scenarios(self):
+        return self._all(f"SELECT {ScenarioChain.columns()} FROM scenario_chains", (), ScenarioChain)
+
+    def get_scenario(self, scenario_id):
+        return self._one(f"SELECT {ScenarioChain.columns()} FROM scenario_chains WHERE id = ?", (scenario_id,),
+                         ScenarioChain)
+
+    def get_scenario_step(self, scenario_id, step_number):
+        return self._one(f"SELECT {ScenarioStep.columns()} FROM scenario_steps "
+                         "WHERE scenario_id = ? AND step_number = ?", (scenario_id, step_number), ScenarioStep)
+
+    def get_scenario_outcome(self, scenario_id):
+        return self._one(f"SELECT {ScenarioOutcome.columns()} FROM scenario_outcomes WHERE scenario_id = ?",
+                         (scenario_id,), ScenarioOutcome)
+
+    def list_all_scenario_steps(self):
+        return self._all(f"SELECT {ScenarioStep.columns()} FROM scenario_steps ORDER BY scenario_id, step_number",
+                         (), ScenarioStep)
+
+    def list_scenario_outcomes(self):
+        return self._all(f"SELECT {ScenarioOutcome.columns()} FROM scenario_outcomes ORDER BY id", (),
+                         ScenarioOutcome)
+
+    def list_scenario_branches(self):
+        return self._all(f"SELECT {ScenarioBranch.columns()} FROM scenario_branches", (), ScenarioBranch)
+
+    # Role content
+
+    def list_roles(self):
+        return self._all(f"SELECT {Role.columns()} FROM roles", (), Role)
+
+    def get_role(self, role_id):
+        return self._one(f"SELECT {Role.columns()} FROM roles WHERE id = ?", (role_id,), Role)
+
+    def list_role_levels(self, role_id):
+        return self._all(f"SELECT {RoleLevel.columns()} FROM role_levels WHERE role_id = ? ORDER BY level_number",
+                         (role_id,), RoleLevel)
+
+    def get_role_level(self, role_level_id):
+        return self._one(f"SELECT {RoleLevel.columns()} FROM role_levels WHERE id = ?", (role_level_id,), RoleLevel)
+
+    def list_role_questions(self, role_level_id):
+        return self._all(f"SELECT {RoleQuestion.columns()} FROM role_questions WHERE role_level_id = ?",
+                         (role_level_id,), RoleQuestion)
+
+    def get_role_question(self, question_id):
+        return self._one(f"SELECT {RoleQuestion.columns()} FROM role_questions WHERE id = ?", (question_id,),
+                         RoleQuestion)
+
+    # RPG world content
+
+    def count_rpg_npcs(self):
+        return self._scalar("SELECT COUNT(*) FROM rpg_npcs")
+
+    def list_rpg_npcs(self):
+        return self._all(f"SELECT {RpgNpc.columns()} FROM rpg_npcs ORDER BY id", (), RpgNpc)
+
+    def list_rpg_dialogues(self):
+        return self._all(f"SELECT {RpgDialogue.columns()} FROM rpg_dialogues ORDER BY npc_id, position", (),
+                         RpgDialogue)
+
+    def list_rpg_choices(self):
+        return self._all(f"SELECT {RpgChoice.columns()} FROM rpg_choices "
+                         "ORDER BY npc_id, dialogue_position, position", (), RpgChoice)
+
+    def add_rpg_content(self, npcs, dialogues, choices):
+        """Insert NPCs, dialogues and choices in one transaction; existing rows are kept"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for rows, record, table in ((npcs, RpgNpc, 'rpg_npcs'), (dialogues, RpgDialogue, 'rpg_dialogues'),
+                                        (choices, RpgChoice, 'rpg_choices')):
+                marks = ', '.join('?' * len(record._fields))
+                cursor.executemany(self._sql(f"INSERT INTO {table} ({record.columns()}) VALUES ({marks}) "
+                                             "ON CONFLICT DO NOTHING"), rows)
+
+    def get_rpg_progress(self, user_id):
+        return self._one(f"SELECT {RpgProgress.columns()} FROM rpg_progress WHERE user_id = ?", (user_id,),
+                         RpgProgress)
+
+    def merge_rpg_progress(self, user_id, map_id, x, y, visited, learned):
+        """Apply one RPG save delta: the new position, plus NPC ids and concept bits to add"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql("SELECT visited, learned FROM rpg_progress WHERE user_id = ?"), (user_id,))
+            row = cursor.fetchone()
+            if row:
+                visited = set(visited) | set(filter(None, row[0].split(',')))
+                learned |= int(row[1], 16)
+            cursor.execute(self._sql("""
+                INSERT INTO rpg_progress (user_id, map_id, x, y, visited, learned, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    map_id = excluded.map_id, x = excluded.x, y = excluded.y, visited = excluded.visited,
+                    learned = excluded.learned, updated_at = excluded.updated_at
+            """), (user_id, map_id, x, y, ','.join(sorted(visited)), format(learned, 'x')))
+
+    # Progress
+
+    def list_level_progress(self, user_id):
+        return self._all(f"SELECT {LevelProgress.columns()} FROM user_progress WHERE user_id = ?", (user_id,),
+                         LevelProgress)
+
+    def completed_level_ids(self, user_id):
+        return {p.level_id for p in self.list_level_progress(user_id) if p.completed}
+
+    def save_level_progress(self, user_id, level_id, score, completed):
+        """Upsert a level result, keeping the best score and sticky completion; returns the previous best.
+
+        The row is claimed with a no-op upsert first, so the previous best
+        is read under the same row lock as the write and two submissions of
+        one level never both count the same gain.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql("""
+                INSERT INTO user_progress (user_id, level_id, score, completed, updated_at)
+                VALUES (?, ?, 0, 0, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id, level_id) DO UPDATE SET score = user_progress.score
+                RETURNING score
+            """), (user_id, level_id))
+            best = cursor.fetchone()[0]
+            cursor.execute(self._sql("""
+                UPDATE user_progress SET
+                    score = CASE WHEN ? > score THEN ? ELSE score END,
+                    completed = CASE WHEN ? > completed THEN ? ELSE completed END,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND level_id = ?
+            """), (score, score, int(completed), int(completed), user_id, level_id))
+        return best
+
+    def get_bot_stats(self, user_id):
+        """Running bot totals for a user (a single primary-key lookup)"""
+        stats = self._one(f"SELECT {BotStats.columns()} FROM user_bot_stats WHERE user_id = ?", (user_id,),
+                          BotStats)
+        return stats or BotStats(0, 0, 0, None)
+
+    def bot_answer_history(self, user_id):
+        return self._all(f"""
+            SELECT ubp.question_id, ubp.is_correct, ubp.answer, bq.question_text, bq.correct_answer,
+                bq.explanation
+            FROM user_bot_progress ubp
+            JOIN bot_questions bq ON ubp.question_id = bq.id
+            WHERE ubp.user_id = ? AND ubp.generation = {self._generation(BOT_TRACK)}
+            ORDER BY ubp.answered_at ASC
+        """, (user_id, user_id), BotAnswer)
+
+    def bot_question_stats(self):
+        """How many recorded answers each bot question has, and how many were correct"""
+        return self._all("""
+            SELECT question_id, COUNT(*), COALESCE(SUM(is_correct), 0)
+            FROM user_bot_progress GROUP BY question_id
+        """, (), BotQuestionStats)
+
+    def top_bot_player(self):
+        """Id of the user with the most bot points, or None"""
+        return self._scalar("SELECT user_id FROM user_bot_stats WHERE points > 0 "
+                            "ORDER BY points DESC, last_answered_at ASC LIMIT 1")
+
+    def record_bot_answer(self, user_id, question_id, is_correct, answer=None):
+        """Upsert an answer and apply its delta to user_bot_stats in one transaction"""
+        return self.record_bot_answers(user_id, [(question_id, is_correct, answer, None)])
+
+    def record_bot_answers(self, user_id, answers):
+        """Upsert a batch of (question_id, is_correct, answer, answered_at) in one transaction.
+
+        ``answered_at`` is a 'YYYY-MM-DD HH:MM:SS' UTC string or None for now.
+        The summed deltas go to user_bot_stats with a single upsert; returns
+        the change in points.
+        """
+        answered_delta = correct_delta = 0
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql(f"SELECT {self._generation(BOT_TRACK)}"), (user_id,))
+            generation = cursor.fetchone()[0]
+            for question_id, is_correct, answer, answered_at in answers:
+                correct = 1 if is_correct else 0
+                cursor.execute(self._sql("SELECT is_correct FROM user_bot_progress "
+                                         "WHERE user_id = ? AND question_id = ? AND generation = ?"),
+                               (user_id, question_id, generation))
+                previous = cursor.fetchone()
+                # A row left over from an older generation is overwritten in place
+                cursor.execute(self._sql("""
+                    INSERT INTO user_bot_progress (user_id, question_id, answered_at, is_correct, generation, answer)
+                    VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?)
+                    ON CONFLICT (user_id, question_id) DO UPDATE SET
+                        answered_at = excluded.answered_at,
+                        is_correct = excluded.is_correct,
+                        generation = excluded.generation,
+                        answer = excluded.answer
+                """), (user_id, question_id, answered_at, correct, generation, answer))
+                answered_delta += 0 if previous else 1
+                correct_delta += correct - (previous[0] if previous else 0)
+            cursor.execute(self._sql("""
+                INSERT INTO user_bot_stats (user_id, answered, correct, points, last_answered_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    answered = user_bot_stats.answered + excluded.answered,
+                    correct = user_bot_stats.correct + excluded.correct,
+                    points = user_bot_stats.points + excluded.points,
+                    last_answered_at = excluded.last_answered_at
+            """), (user_id, answered_delta, correct_delta, correct_delta * BOT_POINTS_PER_CORRECT))
+        return correct_delta * BOT_POINTS_PER_CORRECT
+
+    def answered_bot_question_ids(self, user_id):
+        rows = self._all(f"SELECT question_id FROM user_bot_progress "
+                         f"WHERE user_id = ? AND generation = {self._generation(BOT_TRACK)}", (user_id, user_id))
+        return {row['question_id'] for row in rows}
+
+    # Adaptive difficulty ratings
+
+    def get_bot_rating(self, user_id):
+        return self._one("SELECT user_id, rating, answers FROM user_bot_ratings WHERE user_id = ?", (user_id,),
+                         Rating)
+
+    def list_bot_question_ratings(self):
+        return self._all("SELECT question_id, rating, answers FROM bot_question_ratings", (), Rating)
+
+    def save_bot_ratings(self, user_rating, question_ratings):
+        """Store a user's updated rating and the ratings of the questions they answered together"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for table, key, rating in ([('user_bot_ratings', 'user_id', user_rating)] +
+                                       [('bot_question_ratings', 'question_id', r) for r in question_ratings]):
+                cursor.execute(self._sql(f"""
+                    INSERT INTO {table} ({key}, rating, answers) VALUES (?, ?, ?)
+                    ON CONFLICT ({key}) DO UPDATE SET rating = excluded.rating, answers = excluded.answers
+                """), tuple(rating))
+
+    def replace_bot_ratings(self, user_ratings, question_ratings):
+        """Bulk-write recalibrated ratings (lists of Rating rows)"""
+        for table, key, ratings in (('user_bot_ratings', 'user_id', user_ratings),
+                                    ('bot_question_ratings', 'question_id', question_ratings)):
+            self._execute_many(f"""
+                INSERT INTO {table} ({key}, rating, answers) VALUES (?, ?, ?)
+                ON CONFLICT ({key}) DO UPDATE SET rating = excluded.rating, answers = excluded.answers
+            """, [tuple(rating) for rating in ratings])
+
+    def bot_answer_log(self):
+        """Every recorded bot answer in the order it was given, for offline recalibration"""
+        return self._all("SELECT user_id, question_id, is_correct FROM user_bot_progress "
+                         "ORDER BY answered_at, id", (), BotAnswerLog)
+
+    # Spaced-repetition reviews
+
+    def get_review_card(self, user_id, kind, question_id):
+        return self._one(f"SELECT {ReviewCard.columns()} FROM review_cards "
+                         "WHERE user_id = ? AND kind = ? AND question_id = ?", (user_id, kind, question_id),
+                         ReviewCard)
+
+    def due_review_cards(self, user_id, now, limit):
+        """Cards due at ``now`` (epoch seconds), oldest first, via the (user_id, due_at) index"""
+        return self._all(f"SELECT {ReviewCard.columns()} FROM review_cards "
+                         "WHERE user_id = ? AND due_at <= ? ORDER BY due_at LIMIT ?", (user_id, now, limit),
+                         ReviewCard)
+
+    def count_due_reviews(self, user_id, now):
+        return self._scalar("SELECT COUNT(*) FROM review_cards WHERE user_id = ? AND due_at <= ?", (user_id, now))
+
+    def save_review_card(self, user_id, card):
+        self._execute(f"""
+            INSERT INTO review_cards (user_id, {ReviewCard.columns()}) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, kind, question_id) DO UPDATE SET
+                easiness = excluded.easiness,
+                interval_days = excluded.interval_days,
+                repetitions = excluded.repetitions,
+                due_at = excluded.due_at
+        """, (user_id,) + tuple(card))
+
+    def record_missed_questions(self, user_id, kind, question_ids, due_at, easiness_penalty, min_easiness):
+        """Add or lapse cards for missed questions in one batch (SM-2 with quality 1)"""
+        self._execute_many("""
+            INSERT INTO review_cards (user_id, kind, question_id, interval_days, repetitions, due_at)
+            VALUES (?, ?, ?, 1, 0, ?)
+            ON CONFLICT (user_id, kind, question_id) DO UPDATE SET
+                easiness = CASE WHEN review_cards.easiness - ? < ? THEN ?
+                                ELSE review_cards.easiness - ? END,
+                interval_days = 1,
+                repetitions = 0,
+                due_at = excluded.due_at
+        """, [(user_id, kind, question_id, due_at, easiness_penalty, min_easiness, min_easiness, easiness_penalty)
+              for question_id in question_ids])
+
+    # Leaderboards
+
+    def list_leaderboard(self, board):
+        return self._all("SELECT user_id, score FROM leaderboard_scores WHERE board = ?", (board,),
+                         LeaderboardEntry)
+
+    def add_leaderboard_points(self, user_id, deltas):
+        """Add ``{board: points}`` to a player's scores in one transaction; returns the new scores"""
+        with self.connection() as conn:
+            return self._add_leaderboard_points(conn.cursor(), user_id, deltas)
+
+    def _add_leaderboard_points(self, cursor, user_id, deltas):
+        scores = {}
+        for board, points in deltas.items():
+            cursor.execute(self._sql("""
+                INSERT INTO leaderboard_scores (board, user_id, score) VALUES (?, ?, ?)
+                ON CONFLICT (board, user_id) DO UPDATE SET score = leaderboard_scores.score + excluded.score
+                RETURNING score
+            """), (board, user_id, points))
+            scores[board] = cursor.fetchone()[0]
+        return scores
+
+    def list_usernames(self, user_ids):
+        """{id: username} for the given users"""
+        if not user_ids:
+            return {}
+        rows = self._all(f"SELECT id, username FROM users WHERE id IN ({', '.join('?' * len(user_ids))})",
+                         tuple(user_ids))
+        return {row['id']: row['username'] for row in rows}
+
+    def reset_bot_progress(self, user_id, boards=()):
+        """Hide all of a user's bot answers by starting a new generation (O(1)).
+
+        The bot points are taken off each of ``boards`` in the same
+        transaction; returns their new scores. The stats row is claimed
+        first (a no-op update), so an answer saved at the same time either
+        lands before the reset and is taken off, or after it.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql("UPDATE user_bot_stats SET points = points WHERE user_id = ? RETURNING points"),
+                           (user_id,))
+            row = cursor.fetchone()
+            points = row[0] if row else 0
+            cursor.execute(self._sql("""
+                INSERT INTO user_generations (user_id, track, generation) VALUES (?, ?, 1)
+                ON CONFLICT (user_id, track) DO UPDATE SET generation = user_generations.generation + 1
+            """), (user_id, BOT_TRACK))
+            cursor.execute(self._sql("UPDATE user_bot_stats SET answered = 0, correct = 0, points = 0 "
+                                     "WHERE user_id = ?"), (user_id,))
+            if not points:
+                return {}
+            return self._add_leaderboard_points(cursor, user_id, {board: -points for board in boards})
+
+    def purge_superseded(self, batch_size=500):
+        """Delete up to ``batch_size`` bot answers from old generations; returns the count"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql("""
+                DELETE FROM user_bot_progress WHERE id IN (
+                    SELECT ubp.id FROM user_bot_progress ubp
+                    JOIN user_generations g ON g.user_id = ubp.user_id AND g.track = ?
+                    WHERE ubp.generation < g.generation
+                    LIMIT ?
+                )
+            """), (BOT_TRACK, batch_size))
+            return cursor.rowcount
+
+    def completed_scenario_ids(self, user_id):
+        rows = self._all("SELECT scenario_id FROM user_scenario_progress WHERE user_id = ? AND completed = 1",
+                         (user_id,))
+        return {row['scenario_id'] for row in rows}
+
+    def mark_scenario_completed(self, user_id, scenario_id):
+        self._execute("""
+            INSERT INTO user_scenario_progress (user_id, scenario_id, completed, completed_at)
+            VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id, scenario_id) DO UPDATE SET
+                completed = 1,
+                completed_at = excluded.completed_at
+        """, (user_id, scenario_id))
+
+    def list_role_level_progress(self, user_id, role_id):
+        return self._all(f"SELECT {RoleLevelProgress.columns()} FROM user_role_progress "
+                         "WHERE user_id = ? AND role_id = ?", (user_id, role_id), RoleLevelProgress)
+
+    def completed_role_level_ids(self, user_id, role_id):
+        return {p.role_level_id for p in self.list_role_level_progress(user_id, role_id) if p.completed}
+
+    def save_role_level_progress(self, user_id, role_id, role_level_id, score, completed):
+        """Upsert a role level result like save_level_progress(); returns the previous best"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql("""
+                INSERT INTO user_role_progress (user_id, role_id, role_level_id, score, completed, updated_at)
+                VALUES (?, ?, ?, 0, 0, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id, role_level_id) DO UPDATE SET role_id = excluded.role_id
+                RETURNING score
+            """), (user_id, role_id, role_level_id))
+            best = cursor.fetchone()[0]
+            cursor.execute(self._sql("""
+                UPDATE user_role_progress SET
+                    score = CASE WHEN ? > score THEN ? ELSE score END,
+                    completed = CASE WHEN ? > completed THEN ? ELSE completed END,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND role_level_id = ?
+            """), (score, score, int(completed), int(completed), user_id, role_level_id))
+        return best
+
+
+_row_factories = {}
+
+
+def _row_factory(record):
+    """sqlite3 row_factory building ``record`` tuples straight from the C row"""
+    factory = _row_factories.get(record)
+    if factory is None:
+        make = record._make
+        factory = _row_factories[record] = lambda cursor, row: make(row)
+    return factory
+
+
+class SQLiteStorage(Storage):
+    """Single-file SQLite driver with one reused connection per thread"""
+
+    name = 'sqlite'
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._local = threading.local()
+
+    def _cursor(self, conn, record=None):
+        cursor = conn.cursor()
+        if record is not None:
+            cursor.row_factory = _row_factory(record)
+        return cursor
+
+    def _rows(self, cursor, record=None):
+        if record is not None:
+            return cursor.fetchall()
+        return Storage._rows(self, cursor)
+
+    def _get_conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._get_conn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _has_column(self, cursor, table, column):
+        cursor.execute(f"PRAGMA table_info({table})")
+        return any(row[1] == column for row in cursor.fetchall())
+
+    def _create_schema(self):
+        if not os.path.exists(self.path):
+            print(f"Database not found at {self.path}, initializing...")
+            from init_db import init_database
+            init_database()
+            print("Database initialized successfully")
+        else:
+            print(f"Database found at {self.path}")
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+POSTGRES_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS levels (
+        id SERIAL PRIMARY KEY,
+        level_number INTEGER UNIQUE NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS questions (
+        id SERIAL PRIMARY KEY,
+        level_id INTEGER NOT NULL,
+        question_text TEXT NOT NULL,
+        option_a TEXT NOT NULL,
+        option_b TEXT NOT NULL,
+        option_c TEXT NOT NULL,
+        option_d TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        explanation TEXT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS user_progress (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        level_id INTEGER NOT NULL,
+        score INTEGER DEFAULT 0,
+        completed INTEGER DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(user_id, level_id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS bot_questions (
+        id SERIAL PRIMARY KEY,
+        question_text TEXT NOT NULL,
+        option_a TEXT NOT NULL,
+        option_b TEXT NOT NULL,
+        option_c TEXT NOT NULL,
+        option_d TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        explanation TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS scenario_chains (
+        id SERIAL PRIMARY KEY,
+        domain TEXT NOT NULL,
+        law_involved TEXT NOT NULL,
+        title TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS scenario_steps (
+        id SERIAL PRIMARY KEY,
+        scenario_id INTEGER NOT NULL REFERENCES scenario_chains(id),
+        step_number INTEGER NOT NULL,
+        story_context TEXT NOT NULL,
+        option_a TEXT NOT NULL,
+        option_b TEXT NOT NULL,
+        option_c TEXT NOT NULL,
+        option_d TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        feedback TEXT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS scenario_outcomes (
+        id SERIAL PRIMARY KEY,
+        scenario_id INTEGER NOT NULL REFERENCES scenario_chains(id),
+        final_outcome TEXT NOT NULL,
+        learning_summary TEXT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS user_bot_progress (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        question_id INTEGER NOT NULL REFERENCES bot_questions(id),
+        answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_correct INTEGER DEFAULT 0,
+        UNIQUE(user_id, question_id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS user_scenario_progress (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        scenario_id INTEGER NOT NULL REFERENCES scenario_chains(id),
+        completed INTEGER DEFAULT 0,
+        completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(user_id, scenario_id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS roles (
+        id SERIAL PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS role_levels (
+        id SERIAL PRIMARY KEY,
+        role_id INTEGER NOT NULL REFERENCES roles(id),
+        level_number INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS role_questions (
+        id SERIAL PRIMARY KEY,
+        role_level_id INTEGER NOT NULL REFERENCES role_levels(id),
+        question_text TEXT NOT NULL,
+        option_a TEXT NOT NULL,
+        option_b TEXT NOT NULL,
+        option_c TEXT NOT NULL,
+        option_d TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        explanation TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS user_role_progress (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        role_id INTEGER NOT NULL REFERENCES roles(id),
+        role_level_id INTEGER NOT NULL REFERENCES role_levels(id),
+        score INTEGER DEFAULT 0,
+        completed INTEGER DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(user_id, role_level_id)
+    )''',
+]
+
+# Content tables copied from the bundled SQLite file when seeding PostgreSQL
+CONTENT_TABLES = ['levels', 'questions', 'bot_questions', 'scenario_chains', 'scenario_steps',
+                  'scenario_outcomes', 'roles', 'role_levels', 'role_questions']
+
+
+class PostgresStorage(Storage):
+    """PostgreSQL driver backed by a thread-safe server connection pool"""
+
+    name = 'postgres'
+    placeholder = '%s'
+
+    def __init__(self, dsn, minconn=1, maxconn=None):
+        try:
+            from psycopg2.pool import ThreadedConnectionPool
+        except ImportError:
+            raise RuntimeError("PostgreSQL storage requires psycopg2 (pip install psycopg2-binary)")
+        self.dsn = dsn
+        maxconn = maxconn or int(os.environ.get('DB_POOL_SIZE', 10))
+        self.pool = ThreadedConnectionPool(minconn, maxconn, dsn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def _has_column(self, cursor, table, column):
+        cursor.execute("SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+                       (table, column))
+        return cursor.fetchone() is not None
+
+    def _create_schema(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for statement in POSTGRES_SCHEMA:
+                cursor.execute(statement)
+            cursor.execute("SELECT COUNT(*) FROM levels")
+            has_content = cursor.fetchone()[0] > 0
+        if not has_content and os.path.exists(DB_FILE):
+            print(f"Seeding PostgreSQL content from {DB_FILE}")
+            self.copy_content_from_sqlite(DB_FILE)
+
+    def copy_content_from_sqlite(self, path):
+        """Copy content tables (ids preserved) from a SQLite database file"""
+        source = sqlite3.connect(path)
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                for table in CONTENT_TABLES:
+                    src = source.execute(f"SELECT * FROM {table}")
+                    columns = [d[0] for d in src.description]
+                    rows = src.fetchall()
+                    if not rows:
+                        continue
+                    marks = ', '.join(['%s'] * len(columns))
+                    cursor.executemany(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({marks}) ON CONFLICT DO NOTHING",
+                        rows)
+                    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                   f"(SELECT MAX(id) FROM {table}))")
+        finally:
+            source.close()
+
+    def close(self):
+        self.pool.closeall()
+
+
+def get_storage(database_url=None):
+    """Pick a driver from DATABASE_URL (postgres://...) or fall back to SQLite"""
+    database_url = database_url or os.environ.get('DATABASE_URL', '')
+    if database_url.startswith(('postgres://', 'postgresql://')):
+        return PostgresStorage(database_url)
+    if database_url.startswith('sqlite:///'):
+        return SQLiteStorage(database_url[len('sqlite:///'):])
+    return SQLiteStorage(DB_FILE)
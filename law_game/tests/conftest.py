@@ -0,0 +1,63 @@
+"""Shared fixtures; the app runs on a throwaway copy of law_game.db
+
+    cd law_game && python -m pytest -q
+"""
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# gameplay opens its storage on import, so it must see the copy before anything imports it
+DB_DIR = tempfile.mkdtemp(prefix='law_game_tests_')
+shutil.copy(os.path.join(ROOT, 'law_game.db'), DB_DIR)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DB_DIR, 'law_game.db')
+os.environ['PURGE_INTERVAL'] = '0'
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as a new player"""
+    client = app.test_client()
+    username = f'test_{uuid.uuid4().hex[:8]}'
+    response = client.post('/signup', data={'username': username, 'password': 'pw', 'confirm_password': 'pw'})
+    assert response.status_code == 302
+    return client
+
+
+class AlwaysRight:
+    """Opponent that never misses"""
+
+    def answer(self, rng, question):
+        return question.correct_answer
+
+
+@pytest.fixture
+def bot():
+    """Seeded three-question round whose answers are all A, against AlwaysRight"""
+    from bot_session import BotSession
+    from records import BotQuestion
+    questions = [BotQuestion(i, f'Question {i}', 'a', 'b', 'c', 'd', 'A', '') for i in (1, 2, 3)]
+    return BotSession.start(questions, seed=1, opponent=AlwaysRight())
+
+
+@pytest.fixture
+def user_id(client):
+    with client.session_transaction() as sess:
+        return sess['user_id']
@@ -0,0 +1,115 @@
+import pytest
+
+from bot_session import ASKING, BOT_POINTS, FINISHED, REVIEWING, BotSession
+from records import BotQuestion
+
+
+def question(question_id, correct='A'):
+    return BotQuestion(question_id, f'Question {question_id}', 'a', 'b', 'c', 'd', correct, '')
+
+
+def test_same_seed_rolls_the_same_opponent_answers():
+    questions = [question(i, 'ABCD'[i % 4]) for i in range(20)]
+    assert BotSession.start(questions, seed=7).ai_answers == BotSession.start(questions, seed=7).ai_answers
+
+
+def test_correct_answers_move_through_the_round(bot):
+    assert bot.answer(1, 'A', 'A') == (True, 3, BOT_POINTS)
+    assert (bot.state, bot.question_id) == (ASKING, 2)
+    bot.answer(2, 'A', 'A')
+    bot.answer(3, 'A', 'A')
+    assert bot.state == FINISHED
+    assert bot.question_id is None
+    assert (bot.user_score, bot.bot_score) == (9, 9)
+
+
+def test_wrong_answer_reviews_then_a_retry_scores_less(bot):
+    assert bot.answer(1, 'B', 'A') == (False, 0, BOT_POINTS)
+    assert (bot.state, bot.question_id) == (REVIEWING, 1)
+    assert bot.retry(1)
+    assert bot.answer(1, 'A', 'A') == (True, 2, 0)
+    assert bot.question_id == 2
+
+
+def test_continue_after_a_wrong_answer_skips_the_question(bot):
+    bot.answer(1, 'B', 'A')
+    bot.advance()
+    assert (bot.state, bot.question_id) == (ASKING, 2)
+
+
+def test_only_the_current_question_is_accepted(bot):
+    assert bot.accepts(1)
+    assert not bot.accepts(2)
+    with pytest.raises(ValueError):
+        bot.answer(2, 'A', 'A')
+    assert (bot.index, bot.attempts) == (0, {})
+
+
+def test_answers_after_the_round_finishes_are_rejected(bot):
+    for question_id in (1, 2, 3):
+        bot.answer(question_id, 'A', 'A')
+    with pytest.raises(ValueError):
+        bot.answer(3, 'B', 'A')
+    # It used to be left REVIEWING with index == total, and question_id raised IndexError
+    assert (bot.state, bot.index, bot.question_id) == (FINISHED, 3, None)
+    assert not bot.retry(3)
+
+
+def test_round_survives_the_session(bot):
+    bot.answer(1, 'B', 'A')
+    session = {}
+    bot.save(session)
+    loaded = BotSession.load(session)
+    assert (loaded.question_ids, loaded.ai_answers, loaded.seed) == (bot.question_ids, bot.ai_answers, bot.seed)
+    assert (loaded.state, loaded.index, loaded.attempts) == (REVIEWING, 0, {1: 1})
+    assert BotSession.load({}) is None
+
+
+def test_api_answer_after_the_round_finishes_is_a_409(client):
+    from gameplay import content
+    started = client.post('/api/v1/bot/sessions', json={'count': 1, 'seed': 3}).get_json()
+    correct = content.bot_question(started['question_id']).correct_answer
+    answer = {'question_id': started['question_id']}
+    assert client.post('/api/v1/bot/answers', json=dict(answer, answer=correct)).get_json()['state'] == FINISHED
+    wrong = next(letter for letter in 'ABCD' if letter != correct)
+    response = client.post('/api/v1/bot/answers', json=dict(answer, answer=wrong))
+    assert response.status_code == 409
+    state = client.get('/api/v1/bot/session')
+    assert state.status_code == 200
+    assert state.get_json()['state'] == FINISHED
+
+
+def test_prefetch_bundle_holds_the_next_questions_without_answers(client):
+    started = client.post('/api/v1/bot/sessions', json={'count': 2, 'seed': 6}).get_json()
+    assert started['prefetch'] == {'questions': started['questions']}
+    assert all(len(question) == 3 for question in started['prefetch']['questions'])
+
+
+def test_api_rejects_a_bad_count(client):
+    assert client.post('/api/v1/bot/sessions', json={'count': 'five'}).status_code == 400
+
+
+def test_results_show_the_answers_actually_given(client):
+    from gameplay import content
+    started = client.post('/api/v1/bot/sessions', json={'count': 1, 'seed': 2}).get_json()
+    question = content.bot_question(started['question_id'])
+    wrong = next(letter for letter in 'ABCD' if letter != question.correct_answer)
+    answered = client.post('/api/v1/bot/answers', json={'question_id': question.id, 'answer': wrong}).get_json()
+    with client.session_transaction() as sess:
+        # Results come from the recorded answers, not from what the session remembers
+        sess.pop('user_answers', None)
+    page = client.get('/bot_results').get_data(as_text=True)
+    assert f'Your Answer: {wrong}' in page
+    assert f"AI Answer: {answered['ai_answer']}" in page
+
+
+def test_bot_mode_reads_the_stats_once_per_request(client, monkeypatch):
+    from gameplay import reviews, storage
+    calls = []
+    for owner, name in [(storage, 'get_bot_stats'), (reviews, 'due_count')]:
+        read = getattr(owner, name)
+        monkeypatch.setattr(owner, name, lambda user_id, read=read, name=name: calls.append(name) or read(user_id))
+    response = client.get('/bot_mode')
+    assert response.status_code == 200
+    assert sorted(calls) == ['due_count', 'get_bot_stats']
+    assert client.get('/bot_mode', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
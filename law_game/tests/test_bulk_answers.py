@@ -0,0 +1,90 @@
+import uuid
+
+import pytest
+
+from bot_session import ASKING, BOT_POINTS, FINISHED, POINTS_BY_ATTEMPT
+from storage import BOT_POINTS_PER_CORRECT
+
+
+def test_settle_scores_like_answering(bot):
+    assert bot.settle(1, 'A', 'A') == (True, 3, BOT_POINTS)
+    assert bot.settle(2, 'B', 'A') == (False, 0, BOT_POINTS)
+    assert (bot.state, bot.question_id) == (ASKING, 3)
+
+
+def test_settle_counts_attempts_made_in_the_session(bot):
+    bot.answer(1, 'B', 'A')
+    assert bot.settle(1, 'A', 'A') == (True, 2, 0)
+    assert bot.attempts[1] == 2
+
+
+def test_skipped_and_finished_questions_cannot_be_settled(bot):
+    bot.settle(2, 'A', 'A')
+    assert not bot.is_open(1)
+    with pytest.raises(ValueError):
+        bot.settle(1, 'A', 'A')
+    bot.settle(3, 'A', 'A')
+    assert bot.state == FINISHED
+    with pytest.raises(ValueError):
+        bot.settle(3, 'A', 'A')
+    assert bot.index == 3
+
+
+def test_batch_grades_a_round_at_once(client):
+    from gameplay import content
+    started = client.post('/api/v1/bot/sessions', json={'count': 3, 'seed': 5}).get_json()
+    questions = [content.bot_question(q[0]) for q in started['questions']]
+    answers = [{'question_id': q.id, 'answer': q.correct_answer} for q in questions]
+    response = client.post('/api/v1/bot/answers/batch', json={'answers': answers})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['state'] == FINISHED
+    assert result['correct'][0] == 3
+    assert [row[0] for row in result['results']] == [q.id for q in questions]
+
+
+def test_batch_rejects_repeats_and_foreign_questions(client):
+    started = client.post('/api/v1/bot/sessions', json={'count': 2}).get_json()
+    first = started['question_id']
+    repeat = [{'question_id': first, 'answer': 'A'}, {'question_id': first, 'answer': 'B'}]
+    assert client.post('/api/v1/bot/answers/batch', json={'answers': repeat}).status_code == 400
+    foreign = [{'question_id': 10 ** 6, 'answer': 'A'}]
+    assert client.post('/api/v1/bot/answers/batch', json={'answers': foreign}).status_code == 400
+
+
+def test_batch_rejects_questions_the_round_has_moved_past(client):
+    from gameplay import content
+    started = client.post('/api/v1/bot/sessions', json={'count': 2, 'seed': 8}).get_json()
+    first, second = [content.bot_question(q[0]) for q in started['questions']]
+    answers = [{'question_id': second.id, 'answer': second.correct_answer}]
+    assert client.post('/api/v1/bot/answers/batch', json={'answers': answers}).get_json()['state'] == FINISHED
+    late = [{'question_id': first.id, 'answer': first.correct_answer}]
+    assert client.post('/api/v1/bot/answers/batch', json={'answers': late}).status_code == 409
+
+
+def test_batch_attempts_come_from_the_session(client):
+    from gameplay import content
+    started = client.post('/api/v1/bot/sessions', json={'count': 1, 'seed': 8}).get_json()
+    question = content.bot_question(started['question_id'])
+    wrong = next(letter for letter in 'ABCD' if letter != question.correct_answer)
+    client.post('/api/v1/bot/answers', json={'question_id': question.id, 'answer': wrong})
+    # A client-sent attempt count is ignored: this is the second try
+    answers = [{'question_id': question.id, 'answer': question.correct_answer, 'attempts': 1}]
+    result = client.post('/api/v1/bot/answers/batch', json={'answers': answers}).get_json()
+    assert result['results'][0][4] == POINTS_BY_ATTEMPT[2]
+
+
+def test_reset_starts_a_new_generation(app):
+    from gameplay import storage
+    user_id = storage.create_user(f'test_{uuid.uuid4().hex[:8]}', 'pw')
+    assert storage.record_bot_answers(user_id, [(1, True, 'A', None), (2, False, 'B', None)]) == BOT_POINTS_PER_CORRECT
+    assert storage.answered_bot_question_ids(user_id) == {1, 2}
+
+    storage.reset_bot_progress(user_id)
+    assert storage.answered_bot_question_ids(user_id) == set()
+    assert storage.get_bot_stats(user_id)[:3] == (0, 0, 0)
+    assert storage.bot_answer_history(user_id) == []
+
+    # An answer left over from the old generation counts as new again
+    assert storage.record_bot_answers(user_id, [(1, True, 'A', None)]) == BOT_POINTS_PER_CORRECT
+    assert storage.get_bot_stats(user_id)[:3] == (1, 1, BOT_POINTS_PER_CORRECT)
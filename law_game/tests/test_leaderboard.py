@@ -0,0 +1,89 @@
+import random
+
+from leaderboard import GLOBAL, Board, RankedList, week_board
+from records import LeaderboardEntry
+
+
+class SmallChunks(RankedList):
+    # Tiny chunks exercise splitting, emptied chunks and the Fenwick tree
+    CHUNK_SIZE = 4
+
+
+def test_ranked_list_matches_a_sorted_list():
+    rng = random.Random(3)
+    ranked, expected = SmallChunks(), []
+    for _ in range(2000):
+        if expected and rng.random() < 0.4:
+            item = expected.pop(rng.randrange(len(expected)))
+            ranked.remove(item)
+        else:
+            item = (-rng.randrange(100), rng.randrange(10 ** 6))
+            expected.append(item)
+            ranked.add(item)
+        expected.sort()
+        assert len(ranked) == len(expected)
+        key = (-rng.randrange(100),)
+        assert ranked.count_before(key) == sum(1 for other in expected if other < key)
+    assert ranked.top(10) == expected[:10]
+
+
+def test_ranked_list_built_from_items():
+    items = [(-score, user_id) for user_id, score in enumerate([5, 3, 9, 3, 1] * 5)]
+    assert SmallChunks(items).top(len(items)) == sorted(items)
+
+
+def test_ties_share_a_rank():
+    board = Board([LeaderboardEntry(1, 50), LeaderboardEntry(2, 80), LeaderboardEntry(3, 50)])
+    assert [board.rank(user_id) for user_id in (2, 1, 3)] == [1, 2, 2]
+    assert board.top(3) == [(1, 2, 80), (2, 1, 50), (2, 3, 50)]
+    board.set(3, 90)
+    assert (board.rank(3), board.rank(2), board.rank(1)) == (1, 2, 3)
+    assert board.rank(4) is None
+
+
+def test_alternating_answers_do_not_farm_weekly_points(client, user_id):
+    from gameplay import content, leaderboards
+    started = client.post('/api/v1/bot/sessions', json={'count': 1, 'seed': 9}).get_json()
+    question = content.bot_question(started['question_id'])
+    wrong = next(letter for letter in 'ABCD' if letter != question.correct_answer)
+    before = leaderboards.standing(GLOBAL, user_id)[1], leaderboards.standing(week_board(), user_id)[1]
+    for answer in [wrong, question.correct_answer, wrong, question.correct_answer, wrong]:
+        with client.session_transaction() as sess:
+            # Outside a round the same question can be answered again and again
+            sess.pop('bot_session', None)
+        client.post('/api/v1/bot/answers', json={'question_id': question.id, 'answer': answer})
+    after = leaderboards.standing(GLOBAL, user_id)[1], leaderboards.standing(week_board(), user_id)[1]
+    assert after == before
+
+
+def test_only_a_new_level_best_scores(client, user_id):
+    from gameplay import leaderboards, storage
+    questions = storage.list_questions(2)
+    right = {str(q.id): q.correct_answer for q in questions}
+    one_wrong = dict(right, **{str(questions[0].id): next(l for l in 'ABCD' if l != questions[0].correct_answer)})
+    before = leaderboards.standing(GLOBAL, user_id)[1]
+    for answers in [one_wrong, right, one_wrong, right]:
+        assert client.post('/api/v1/levels/2/answers', json={'answers': answers}).status_code == 200
+    assert leaderboards.standing(GLOBAL, user_id)[1] - before == 100
+
+
+def test_levels_grade_only_their_own_questions(client):
+    from gameplay import storage
+    own, other = storage.list_questions(1), storage.list_questions(3)
+    response = client.post('/submit_level/1', data={f'question_{other[0].id}': other[0].correct_answer})
+    assert response.status_code == 302
+    answered = client.post('/api/v1/levels/1/answers', json={'answers': {str(own[0].id): own[0].correct_answer}})
+    assert answered.get_json()['score'] == 100 // len(own)
+
+
+def test_resetting_bot_progress_does_not_farm_weekly_points(client, user_id):
+    from gameplay import content, leaderboards
+    before = leaderboards.standing(GLOBAL, user_id)[1], leaderboards.standing(week_board(), user_id)[1]
+    for _ in range(3):
+        started = client.post('/api/v1/bot/sessions', json={'count': 2, 'seed': 4}).get_json()
+        answers = [{'question_id': q[0], 'answer': content.bot_question(q[0]).correct_answer}
+                   for q in started['questions']]
+        assert client.post('/api/v1/bot/answers/batch', json={'answers': answers}).status_code == 200
+        assert client.get('/reset_bot_questions').status_code == 302
+    after = leaderboards.standing(GLOBAL, user_id)[1], leaderboards.standing(week_board(), user_id)[1]
+    assert after == before
@@ -0,0 +1,66 @@
+import pytest
+
+from records import ReviewCard
+from review import CORRECT_QUALITY, DAY, INITIAL_EASINESS, MIN_EASINESS, MISSED_QUALITY, RELEARN_DELAY, sm2
+
+NOW = 1_000_000
+
+
+def new_card():
+    return ReviewCard('bot', 1, INITIAL_EASINESS, 0, 0, NOW)
+
+
+def test_correct_reviews_wait_one_day_then_six_then_grow():
+    card = sm2(new_card(), CORRECT_QUALITY, NOW)
+    assert (card.interval_days, card.repetitions, card.due_at) == (1, 1, NOW + DAY)
+    card = sm2(card, CORRECT_QUALITY, NOW)
+    assert (card.interval_days, card.repetitions) == (6, 2)
+    third = sm2(card, CORRECT_QUALITY, NOW)
+    assert third.interval_days == pytest.approx(6 * third.easiness)
+    assert third.due_at == pytest.approx(NOW + third.interval_days * DAY)
+
+
+def test_quality_four_keeps_the_easiness_and_five_raises_it():
+    assert sm2(new_card(), 4, NOW).easiness == pytest.approx(INITIAL_EASINESS)
+    assert sm2(new_card(), 5, NOW).easiness == pytest.approx(INITIAL_EASINESS + 0.1)
+
+
+def test_a_miss_lapses_the_card_and_brings_it_back_soon():
+    card = sm2(sm2(new_card(), CORRECT_QUALITY, NOW), CORRECT_QUALITY, NOW)
+    lapsed = sm2(card, MISSED_QUALITY, NOW)
+    assert (lapsed.interval_days, lapsed.repetitions, lapsed.due_at) == (1, 0, NOW + RELEARN_DELAY)
+    assert lapsed.easiness < card.easiness
+
+
+def test_easiness_never_drops_below_the_minimum():
+    card = new_card()
+    for _ in range(20):
+        card = sm2(card, 0, NOW)
+    assert card.easiness == MIN_EASINESS
+
+
+def test_review_answers_grade_only_the_current_card_once(client):
+    from gameplay import content
+    first, second = content.bot_question_list()[:2]
+    with client.session_transaction() as sess:
+        sess['review'] = {'items': [['bot', first.id], ['bot', second.id], ['other', first.id]],
+                          'index': 0, 'correct': 0}
+
+    def submit(kind, question):
+        return client.post('/submit_review_answer', data={'kind': kind, 'question_id': question.id,
+                                                          'answer': question.correct_answer})
+
+    def review():
+        with client.session_transaction() as sess:
+            return sess['review']['index'], sess['review']['correct']
+
+    assert submit('bot', second).status_code == 302
+    assert submit('level', first).status_code == 302
+    assert review() == (0, 0)
+    assert submit('bot', first).status_code == 200
+    assert submit('bot', first).status_code == 302
+    assert review() == (1, 1)
+    assert submit('bot', second).status_code == 200
+    # A kind the app does not know is not looked up as a role question
+    assert submit('other', first).status_code == 302
+    assert review() == (2, 2)
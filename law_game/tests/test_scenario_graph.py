@@ -0,0 +1,52 @@
+from content import ScenarioGraph
+from records import ScenarioBranch
+
+
+class Step:
+    def __init__(self, step_number):
+        self.step_number = step_number
+
+
+def graph(step_count, branches=()):
+    return ScenarioGraph(None, [Step(n) for n in range(1, step_count + 1)],
+                         [ScenarioBranch(1, step, answer, next_step) for step, answer, next_step in branches])
+
+
+def test_steps_follow_in_order_without_branches():
+    chain = graph(3)
+    assert chain.step_count == 3
+    assert [chain.next_step(n, 'A') for n in (1, 2, 3)] == [2, 3, None]
+    assert chain.is_terminal(3)
+    assert not chain.is_terminal(1)
+
+
+def test_branch_overrides_the_default_edge_for_its_answer_only():
+    chain = graph(4, [(1, 'B', 3), (2, 'C', 4)])
+    assert chain.next_step(1, 'B') == 3
+    assert chain.next_step(1, 'A') == 2
+    assert chain.next_step(2, 'C') == 4
+    assert chain.next_step(2, None) == 3
+
+
+def test_branch_to_a_missing_step_ends_the_chain():
+    chain = graph(2, [(1, 'D', 9)])
+    assert chain.next_step(1, 'D') is None
+    assert chain.is_terminal(1, 'D')
+
+
+def test_unknown_steps():
+    chain = graph(2)
+    assert chain.step(5) is None
+    assert chain.next_step(5) is None
+
+
+def test_every_stored_chain_reaches_its_end(app):
+    from gameplay import content
+    for scenario in content.scenario_list():
+        chain = content.scenario(scenario.id)
+        step, seen = 1, set()
+        while step is not None:
+            assert step not in seen, f'scenario {scenario.id} loops at step {step}'
+            seen.add(step)
+            step = chain.next_step(step, 'A')
+        assert seen
@@ -0,0 +1,19 @@
+from records import RpgDialogue
+
+
+def test_dialogues_added_later_get_new_concept_bits(app):
+    from gameplay import storage
+    before = {(d.npc_id, d.position): d.concept_bit for d in storage.list_rpg_dialogues()}
+    added = [RpgDialogue(npc_id, position, 'Concept', 'Intro', None, None, None)
+             for npc_id, position in (('aaa_clerk', 0), ('aaa_clerk', 1), ('zzz_guard', 0))]
+    storage.add_rpg_content([], added, [])
+    try:
+        storage.migrate()
+        after = {(d.npc_id, d.position): d.concept_bit for d in storage.list_rpg_dialogues()}
+        # Bits already in saves keep their meaning; new ones come after the highest
+        assert {key: after[key] for key in before} == before
+        new_bits = sorted(after[d.npc_id, d.position] for d in added)
+        assert new_bits == list(range(max(before.values()) + 1, max(before.values()) + 4))
+        assert len(set(after.values())) == len(after)
+    finally:
+        storage._execute("DELETE FROM rpg_dialogues WHERE npc_id IN ('aaa_clerk', 'zzz_guard')")
@@ -0,0 +1,123 @@
+"""Chunked RPG tile maps built by build_tilemap.py
+
+A map is a grid of chunks of CHUNK_TILES x CHUNK_TILES tiles, each with
+its own tileset atlas (TILE px tiles, ``tileset_columns`` per row). Each
+chunk is stored as
+
+- the tile layer: one little-endian uint16 index into the chunk's tileset
+  per tile, row by row, EMPTY_TILE past the map edge
+- the collision layer: one bit per tile, set = walkable (see collision.py)
+
+in one pack file per map, chunk after chunk in row-major order. The page
+only ever holds the chunks around the player: the API sends the ones it is
+missing with their tileset URLs, and the page evicts the farthest once it
+holds more than it needs, so it only downloads the tiles it can show.
+"""
+import base64
+import json
+import os
+import threading
+
+from flask import url_for
+
+from images import BUILD_DIR
+
+MANIFEST = f'{BUILD_DIR}/maps.json'
+TILE = 16
+CHUNK_TILES = 16
+EMPTY_TILE = 0xFFFF
+# Chunks sent around the player's chunk in each direction
+CHUNK_RADIUS = 1
+
+
+def chunk_bytes(chunk_tiles=CHUNK_TILES):
+    cells = chunk_tiles * chunk_tiles
+    return 2 * cells + (cells + 7) // 8
+
+
+class TileMap:
+    """One map's manifest entry and its chunk pack, read into memory once"""
+
+    def __init__(self, entry, data):
+        self.entry = entry
+        self.data = data
+        self.chunk_size = chunk_bytes(entry['chunk'])
+        self.chunk_px = entry['chunk'] * entry['tile']
+        self.chunk_columns = -(-entry['columns'] // entry['chunk'])
+        self.chunk_rows = -(-entry['rows'] // entry['chunk'])
+
+    def chunk(self, cx, cy):
+        if not (0 <= cx < self.chunk_columns and 0 <= cy < self.chunk_rows):
+            return None
+        start = (cy * self.chunk_columns + cx) * self.chunk_size
+        return self.data[start:start + self.chunk_size]
+
+    def tileset(self, cx, cy):
+        """Static path of the chunk's tileset atlas"""
+        return self.entry['tilesets'][cy * self.chunk_columns + cx]
+
+    def around(self, x, y, radius=CHUNK_RADIUS):
+        """(cx, cy) of every chunk within ``radius`` chunks of pixel (x, y), nearest first"""
+        px, py = int(x) // self.chunk_px, int(y) // self.chunk_px
+        keys = [(cx, cy) for cy in range(py - radius, py + radius + 1) for cx in range(px - radius, px + radius + 1)
+                if 0 <= cx < self.chunk_columns and 0 <= cy < self.chunk_rows]
+        return sorted(keys, key=lambda key: abs(key[0] - px) + abs(key[1] - py))
+
+
+class TileMaps:
+    """Loaded once per process from static/build/maps.json"""
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self._lock = threading.Lock()
+        self._entries = None
+        self._maps = {}
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            try:
+                with open(os.path.join(self.static_folder, MANIFEST)) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, map_id):
+        """The map's TileMap, or None when it has not been built"""
+        tile_map = self._maps.get(map_id)
+        if tile_map is not None or map_id not in self.entries:
+            return tile_map
+        with self._lock:
+            if map_id not in self._maps:
+                entry = self.entries[map_id]
+                with open(os.path.join(self.static_folder, entry['chunks']), 'rb') as f:
+                    self._maps[map_id] = TileMap(entry, f.read())
+            return self._maps[map_id]
+
+    def meta(self, map_id):
+        """What the page needs to draw ``map_id`` (no chunk data), or None"""
+        entry = self.entries.get(map_id)
+        if not entry:
+            return None
+        return {'id': map_id, 'columns': entry['columns'], 'rows': entry['rows'], 'tile': entry['tile'],
+                'chunk': entry['chunk'], 'width': entry['width'], 'height': entry['height'],
+                'tilesetColumns': entry['tileset_columns'], 'radius': CHUNK_RADIUS}
+
+    def chunks_around(self, map_id, x, y, have=()):
+        """``[cx, cy, base64 data, tileset URL]`` for the chunks near (x, y) that are not in ``have``"""
+        tile_map = self.get(map_id)
+        if tile_map is None:
+            return None
+        have = set(have)
+        return [[cx, cy, base64.b64encode(tile_map.chunk(cx, cy)).decode('ascii'),
+                 url_for('static', filename=tile_map.tileset(cx, cy))]
+                for cx, cy in tile_map.around(x, y) if (cx, cy) not in have]
+
+
+def init_app(app):
+    """Register ``tile_map(map_id)`` as a template global; the API finds it in app.extensions"""
+    tile_maps = TileMaps(app.static_folder)
+    app.extensions['tile_maps'] = tile_maps
+    app.add_template_global(tile_maps.meta, 'tile_map')
+    return tile_maps
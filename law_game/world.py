@@ -0,0 +1,189 @@
+"""RPG world content compiled into cacheable JSON chunks
+
+NPC placements and dialogue trees live in the rpg_* tables (seeded from
+rpg_world.json) instead of the page. They are compiled once per process
+into two kinds of chunk, each serialized once with an ETag:
+
+- a region chunk: the NPCs placed in one REGION_SIZE px square of a map,
+  without their dialogue, fetched for the regions around the player
+- an NPC chunk: one NPC's dialogues with their choices, fetched the first
+  time the player talks to them
+
+A dialogue may link a scenario chain (offered as a case to play) or a role
+question (asked in the dialogue, graded by the API so the correct answer
+is not part of the chunk).
+
+Proximity ("who can the player talk to here") goes through a SpatialHash
+of INTERACT_CELL px cells. The page builds the same grid from the region
+chunks for its interaction checks, and the API uses this one to check that
+a saved NPC visit happened next to the NPC.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+
+from records import RpgChoice, RpgDialogue, RpgNpc
+
+REGION_SIZE = 400
+# Spatial hash cell, and how close the player must be to talk to an NPC or
+# see its marker; the page gets these through INTERACTION
+INTERACT_CELL = 64
+TALK_RANGE = 50
+NOTICE_RANGE = 60
+INTERACTION = {'cell': INTERACT_CELL, 'talk': TALK_RANGE, 'notice': NOTICE_RANGE}
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rpg_world.json')
+
+
+def region_of(x, y):
+    return x // REGION_SIZE, y // REGION_SIZE
+
+
+class Chunk:
+    """A pre-serialized JSON body and its ETag"""
+
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, data):
+        self.body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()[:16]
+
+
+class SpatialHash:
+    """Uniform grid of ``cell`` px buckets; a query only visits the cells around it
+
+    An entry is stored in every cell its box overlaps, so with a query radius
+    up to ``cell`` a lookup reads at most 3x3 buckets however many entries
+    the map holds.
+    """
+
+    def __init__(self, cell=INTERACT_CELL):
+        self.cell = cell
+        self.cells = defaultdict(list)
+
+    def _keys(self, x0, y0, x1, y1):
+        cell = self.cell
+        return ((cx, cy) for cy in range(int(y0 // cell), int(y1 // cell) + 1)
+                for cx in range(int(x0 // cell), int(x1 // cell) + 1))
+
+    def insert(self, item, x, y, width=0, height=0):
+        for key in self._keys(x, y, x + width, y + height):
+            self.cells[key].append(item)
+
+    def query(self, x, y, radius):
+        """Entries in the cells overlapping the square of ``radius`` around (x, y), without duplicates"""
+        found = {}
+        for key in self._keys(x - radius, y - radius, x + radius, y + radius):
+            for item in self.cells.get(key, ()):
+                found[id(item)] = item
+        return list(found.values())
+
+
+class World:
+    """Read-mostly RPG content loaded from storage once per process"""
+
+    def __init__(self, storage, content):
+        self.storage = storage
+        self.content = content
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._load()
+            self._loaded = True
+
+    def _load(self):
+        choices = defaultdict(list)
+        for choice in self.storage.list_rpg_choices():
+            choices[choice.npc_id, choice.dialogue_position].append(
+                {'text': choice.text, 'concept': choice.concept, 'feedback': choice.feedback})
+        dialogues = defaultdict(list)
+        self.questions = {}
+        self.concept_npcs = {}
+        for dialogue in self.storage.list_rpg_dialogues():
+            entry = {'concept': dialogue.concept, 'bit': dialogue.concept_bit, 'intro': dialogue.intro,
+                     'choices': choices[dialogue.npc_id, dialogue.position]}
+            self.concept_npcs[dialogue.concept_bit] = dialogue.npc_id
+            scenario = self.content.scenario(dialogue.scenario_id) if dialogue.scenario_id else None
+            if scenario:
+                entry['scenario'] = [scenario.scenario.id, scenario.scenario.title]
+            question = self.storage.get_role_question(dialogue.role_question_id) if dialogue.role_question_id else None
+            if question:
+                entry['question'] = [question.id, question.question_text,
+                                     [question.option_a, question.option_b, question.option_c, question.option_d]]
+                self.questions[dialogue.npc_id, len(dialogues[dialogue.npc_id])] = question
+            dialogues[dialogue.npc_id].append(entry)
+
+        regions = defaultdict(list)
+        self.npcs = {}
+        self.grids = defaultdict(SpatialHash)
+        for npc in self.storage.list_rpg_npcs():
+            self.grids[npc.map_id].insert(npc, npc.x, npc.y)
+            regions[(npc.map_id,) + region_of(npc.x, npc.y)].append(
+                {'id': npc.id, 'name': npc.name, 'sprite': npc.sprite, 'x': npc.x, 'y': npc.y})
+            self.npcs[npc.id] = Chunk({'id': npc.id, 'name': npc.name, 'dialogues': dialogues[npc.id]})
+        self.regions = {key: Chunk({'map': key[0], 'region': list(key[1:]), 'npcs': npcs})
+                        for key, npcs in regions.items()}
+        print(f"World loaded: {len(self.npcs)} NPCs in {len(self.regions)} regions")
+
+    def invalidate(self):
+        """Drop compiled chunks; the next access reloads them from storage"""
+        with self._lock:
+            self._loaded = False
+
+    def region(self, map_id, rx, ry):
+        """Chunk with the NPCs in one region (empty when there are none)"""
+        self._ensure_loaded()
+        chunk = self.regions.get((map_id, rx, ry))
+        return chunk or Chunk({'map': map_id, 'region': [rx, ry], 'npcs': []})
+
+    def npc(self, npc_id):
+        self._ensure_loaded()
+        return self.npcs.get(npc_id)
+
+    def has_npc(self, npc_id):
+        self._ensure_loaded()
+        return npc_id in self.npcs
+
+    def concept_npc(self, bit):
+        """Id of the NPC whose dialogue teaches concept ``bit``, or None"""
+        self._ensure_loaded()
+        return self.concept_npcs.get(bit)
+
+    def npcs_near(self, map_id, x, y, radius):
+        """Ids of the NPCs on ``map_id`` within ``radius`` px of (x, y)"""
+        self._ensure_loaded()
+        grid = self.grids.get(map_id)
+        if grid is None:
+            return set()
+        return {npc.id for npc in grid.query(x, y, radius) if (npc.x - x) ** 2 + (npc.y - y) ** 2 <= radius ** 2}
+
+    def question(self, npc_id, dialogue_index):
+        """Role question linked to one of an NPC's dialogues, or None"""
+        self._ensure_loaded()
+        return self.questions.get((npc_id, dialogue_index))
+
+
+def seed_world(storage, path=SEED_FILE):
+    """Load the bundled world into empty rpg_* tables"""
+    if storage.count_rpg_npcs():
+        return
+    with open(path) as f:
+        seed = json.load(f)
+    npcs, dialogues, choices = [], [], []
+    bits = iter(range(1 << 16))
+    for npc in seed['npcs']:
+        npcs.append(RpgNpc(npc['id'], npc['map'], npc['name'], npc['sprite'], npc['x'], npc['y']))
+        for i, dialogue in enumerate(npc['dialogues']):
+            dialogues.append(RpgDialogue(npc['id'], i, dialogue['concept'], dialogue['intro'],
+                                         dialogue.get('scenario_id'), dialogue.get('role_question_id'), next(bits)))
+            choices.extend(RpgChoice(npc['id'], i, j, choice['text'], choice['concept'], choice['feedback'])
+                           for j, choice in enumerate(dialogue['choices']))
+    storage.add_rpg_content(npcs, dialogues, choices)
+    print(f"Seeded the RPG world with {len(npcs)} NPCs")